@@ -0,0 +1,59 @@
+"""Measure how long 'import gettysparqlpatterns' takes in a fresh interpreter.
+
+    python benchmarks/bench_import.py [--runs 20] [--max-ms 100]
+
+Exits with a non-zero status if the median import time is over --max-ms, or if any
+of the modules that are meant to be imported lazily are imported up front."""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Modules that should only be imported when they are first needed
+LAZY_MODULES = ["requests", "asyncio", "importlib.metadata", "concurrent.futures"]
+
+_SNIPPET = f"""
+import json, sys, time
+start = time.perf_counter()
+import gettysparqlpatterns
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "eager_imports": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+    "loaded_patternsets": list(gettysparqlpatterns.SPARQLRegistry._registry),
+}}))
+"""
+
+
+def measure(runs: int = 20):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _SNIPPET], check=True, capture_output=True, text=True
+        )
+        samples.append(json.loads(out.stdout))
+    times = sorted(s["seconds"] * 1000 for s in samples)
+    return {
+        "runs": runs,
+        "median_ms": statistics.median(times),
+        "min_ms": times[0],
+        "max_ms": times[-1],
+        "eager_imports": samples[-1]["eager_imports"],
+        "loaded_patternsets": samples[-1]["loaded_patternsets"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    print(json.dumps(result, indent=2))
+    if result["eager_imports"] or (
+        args.max_ms is not None and result["median_ms"] > args.max_ms
+    ):
+        sys.exit(1)
@@ -0,0 +1,189 @@
+"""A stand-in SPARQL endpoint for the benchmarks, serving generated SPARQL JSON results.
+
+    with SyntheticEndpoint(rows=1000) as endpoint:
+        client = HTTPSPARQLClient(endpoint.url)
+
+SELECT queries get `rows` result rows (or the query's LIMIT, if it has one) over the
+variables that the query projects, ASK queries get `true`, and queries projecting a
+?count get a single integer. The values are drawn from a fixed vocabulary so that the
+results have the repeated terms of real data, in the proportions given by `mix`.
+
+Each response is held back for `delay` seconds, or for `slow_delay` seconds for a
+`slow_fraction` of them, to stand in for a loaded replica with a long tail."""
+
+import gzip
+import json
+import random
+import re
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+XSD = "http://www.w3.org/2001/XMLSchema#"
+
+# The share of each kind of term in the generated results
+DEFAULT_MIX = {"uri": 0.5, "literal": 0.2, "typed": 0.2, "bnode": 0.1}
+
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+_SELECT_VARS = re.compile(
+    r"\bSELECT\s+(?:DISTINCT\s+)?(.*?)\s*(?:WHERE|\{)", re.S | re.I
+)
+_VAR = re.compile(r"\?(\w+)")
+
+
+def _term(kind, rng, vocabulary):
+    n = rng.randrange(vocabulary)
+    match kind:
+        case "uri":
+            return {"type": "uri", "value": f"https://data.example.org/object/{n}"}
+        case "literal":
+            return {
+                "type": "literal",
+                "value": f"Label for object {n}",
+                "xml:lang": "en",
+            }
+        case "typed":
+            return {"type": "literal", "datatype": XSD + "integer", "value": str(n)}
+        case _:
+            return {"type": "bnode", "value": f"b{n}"}
+
+
+def select_response(rows, variables=("s", "p", "o"), mix=None, vocabulary=5000, seed=0):
+    """A SPARQL JSON SELECT response with `rows` rows"""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    bindings = [
+        {
+            var: _term(kind, rng, vocabulary)
+            for var, kind in zip(
+                variables, rng.choices(kinds, weights, k=len(variables))
+            )
+        }
+        for _ in range(rows)
+    ]
+    return {"head": {"vars": list(variables)}, "results": {"bindings": bindings}}
+
+
+def count_response(count):
+    return {
+        "head": {"vars": ["count"]},
+        "results": {
+            "bindings": [
+                {
+                    "count": {
+                        "datatype": XSD + "integer",
+                        "type": "literal",
+                        "value": str(count),
+                    }
+                }
+            ]
+        },
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # The headers and body are written separately, which Nagle's algorithm would
+    # hold up waiting for the client's (delayed) ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._query(parse_qs(urlparse(self.path).query).get("query", [""])[0])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        self._query(parse_qs(body).get("query", [""])[0])
+
+    def _query(self, query):
+        if (delay := self.server.endpoint.response_delay()) > 0:
+            time.sleep(delay)
+        body = self.server.endpoint.response_body(query)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/sparql-results+json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SyntheticEndpoint:
+    def __init__(
+        self,
+        rows=100,
+        mix=None,
+        host="127.0.0.1",
+        port=0,
+        delay=0.0,
+        slow_fraction=0.0,
+        slow_delay=0.0,
+        seed=0,
+    ):
+        self.rows = rows
+        self.mix = mix
+        self.delay = delay
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self._random = random.Random(seed)
+        self._bodies = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.endpoint = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/sparql"
+
+    def response_delay(self):
+        with self._lock:
+            slow = self._random.random() < self.slow_fraction
+        return self.slow_delay if slow else self.delay
+
+    def response_body(self, query):
+        if re.search(r"^\s*(PREFIX[^\n]*\n\s*)*ASK\b", query, re.IGNORECASE):
+            return b'{"head": {}, "boolean": true}'
+        if "?count" in query:
+            return json.dumps(count_response(self.rows)).encode()
+
+        m = _LIMIT.search(query)
+        rows = int(m.group(1)) if m else self.rows
+        projected = _SELECT_VARS.search(query)
+        variables = (
+            tuple(dict.fromkeys(_VAR.findall(projected.group(1)))) if projected else ()
+        )
+        variables = variables or ("s", "p", "o")
+        # The results are the same for the same shape of query, so they are generated
+        # once rather than timing the generation on every request
+        with self._lock:
+            key = (rows, variables)
+            if (body := self._bodies.get(key)) is None:
+                body = self._bodies[key] = json.dumps(
+                    select_response(rows, variables, self.mix)
+                ).encode()
+        return body
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
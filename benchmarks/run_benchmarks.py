@@ -0,0 +1,314 @@
+"""Run the gettysparqlpatterns benchmarks and store the results as JSON.
+
+    python benchmarks/run_benchmarks.py [--quick] [--output results.json]
+                                        [--compare baseline.json] [--tolerance 0.2]
+
+The suite measures:
+
+  render      `BasePattern.get_query` for patterns with and without default values
+  parse       `parsed_sparql_response` over generated SELECT results: rows/s, and the
+              memory allocated and retained (via tracemalloc)
+  load        loading the built-in pattern sets from JSON and from a snapshot
+  import      'import gettysparqlpatterns' in a fresh interpreter (bench_import.py)
+  end_to_end  `run_pattern` latency through HTTPSPARQLClient against a local stand-in
+              endpoint (endpoint.py), for several result sizes
+  pool        `run_pattern` latency against replicas with a slow tail: one replica,
+              an EndpointPool of three, and the pool with hedged requests
+
+With --compare, the timings are compared against an earlier results file and the
+script exits with a non-zero status if any are slower by more than --tolerance."""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_import  # noqa: E402
+from endpoint import SyntheticEndpoint, select_response  # noqa: E402
+
+from gettysparqlpatterns import EndpointPool, PatternSet  # noqa: E402
+from gettysparqlpatterns.client import HTTPSPARQLClient  # noqa: E402
+from gettysparqlpatterns.registry import BasePattern  # noqa: E402
+from gettysparqlpatterns.utilities import (  # noqa: E402
+    load_from_package,
+    parsed_sparql_response,
+)
+from gettysparqlpatterns import snapshot  # noqa: E402
+
+BUILTINS = ["archival_patterns.json", "la_counts.json", "linked_art_filters.json"]
+
+
+def _timed(fn, number):
+    """The mean seconds per call of the fastest of 5 repeats of `number` calls"""
+    best = float("inf")
+    for _ in range(5):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench_render(quick):
+    number = 2000 if quick else 20000
+    plain = BasePattern(
+        name="plain",
+        sparql_pattern="ASK { <$URI> a <$TYPE> ; <urn:p> ?o }",
+        stype="ask",
+        ask_filter=True,
+    )
+    defaults = BasePattern(
+        name="defaults",
+        sparql_pattern="SELECT ?s WHERE { SERVICE <$SERVICE> { ?s a <$TYPE> } } LIMIT $LIMIT",
+        stype="select",
+        default_values={"LIMIT": 100, "SERVICE": "urn:service"},
+    )
+    return {
+        "get_query_us": _timed(
+            lambda: plain.get_query(URI="urn:a", TYPE="urn:t"), number
+        )
+        * 1e6,
+        "get_query_defaults_us": _timed(
+            lambda: defaults.get_query(TYPE="urn:t"), number
+        )
+        * 1e6,
+    }
+
+
+def bench_parse(quick):
+    results = {}
+    for rows in [1000, 10000] if quick else [1000, 10000, 100000]:
+        response = select_response(rows)
+        raw_bytes = len(json.dumps(response))
+        seconds = _timed(lambda: parsed_sparql_response(response, "select"), 1)
+
+        gc.collect()
+        tracemalloc.start()
+        parsed = parsed_sparql_response(response, "select")
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del parsed
+
+        results[str(rows)] = {
+            "seconds": seconds,
+            "rows_per_second": rows / seconds,
+            "response_bytes": raw_bytes,
+            "allocated_peak_bytes": peak,
+            "retained_bytes": retained,
+        }
+    return results
+
+
+def bench_load(quick):
+    number = 20 if quick else 200
+    results = {}
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        for name in BUILTINS:
+            snapshot.set_snapshot_dir(None)
+            from_json = _timed(lambda: load_from_package(PatternSet(), name), number)
+            snapshot.set_snapshot_dir(snapshot_dir)
+            load_from_package(PatternSet(), name)
+            from_snapshot = _timed(
+                lambda: load_from_package(PatternSet(), name), number
+            )
+            results[name] = {
+                "json_ms": from_json * 1000,
+                "snapshot_ms": from_snapshot * 1000,
+            }
+        snapshot.set_snapshot_dir(None)
+    return results
+
+
+def bench_import_time(quick):
+    return bench_import.measure(runs=5 if quick else 20)
+
+
+def bench_end_to_end(quick):
+    number = 20 if quick else 200
+    results = {}
+    with SyntheticEndpoint() as endpoint, HTTPSPARQLClient(endpoint.url) as client:
+        ps = PatternSet(name="bench", sparql_client_method=client)
+        ps.add_pattern(
+            name="select",
+            sparql_pattern="SELECT ?s ?p ?o WHERE { ?s ?p ?o } LIMIT $LIMIT",
+            stype="select",
+        )
+        ps.add_pattern(
+            name="ask",
+            sparql_pattern="ASK { <$URI> ?p ?o }",
+            stype="ask",
+            ask_filter=True,
+        )
+
+        calls = {"ask": {"URI": "urn:a"}}
+        for rows in [10, 1000] if quick else [10, 1000, 10000]:
+            calls[f"select_{rows}"] = {"LIMIT": rows}
+
+        for label, kwargs in calls.items():
+            name = "ask" if label == "ask" else "select"
+            ps.run_pattern(name, **kwargs)  # warm up the connection and the endpoint
+            samples = []
+            for _ in range(number):
+                start = time.perf_counter()
+                ps.run_pattern(name, **kwargs)
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            results[label] = {
+                "p50_ms": statistics.median(samples),
+                "p95_ms": samples[int(len(samples) * 0.95) - 1],
+                "mean_ms": statistics.fmean(samples),
+            }
+    return results
+
+
+def _latencies(fn, number):
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": statistics.median(samples),
+        "p99_ms": samples[max(int(len(samples) * 0.99) - 1, 0)],
+        "mean_ms": statistics.fmean(samples),
+    }
+
+
+def bench_pool(quick):
+    number = 100 if quick else 1000
+    # 5% of responses take 50ms rather than 2ms
+    replicas = [
+        SyntheticEndpoint(delay=0.002, slow_fraction=0.05, slow_delay=0.05, seed=n)
+        for n in range(3)
+    ]
+    for replica in replicas:
+        replica.start()
+    try:
+        clients = {
+            "single": HTTPSPARQLClient(replicas[0].url),
+            "pool": EndpointPool([r.url for r in replicas], seed=0),
+            "pool_hedged": EndpointPool(
+                [r.url for r in replicas], hedge=True, hedge_percentile=0.9, seed=0
+            ),
+        }
+        results = {}
+        for label, client in clients.items():
+            ps = PatternSet(name="bench", sparql_client_method=client)
+            ps.add_pattern(
+                name="ask",
+                sparql_pattern="ASK { <$URI> ?p ?o }",
+                stype="ask",
+                ask_filter=True,
+            )
+            for _ in range(30):  # warm up the connections and the latency figures
+                ps.run_pattern("ask", URI="urn:a")
+            results[label] = _latencies(
+                lambda: ps.run_pattern("ask", URI="urn:a"), number
+            )
+            client.close()
+        return results
+    finally:
+        for replica in replicas:
+            replica.stop()
+
+
+BENCHMARKS = {
+    "render": bench_render,
+    "parse": bench_parse,
+    "load": bench_load,
+    "import": bench_import_time,
+    "end_to_end": bench_end_to_end,
+    "pool": bench_pool,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _timings(results, path=()):
+    # Flatten the results to the (lower is better) timing figures to compare
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from _timings(value, path + (key,))
+        elif isinstance(value, (int, float)) and (
+            key.endswith(("_ms", "_us")) or key == "seconds"
+        ):
+            yield "/".join(path + (key,)), value
+
+
+def compare(baseline, current, tolerance):
+    """The timings in `current` that are more than `tolerance` slower than in
+    `baseline`, as (name, baseline, current) tuples"""
+    before = dict(_timings(baseline["results"]))
+    return [
+        (name, before[name], value)
+        for name, value in _timings(current["results"])
+        if name in before
+        and before[name] > 0
+        and value > before[name] * (1 + tolerance)
+    ]
+
+
+def run(names=None, quick=False):
+    results = {}
+    for name in names or BENCHMARKS:
+        print(f"Running {name} ...", file=sys.stderr)
+        results[name] = BENCHMARKS[name](quick)
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "benchmarks", nargs="*", help=f"any of {', '.join(BENCHMARKS)} (default: all)"
+    )
+    parser.add_argument("--quick", action="store_true", help="fewer, smaller runs")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="an earlier results file to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if unknown := set(args.benchmarks) - set(BENCHMARKS):
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    current = run(args.benchmarks, args.quick)
+    print(json.dumps(current, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(json.load(f), current, args.tolerance)
+        for name, before, after in slower:
+            print(f"SLOWER {name}: {before:.4g} -> {after:.4g}", file=sys.stderr)
+        if slower:
+            sys.exit(1)
@@ -2,7 +2,11 @@ from .utilities import (
     SPARQLResponseObj,
     SPARQLURI,
     SPARQLLiteral,
+    TermInterner,
 )
+from .results import SPARQLResultTable
+from .graph import Graph
+from .framing import CompiledFrame
 from .exceptions import (
     SPARQLPatternsError,
     NoSuchPatternError,
@@ -10,31 +14,78 @@ from .exceptions import (
     NoSPARQLEndpointSetError,
     NoPatternsFoundError,
     PatternNotSetError,
+    NoRecordedResponseError,
+    CircuitOpenError,
+    QueryTimeoutError,
 )
 import gettysparqlpatterns.data
 from .registry import SPARQLRegistry, PatternSet
+from .cache import ResultCache, SQLiteResultCache
+from .coalescing import SingleFlight
+from .pool import EndpointPool
+from .limits import AdaptiveLimiter, CircuitBreaker
+from .scheduling import QueryScheduler, priority
+from .deadlines import time_limit
+from .instrumentation import QueryEvent, PatternMetrics
+from .recording import RecordingClient, ReplayClient
+from .snapshot import set_snapshot_dir
 
 # Register built in patterns
 from .patterns import pattern_load
 
-# VERSION number
-import importlib.metadata
 
-__version__ = importlib.metadata.version("gettysparqlpatterns")
+def __getattr__(name):
+    # Look up the VERSION number when it is first asked for, as importlib.metadata is
+    # slow to import
+    if name == "__version__":
+        import importlib.metadata
+
+        global __version__
+        __version__ = importlib.metadata.version("gettysparqlpatterns")
+        return __version__
+    if name == "HTTPSPARQLClient":
+        # Only import requests if the HTTP client is used
+        from .client import HTTPSPARQLClient
+
+        return HTTPSPARQLClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # * imports with a controlled list:
 __all__ = [
     "SPARQLRegistry",
     "PatternSet",
+    "ResultCache",
+    "SQLiteResultCache",
+    "SingleFlight",
+    "EndpointPool",
+    "AdaptiveLimiter",
+    "CircuitBreaker",
+    "QueryScheduler",
+    "priority",
+    "time_limit",
+    "QueryEvent",
+    "PatternMetrics",
+    "RecordingClient",
+    "ReplayClient",
+    "HTTPSPARQLClient",
     "SPARQLPatternsError",
     "NoSuchPatternError",
     "NoPatternsFoundError",
     "RequiredParametersMissingError",
     "NoSPARQLEndpointSetError",
     "PatternNotSetError",
+    "NoRecordedResponseError",
+    "CircuitOpenError",
+    "QueryTimeoutError",
     "SPARQLResponseObj",
     "SPARQLURI",
     "SPARQLLiteral",
+    "TermInterner",
+    "SPARQLResultTable",
+    "Graph",
+    "CompiledFrame",
+    "set_snapshot_dir",
     "__version__",
 ]
 
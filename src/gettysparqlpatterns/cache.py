@@ -0,0 +1,480 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import weakref
+import zlib
+
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Returned by the caches when there is no (live) entry for a key
+MISS = object()
+
+_WHITESPACE_OR_STRING = re.compile(
+    r"(\"\"\"(?:[^\\]|\\.)*?\"\"\"|'''(?:[^\\]|\\.)*?'''"
+    r"|\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\\\n]|\\.)*')|\s+"
+)
+
+
+def canonical_query(query: str):
+    """Collapse runs of whitespace (outside of string literals) so that queries that
+    differ only in their layout share a cache key."""
+    return _WHITESPACE_OR_STRING.sub(lambda m: m.group(1) or " ", query).strip()
+
+
+# Keys for clients that do not say which endpoint they query. These are handed out
+# once per client object, as id() values are reused once an object has been freed,
+# and so only mean anything within the process.
+ANONYMOUS_ENDPOINT = "anonymous:"
+_anonymous_keys = weakref.WeakKeyDictionary()
+_pinned_keys = {}  # for clients that cannot be weakly referenced, kept alive
+_anonymous_count = itertools.count(1)
+_anonymous_lock = threading.Lock()
+
+
+def stable_endpoint(sparql_client_method):
+    """The endpoint URL a sparql client method exposes (as `endpoint`,
+    `sparql_endpoint`, `url` or `object_base`), or None if it does not"""
+    target = getattr(sparql_client_method, "__self__", sparql_client_method)
+    for attr in ("endpoint", "sparql_endpoint", "url", "object_base"):
+        if isinstance(value := getattr(target, attr, None), str):
+            return value
+    return None
+
+
+def endpoint_key(sparql_client_method):
+    """A string identifying the endpoint a sparql client method will query. Clients
+    that expose their endpoint URL (as `endpoint`, `sparql_endpoint`, `url` or
+    `object_base`) are identified by that, otherwise by a key that is unique to the
+    client object for the life of the process (see `is_anonymous_endpoint`)."""
+    if (endpoint := stable_endpoint(sparql_client_method)) is not None:
+        return endpoint
+    target = getattr(sparql_client_method, "__self__", sparql_client_method)
+    with _anonymous_lock:
+        try:
+            if (key := _anonymous_keys.get(target)) is None:
+                key = _anonymous_keys[target] = _anonymous_key(target)
+        except TypeError:
+            # not hashable, or cannot be weakly referenced
+            if (pinned := _pinned_keys.get(id(target))) is None:
+                pinned = _pinned_keys[id(target)] = (target, _anonymous_key(target))
+            key = pinned[1]
+    return key
+
+
+def _anonymous_key(target):
+    kind = type(target)
+    return (
+        f"{ANONYMOUS_ENDPOINT}{kind.__module__}.{kind.__qualname__}"
+        f"#{next(_anonymous_count)}"
+    )
+
+
+def is_anonymous_endpoint(endpoint: str):
+    """Whether an `endpoint_key` is for a client that did not expose its endpoint, and
+    so is not the same in another process"""
+    return endpoint.startswith(ANONYMOUS_ENDPOINT)
+
+
+def cache_key(sparql_client_method, query: str, stype: str, variant: str | None = None):
+    # The stype is part of the key, as the same query gives a different result as (eg)
+    # a 'count' and a 'select' pattern. `variant` distinguishes results parsed
+    # differently again from the same response, eg a CONSTRUCT response as returned
+    # and as a Graph
+    key = f"{endpoint_key(sparql_client_method)}\n{stype}\n{canonical_query(query)}"
+    return key if variant is None else f"{key}\n#{variant}"
+
+
+def approximate_size(obj):
+    """A rough, recursive estimate of the memory used by a SPARQL response"""
+    match obj:
+        case str() | bytes():
+            return sys.getsizeof(obj)
+        case dict():
+            return sys.getsizeof(obj) + sum(
+                approximate_size(k) + approximate_size(v) for k, v in obj.items()
+            )
+        case list() | tuple():
+            return sys.getsizeof(obj) + sum(approximate_size(x) for x in obj)
+        case _:
+            return sys.getsizeof(obj)
+
+
+class ResultCache:
+    """An in-process, thread-safe LRU cache of parsed pattern results.
+
+    `ttl` maps a pattern stype ('ask', 'select', 'count', 'construct') to the number of
+    seconds a result of that type stays fresh, and `default_ttl` is used for any stype
+    not listed (None means results do not expire). The cache evicts the least recently
+    used entries once it holds more than `max_entries` results or, if set, more than
+    `max_bytes` (estimated from the raw responses).
+
+    Cached results are shared between callers, so they should not be mutated."""
+
+    # The cache holds the parsed results (rather than the raw responses to be parsed)
+    stores_raw = False
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int | None = None,
+        ttl: dict | None = None,
+        default_ttl: float | None = 300,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl or {}
+        self.default_ttl = default_ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+
+        self._entries = OrderedDict()  # key -> (expires, size, parsed)
+        self._lock = threading.Lock()
+
+    def _expiry(self, stype):
+        ttl = self.ttl.get(stype, self.default_ttl)
+        return None if ttl is None else time.monotonic() + ttl
+
+    def get(self, key: str, stype: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, size, parsed = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return parsed
+                self._remove(key)
+            self.misses += 1
+            return MISS
+
+    def put(self, key: str, stype: str, raw, parsed):
+        size = approximate_size(raw)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never going to fit
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._expiry(stype), size, parsed)
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteResultCache:
+    """A result cache in a local sqlite file, which can be shared by several processes
+    (eg web server workers, batch jobs) and outlives them.
+
+    The raw responses are stored zlib-compressed, keyed on a hash of the endpoint and
+    the rendered query, and are parsed again when they are read. `ttl` and
+    `default_ttl` are as for `ResultCache`. Once the cache holds more than `max_bytes`
+    of compressed responses, or more than `max_entries` responses, the least recently
+    used are removed. So that reads are not all writes, when an entry was last used is
+    only updated if it is more than `touch_interval` seconds old.
+
+    The keys have to mean the same in every process, so results are only cached for
+    sparql client methods that expose their endpoint URL (see `endpoint_key`). For
+    other clients, such as plain functions, give the cache an `endpoint` name to
+    store their results under; otherwise they are not cached, with a warning.
+
+    Errors from sqlite (eg the file being locked for longer than `timeout` seconds)
+    are logged, and treated as a miss, rather than failing the query."""
+
+    stores_raw = True
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int | None = 256 * 1024 * 1024,
+        max_entries: int | None = None,
+        ttl: dict | None = None,
+        default_ttl: float | None = 300,
+        touch_interval: float = 60,
+        timeout: float = 5.0,
+        endpoint: str | None = None,
+    ):
+        self.path = path
+        self.endpoint = endpoint
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl or {}
+        self.default_ttl = default_ttl
+        self.touch_interval = touch_interval
+        self.timeout = timeout
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._warned = False
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = None
+        with self._lock:
+            self._connect()
+
+    def _connect(self):
+        import sqlite3
+
+        self._db = sqlite3.connect(
+            self.path, timeout=self.timeout, check_same_thread=False
+        )
+        # A connection cannot be shared with a forked child process, so each process
+        # opens its own
+        self._pid = os.getpid()
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key_hash TEXT PRIMARY KEY,
+                    endpoint TEXT,
+                    stype TEXT,
+                    is_json INTEGER,
+                    body BLOB,
+                    size INTEGER,
+                    expires REAL,
+                    last_used REAL
+                );
+                CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+                CREATE TABLE IF NOT EXISTS totals (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    entries INTEGER,
+                    bytes INTEGER
+                );
+                INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+                CREATE TRIGGER IF NOT EXISTS results_added AFTER INSERT ON results
+                BEGIN
+                    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+                END;
+                CREATE TRIGGER IF NOT EXISTS results_removed AFTER DELETE ON results
+                BEGIN
+                    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+                END;
+                """
+            )
+
+    def _conn(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    @staticmethod
+    def _hash(key: str):
+        return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _stored_key(self, key: str):
+        # The key to store a result under, or None if it would not be the same key in
+        # another process
+        endpoint, _, rest = key.partition("\n")
+        if not is_anonymous_endpoint(endpoint):
+            return key
+        if self.endpoint is not None:
+            return f"{self.endpoint}\n{rest}"
+        if not self._warned:
+            self._warned = True
+            logger.warning(
+                f"Not caching results in {self.path} for {endpoint}, as it does not "
+                "expose its endpoint URL. Pass SQLiteResultCache an 'endpoint' name "
+                "for it."
+            )
+        return None
+
+    def _expiry(self, stype):
+        ttl = self.ttl.get(stype, self.default_ttl)
+        return None if ttl is None else time.time() + ttl
+
+    def get(self, key: str, stype: str):
+        """The raw response cached for the key, or MISS"""
+        import sqlite3
+
+        if (key := self._stored_key(key)) is None:
+            self.misses += 1
+            return MISS
+        key_hash = self._hash(key)
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._conn()
+                row = db.execute(
+                    "SELECT is_json, body, expires, last_used FROM results "
+                    "WHERE key_hash = ?",
+                    (key_hash,),
+                ).fetchone()
+                if row is not None:
+                    is_json, body, expires, last_used = row
+                    if expires is not None and expires <= now:
+                        with db:
+                            db.execute(
+                                "DELETE FROM results WHERE key_hash = ?", (key_hash,)
+                            )
+                        row = None
+                    elif last_used < now - self.touch_interval:
+                        with db:
+                            db.execute(
+                                "UPDATE results SET last_used = ? WHERE key_hash = ?",
+                                (now, key_hash),
+                            )
+                if row is None:
+                    self.misses += 1
+                    return MISS
+                self.hits += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read from the result cache {self.path}: {e}")
+            self.misses += 1
+            return MISS
+
+        body = zlib.decompress(body)
+        return json.loads(body) if is_json else body.decode("utf-8")
+
+    def put(self, key: str, stype: str, raw, parsed):
+        import sqlite3
+
+        if isinstance(raw, (dict, list)):
+            body, is_json = json.dumps(raw, separators=(",", ":")).encode("utf-8"), 1
+        elif isinstance(raw, str):
+            body, is_json = raw.encode("utf-8"), 0
+        elif isinstance(raw, bytes):
+            body, is_json = raw, 0
+        else:
+            # eg a stream
+            return
+        if (key := self._stored_key(key)) is None:
+            return
+        body = zlib.compress(body)
+        if self.max_bytes is not None and len(body) > self.max_bytes:
+            return
+
+        key_hash = self._hash(key)
+        endpoint = key.partition("\n")[0]
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._conn()
+                with db:
+                    db.execute("DELETE FROM results WHERE key_hash = ?", (key_hash,))
+                    db.execute(
+                        "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            key_hash,
+                            endpoint,
+                            stype,
+                            is_json,
+                            body,
+                            len(body),
+                            self._expiry(stype),
+                            now,
+                        ),
+                    )
+                    self._evict(db, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write to the result cache {self.path}: {e}")
+
+    def _evict(self, db, now):
+        entries, total = db.execute("SELECT entries, bytes FROM totals").fetchone()
+        if (self.max_entries is None or entries <= self.max_entries) and (
+            self.max_bytes is None or total <= self.max_bytes
+        ):
+            return
+        # Expired entries go first, then the least recently used
+        removed = db.execute("DELETE FROM results WHERE expires <= ?", (now,)).rowcount
+        cursor = db.execute("SELECT key_hash, size FROM results ORDER BY last_used")
+        entries, total = db.execute("SELECT entries, bytes FROM totals").fetchone()
+        remove = []
+        for key_hash, size in cursor:
+            if (self.max_entries is None or entries <= self.max_entries) and (
+                self.max_bytes is None or total <= self.max_bytes
+            ):
+                break
+            remove.append((key_hash,))
+            entries -= 1
+            total -= size
+        cursor.close()
+        db.executemany("DELETE FROM results WHERE key_hash = ?", remove)
+        self.evictions += removed + len(remove)
+
+    def invalidate(self, key: str):
+        if (key := self._stored_key(key)) is None:
+            return
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute("DELETE FROM results WHERE key_hash = ?", (self._hash(key),))
+
+    def invalidate_endpoint(self, endpoint: str):
+        """Remove every cached result from an endpoint"""
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute("DELETE FROM results WHERE endpoint = ?", (endpoint,))
+
+    def clear(self):
+        with self._lock:
+            db = self._conn()
+            with db:
+                db.execute("DELETE FROM results")
+
+    def stats(self):
+        with self._lock:
+            entries, total = (
+                self._conn().execute("SELECT entries, bytes FROM totals").fetchone()
+            )
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+                self._pid = None
+
+    def __len__(self):
+        return self.stats()["entries"]
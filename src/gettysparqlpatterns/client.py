@@ -0,0 +1,178 @@
+import re
+import threading
+
+from urllib.parse import urlencode
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .exceptions import NoSPARQLEndpointSetError
+from .instrumentation import note_response_bytes
+from .rewriting import split_prologue
+
+SPARQL_ACCEPT = (
+    "application/sparql-results+json, application/ld+json;q=0.9, "
+    "application/json;q=0.8, application/n-triples;q=0.7, */*;q=0.1"
+)
+# For CONSTRUCT and DESCRIBE queries: the formats that `Graph.from_response` parses,
+# N-Triples first as it is the quickest to parse
+GRAPH_ACCEPT = (
+    "application/n-triples, application/ld+json;q=0.9, application/json;q=0.8, "
+    "*/*;q=0.1"
+)
+_GRAPH_QUERY = re.compile(r"(?:CONSTRUCT|DESCRIBE)\b", re.IGNORECASE)
+
+# Queries longer than this (once URL encoded) are sent as a POST
+DEFAULT_MAX_GET_LENGTH = 2048
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HTTPSPARQLClient:
+    """A sparql client method for a SPARQL 1.1 protocol endpoint, for use with
+    `PatternSet.set_sparql_client_method`:
+
+        client = HTTPSPARQLClient("https://data.getty.edu/museum/collection/sparql")
+        ps.set_sparql_client_method(client)
+
+    Requests go through a single `requests.Session`, so connections are kept alive and
+    pooled (`pool_maxsize` connections per host, which should be at least the number of
+    threads that share the client). Responses are requested gzipped, queries are sent
+    as a GET unless they are longer than `max_get_length` when encoded, and requests
+    that fail with a 429 or 5xx status (or cannot connect) are retried up to `retries`
+    times with exponential backoff, honouring any Retry-After header.
+
+    SELECT and ASK results are requested as JSON, and CONSTRUCT and DESCRIBE results
+    as N-Triples (or else JSON-LD), unless `headers` sets the Accept header.
+
+    `timeout` is passed to requests as is: seconds, or a (connect, read) tuple."""
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        timeout: float | tuple | None = (10, 120),
+        max_get_length: int = DEFAULT_MAX_GET_LENGTH,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        headers: dict | None = None,
+        session: requests.Session | None = None,
+    ):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.max_get_length = max_get_length
+
+        self.session = session or requests.Session()
+        self.session.headers.update(
+            {"Accept": SPARQL_ACCEPT, "Accept-Encoding": "gzip, deflate"}
+        )
+        if headers:
+            self.session.headers.update(headers)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # SPARQL queries are read only, so a POST is as safe to retry as a GET
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _send(self, query: str, timeout=None, stream=False):
+        if self.endpoint is None:
+            raise NoSPARQLEndpointSetError(
+                "This HTTPSPARQLClient has no SPARQL endpoint set"
+            )
+
+        timeout = self.timeout if timeout is None else timeout
+        params = {"query": query}
+        headers = None
+        if self.session.headers.get("Accept") == SPARQL_ACCEPT:
+            # the default, rather than an Accept header set by the caller
+            if _GRAPH_QUERY.match(split_prologue(query)[1]):
+                headers = {"Accept": GRAPH_ACCEPT}
+        if len(urlencode(params)) <= self.max_get_length:
+            resp = self.session.get(
+                self.endpoint,
+                params=params,
+                headers=headers,
+                timeout=timeout,
+                stream=stream,
+            )
+        else:
+            resp = self.session.post(
+                self.endpoint,
+                data=params,
+                headers=headers,
+                timeout=timeout,
+                stream=stream,
+            )
+        resp.raise_for_status()
+        return resp
+
+    def __call__(self, query: str, timeout=None):
+        """Run a query, returning the decoded JSON response (or the body as text if the
+        endpoint did not return JSON, eg for a CONSTRUCT as turtle)"""
+        resp = self._send(query, timeout)
+        note_response_bytes(len(resp.content))
+        if "json" in resp.headers.get("Content-Type", "json"):
+            return resp.json()
+        return resp.text
+
+    def stream(self, query: str, timeout=None):
+        """Run a query, returning the (decompressed) response body as a file-like
+        object rather than decoding it. This can be passed as the sparql client method
+        to `iter_pattern` or `run_pattern_columnar` to parse large results as they
+        arrive. Closing it releases the connection back to the pool."""
+        resp = self._send(query, timeout, stream=True)
+        resp.raw.decode_content = True
+        return resp.raw
+
+    def get_json(self, url: str, timeout=None):
+        """GET a JSON document (eg a pattern set export) through the same session"""
+        resp = self.session.get(
+            url,
+            headers={"Accept": "application/json"},
+            timeout=self.timeout if timeout is None else timeout,
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"HTTPSPARQLClient({self.endpoint!r})"
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_http_client():
+    """A shared client (with no SPARQL endpoint) used for fetching pattern sets"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = HTTPSPARQLClient()
+    return _default_client
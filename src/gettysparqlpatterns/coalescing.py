@@ -0,0 +1,97 @@
+import threading
+
+from .exceptions import QueryTimeoutError
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical queries that are in flight at the same time.
+
+    The first caller for a key runs the query, and any other callers that ask for the
+    same key before it finishes wait for it and get the same result (or exception)
+    rather than sending the query again. Nothing is kept once the query has finished;
+    use a `ResultCache` as well to reuse results after that.
+
+    Threads and asyncio tasks are coalesced separately: `do` is for threads, `ado` for
+    coroutines, which are only coalesced with others on the same event loop. As with
+    the cache, shared results should not be mutated. A caller waiting for another's
+    query gives up with QueryTimeoutError after its own `timeout`."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+        # The number of callers that were given another caller's result
+        self.shared = 0
+
+    def do(self, key, fn, timeout: float | None = None):
+        with self._lock:
+            if (call := self._calls.get(key)) is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise QueryTimeoutError(
+                    "The deadline passed while waiting for the same query to finish"
+                )
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key, afn, timeout: float | None = None):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        with self._lock:
+            if (task := self._tasks.get(task_key)) is None:
+                # Run the query as its own task, so that the caller that started it
+                # being cancelled does not cancel it for the others
+                task = self._tasks[task_key] = loop.create_task(afn())
+                task.add_done_callback(lambda t: self._task_done(task_key, t))
+            else:
+                self.shared += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            if task.done():
+                # the query itself timed out, rather than this wait
+                raise
+            raise QueryTimeoutError(
+                "The deadline passed while waiting for the same query to finish"
+            ) from None
+
+    def _task_done(self, task_key, task):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved, in case every waiter was cancelled
+            task.exception()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls) + len(self._tasks)
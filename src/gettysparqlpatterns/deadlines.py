@@ -0,0 +1,138 @@
+import contextvars
+import time
+import weakref
+
+from .exceptions import QueryTimeoutError
+
+# The time (on the time.monotonic() clock) by which the queries run in the current
+# context (thread or asyncio task) have to finish. It is set from the `timeout` and
+# `deadline` arguments of the run, filter and batch methods, and is carried into the
+# threads and tasks they start, so that a batch shares one deadline.
+current_deadline = contextvars.ContextVar("gettysparqlpatterns_deadline", default=None)
+
+
+def deadline_from(timeout: float | None = None, deadline: float | None = None):
+    """The deadline for a call given a `timeout` in seconds and/or a `deadline` on the
+    time.monotonic() clock: the earliest of those and any already set for the current
+    context, or None if there are none"""
+    at = current_deadline.get()
+    if timeout is not None:
+        at = _earliest(at, time.monotonic() + timeout)
+    if deadline is not None:
+        at = _earliest(at, deadline)
+    return at
+
+
+def _earliest(a, b):
+    return b if a is None or b < a else a
+
+
+class time_limit:
+    """Run the pattern queries in this block with a deadline, `timeout` seconds from
+    now or at `deadline` (a time.monotonic() value), whichever is sooner:
+
+    with time_limit(5):
+        allowed = ps.evaluate_filters(uri, "HumanMadeObject")
+
+    An outer deadline that is sooner still applies."""
+
+    # A class rather than a contextlib.contextmanager, as it is entered on every run
+    __slots__ = ("timeout", "deadline", "_token")
+
+    def __init__(self, timeout: float | None = None, deadline: float | None = None):
+        self.timeout = timeout
+        self.deadline = deadline
+        self._token = None
+
+    def __enter__(self):
+        if self.timeout is not None or self.deadline is not None:
+            self._token = current_deadline.set(
+                deadline_from(self.timeout, self.deadline)
+            )
+        return self
+
+    def __exit__(self, *exc):
+        if self._token is not None:
+            current_deadline.reset(self._token)
+            self._token = None
+
+
+def remaining():
+    """The seconds left before the current deadline, or None if there is none. Raises
+    QueryTimeoutError if it has already passed."""
+    if (at := current_deadline.get()) is None:
+        return None
+    if (left := at - time.monotonic()) <= 0:
+        raise QueryTimeoutError("The deadline passed before the query could be sent")
+    return left
+
+
+# Whether each sparql client method takes a timeout, as inspecting its signature on
+# every query would cost more than the query's other overheads. Keyed on the function
+# of a bound method (whose signature is the same for every instance), or the object.
+_accepts_timeout = weakref.WeakKeyDictionary()
+
+
+def accepts_timeout(sparql_client_method):
+    """Whether a sparql client method can be passed a `timeout` keyword argument"""
+    target = getattr(sparql_client_method, "__func__", sparql_client_method)
+    try:
+        return _accepts_timeout[target]
+    except (KeyError, TypeError):
+        pass
+    accepts = _inspect_accepts_timeout(sparql_client_method)
+    try:
+        _accepts_timeout[target] = accepts
+    except TypeError:
+        # not hashable, or cannot be weakly referenced
+        pass
+    return accepts
+
+
+def _inspect_accepts_timeout(sparql_client_method):
+    import inspect
+
+    try:
+        parameters = inspect.signature(sparql_client_method).parameters
+    except (TypeError, ValueError):
+        return False
+    return "timeout" in parameters or any(
+        p.kind == p.VAR_KEYWORD for p in parameters.values()
+    )
+
+
+def send_query(sparql_client_method, query, timeout=None):
+    """Call a sparql client method, passing it the `timeout` if there is one and it
+    takes one. An error from a client that gave up after the timeout (eg a requests
+    ReadTimeout) is raised as a QueryTimeoutError, as is a response that came back
+    after it: a client that does not take a timeout cannot be interrupted, but its
+    late response is not used."""
+    if timeout is None:
+        return sparql_client_method(query)
+    start = time.monotonic()
+    if not accepts_timeout(sparql_client_method):
+        response = sparql_client_method(query)
+    else:
+        try:
+            response = sparql_client_method(query, timeout=timeout)
+        except QueryTimeoutError:
+            raise
+        except Exception as e:
+            if time.monotonic() - start >= timeout or _is_timeout(e):
+                raise QueryTimeoutError(
+                    f"The query did not finish within its {timeout:.3g}s timeout"
+                ) from e
+            raise
+    if time.monotonic() - start > timeout:
+        if hasattr(response, "close"):
+            # eg a stream
+            response.close()
+        raise QueryTimeoutError(
+            f"The response came after the query's {timeout:.3g}s timeout"
+        )
+    return response
+
+
+def _is_timeout(exc):
+    # eg requests' Timeout, which is not a subclass of the builtin TimeoutError
+    return isinstance(exc, TimeoutError) or type(exc).__name__.endswith("Timeout")
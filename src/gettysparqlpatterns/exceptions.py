@@ -22,3 +22,24 @@ class RequiredParametersMissingError(SPARQLPatternsError):
 
 class NoSPARQLEndpointSetError(SPARQLPatternsError):
     pass
+
+
+class NoRecordedResponseError(SPARQLPatternsError):
+    """A ReplayClient was asked for a query that was not recorded."""
+
+    pass
+
+
+class CircuitOpenError(SPARQLPatternsError):
+    """A CircuitBreaker is open, so the query was not sent to the endpoint."""
+
+    pass
+
+
+class QueryTimeoutError(SPARQLPatternsError):
+    """A query did not finish before its timeout or deadline. For a batch method, any
+    results that did finish are in `partial`."""
+
+    def __init__(self, *args, partial=None):
+        super().__init__(*args)
+        self.partial = partial
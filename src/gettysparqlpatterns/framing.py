@@ -0,0 +1,264 @@
+from .exceptions import SPARQLPatternsError
+from .graph import RDF_TYPE, XSD_STRING, Context, Graph
+
+# A subset of JSON-LD 1.1 framing (https://www.w3.org/TR/json-ld11-framing/), enough
+# to shape the output of a CONSTRUCT pattern into a document per record:
+#
+#   - the frame's "@context" is used to compact the output (terms, prefixes, @vocab,
+#     and "@type": "@id" coercion of property values)
+#   - nodes are matched on "@type" and/or "@id" (a value, or a list of values), and
+#     on having any (or with "@requireAll": true, all) of the properties that the
+#     frame gives as a wildcard {}, and none of those given as []
+#   - property frames are applied to the nodes that are embedded as values, and a
+#     property frame of {"@default": value} fills in a missing property
+#   - "@explicit": true leaves out properties that are not in the frame
+#   - "@embed": "@once" (the default), "@always" or "@never"
+#
+# Other framing keywords, and matching on the values of properties, are not supported.
+
+_EMBED = ("@once", "@always", "@never")
+
+
+class _NodeFrame:
+    __slots__ = (
+        "types",
+        "ids",
+        "explicit",
+        "embed",
+        "properties",
+        "defaults",
+        "required",
+        "excluded",
+        "require_all",
+    )
+
+    def __init__(self, frame: dict, ctx: Context, explicit=False, embed="@once"):
+        self.types = self._match_values(frame.get("@type"), ctx.expand)
+        self.ids = self._match_values(
+            frame.get("@id"), lambda value: ctx.expand(value, vocab=False)
+        )
+        self.explicit = frame.get("@explicit", explicit)
+        self.embed = frame.get("@embed", embed)
+        if self.embed not in _EMBED:
+            raise SPARQLPatternsError(
+                f"Unsupported '@embed' value {self.embed!r} in frame (use one of {_EMBED})"
+            )
+
+        self.require_all = frame.get("@requireAll", False)
+
+        self.properties = {}  # property IRI -> _NodeFrame or None
+        self.defaults = {}  # property IRI -> default value
+        self.required = []  # wildcard properties, that a node must have (any/all of)
+        self.excluded = []  # properties that a node must not have
+        for key, value in frame.items():
+            if key.startswith("@") or (iri := ctx.expand(key)) is None:
+                continue
+            if value == []:
+                self.excluded.append(iri)
+                continue
+            if isinstance(value, list):
+                value = value[0]
+            if value == {}:
+                self.required.append(iri)
+            if isinstance(value, dict) and "@default" in value:
+                self.defaults[iri] = value["@default"]
+                value = {k: v for k, v in value.items() if k != "@default"}
+            self.properties[iri] = (
+                _NodeFrame(value, ctx, self.explicit, self.embed)
+                if isinstance(value, dict) and value
+                else None
+            )
+
+    @staticmethod
+    def _match_values(values, expand):
+        # An empty dict is the wildcard, matching anything (as is leaving it out)
+        if values is None or values == {} or values == [{}]:
+            return None
+        return frozenset(
+            expand(v) for v in (values if isinstance(values, list) else [values])
+        )
+
+    def matches(self, graph, sid, type_id):
+        terms = graph.terms
+        if self.ids is not None and terms[sid][1] not in self.ids:
+            return False
+        properties = graph.properties(sid)
+        if self.types is not None and self.types.isdisjoint(
+            terms[t][1] for t in properties.get(type_id, ())
+        ):
+            return False
+        if self.required or self.excluded:
+            present = {terms[p][1] for p in properties}
+            if any(iri in present for iri in self.excluded):
+                return False
+            if self.required:
+                found = [iri in present for iri in self.required]
+                return all(found) if self.require_all else any(found)
+        return True
+
+    @property
+    def filters(self):
+        """Whether this frame (as a property frame) filters the values it is given"""
+        return bool(
+            self.ids is not None
+            or self.types is not None
+            or self.required
+            or self.excluded
+        )
+
+
+class _Compactor:
+    """Compacts IRIs with the frame's context: to a term if one is defined for the
+    IRI, to a relative IRI if @vocab covers it, or to a compact IRI (prefix:suffix)
+    using the longest matching prefix."""
+
+    def __init__(self, ctx: Context):
+        self.ctx = ctx
+        self.terms = {}
+        for term, iri in ctx.terms.items():
+            # prefer the shortest term for an IRI
+            if iri not in self.terms or len(term) < len(self.terms[iri]):
+                self.terms[iri] = term
+        self.prefixes = sorted(
+            (
+                (iri, term)
+                for term, iri in ctx.terms.items()
+                if iri.endswith(("/", "#", ":", "_"))
+            ),
+            key=lambda item: -len(item[0]),
+        )
+        self._memo = {}
+
+    def __call__(self, iri: str, vocab: bool = True):
+        if not vocab:
+            return self._compact(iri, vocab)
+        # Property and type IRIs are few and repeated, so are worth remembering
+        if (compacted := self._memo.get(iri)) is None:
+            compacted = self._memo[iri] = self._compact(iri, vocab)
+        return compacted
+
+    def _compact(self, iri, vocab):
+        if vocab:
+            if (term := self.terms.get(iri)) is not None:
+                return term
+            v = self.ctx.vocab
+            if v and iri.startswith(v) and len(iri) > len(v):
+                suffix = iri[len(v) :]
+                if ":" not in suffix and suffix not in self.ctx.terms:
+                    return suffix
+        for prefix, term in self.prefixes:
+            if iri.startswith(prefix) and len(iri) > len(prefix):
+                suffix = iri[len(prefix) :]
+                if not suffix.startswith("//"):
+                    return f"{term}:{suffix}"
+        return iri
+
+
+class CompiledFrame:
+    """A JSON-LD frame, compiled once so that it can be applied to many graphs"""
+
+    def __init__(self, frame: dict | None = None):
+        frame = dict(frame or {})
+        self.context = frame.pop("@context", None)
+        ctx = Context(self.context)
+        self._root = _NodeFrame(frame, ctx)
+        self._compact = _Compactor(ctx)
+        self._coercion = ctx.coercion
+        # The frames for embedded nodes whose property has no frame of its own
+        self._unframed = {embed: _NodeFrame({}, ctx, embed=embed) for embed in _EMBED}
+
+    def iter_nodes(self, graph: Graph):
+        """Yield each node in the graph that matches the frame, framed, without the
+        @context. Each node's embedded values are framed independently of the others,
+        so the nodes can be written out as they are produced."""
+        type_id = graph.find_term(("uri", RDF_TYPE))
+        for sid in list(graph.subjects()):
+            if self._root.matches(graph, sid, type_id):
+                yield self._node(graph, sid, self._root, type_id, set(), set())
+
+    def iter_documents(self, graph: Graph):
+        """As `iter_nodes`, with the frame's @context added to each node"""
+        for node in self.iter_nodes(graph):
+            yield self._with_context(node)
+
+    def frame(self, graph: Graph):
+        """Frame the graph as a single document: the matching node, or an @graph
+        of them if there is not exactly one"""
+        nodes = list(self.iter_nodes(graph))
+        if len(nodes) == 1:
+            return self._with_context(nodes[0])
+        return self._with_context({"@graph": nodes})
+
+    def _with_context(self, node):
+        if self.context is None:
+            return node
+        return {"@context": self.context, **node}
+
+    def _id(self, term):
+        if term[0] == "bnode":
+            return f"_:{term[1]}"
+        return self._compact(term[1], vocab=False)
+
+    def _node(self, graph, sid, frame, type_id, path, embedded):
+        terms = graph.terms
+        compact = self._compact
+        node = {"@id": self._id(terms[sid])}
+        path = path | {sid}
+        embedded.add(sid)
+
+        for pid, objects in graph.properties(sid).items():
+            iri = terms[pid][1]
+            if pid == type_id:
+                types = [compact(terms[t][1]) for t in objects]
+                node["@type"] = types[0] if len(types) == 1 else types
+                continue
+            if frame.explicit and iri not in frame.properties:
+                continue
+            subframe = frame.properties.get(iri)
+            values = [
+                value
+                for oid in objects
+                if (
+                    value := self._value(
+                        graph, oid, iri, subframe, frame, type_id, path, embedded
+                    )
+                )
+                is not None
+            ]
+            if values:
+                node[compact(iri)] = values[0] if len(values) == 1 else values
+
+        for iri, default in frame.defaults.items():
+            node.setdefault(compact(iri), default)
+        return node
+
+    def _value(self, graph, oid, prop, subframe, frame, type_id, path, embedded):
+        term = graph.terms[oid]
+        if term[0] == "literal":
+            _, value, datatype, language = term
+            if language is not None:
+                return {"@value": value, "@language": language}
+            if datatype is None or datatype == XSD_STRING:
+                return value
+            if self._coercion.get(prop) == datatype:
+                return value
+            return {"@value": value, "@type": self._compact(datatype)}
+
+        if subframe is not None and subframe.filters:
+            if not subframe.matches(graph, oid, type_id):
+                return None
+
+        embed = (subframe or frame).embed
+        if (
+            graph.is_subject(oid)
+            and embed != "@never"
+            and oid not in path
+            and (embed == "@always" or oid not in embedded)
+        ):
+            if subframe is None:
+                subframe = self._unframed[frame.embed]
+            return self._node(graph, oid, subframe, type_id, path, embedded)
+
+        if self._coercion.get(prop) == "@id":
+            return self._id(term)
+        return {"@id": self._id(term)}
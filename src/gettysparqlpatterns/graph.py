@@ -0,0 +1,322 @@
+import json
+import re
+
+from .exceptions import SPARQLPatternsError
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+XSD_STRING = XSD + "string"
+
+
+class Graph:
+    """A compact, indexed set of triples, as parsed from a CONSTRUCT response.
+
+    Each distinct term is stored once, as a tuple: `("uri", iri)`, `("bnode", label)`
+    or `("literal", value, datatype, language)`, and the triples are held as term ids
+    in a subject -> predicate -> objects index, in the order they were added."""
+
+    def __init__(self):
+        self.terms = []
+        self._ids = {}
+        self._spo = {}
+        self._objects = set()
+        self._length = 0
+
+    def term_id(self, term: tuple):
+        if (tid := self._ids.get(term)) is None:
+            tid = self._ids[term] = len(self.terms)
+            self.terms.append(term)
+        return tid
+
+    def find_term(self, term: tuple):
+        """The id of a term, or None if it is not in the graph"""
+        return self._ids.get(term)
+
+    def add(self, s: tuple, p: tuple, o: tuple):
+        sid, pid, oid = self.term_id(s), self.term_id(p), self.term_id(o)
+        objects = self._spo.setdefault(sid, {}).setdefault(pid, {})
+        if oid not in objects:
+            objects[oid] = None
+            self._objects.add(oid)
+            self._length += 1
+
+    def subjects(self):
+        """The ids of the subjects, in the order they were first added"""
+        return self._spo.keys()
+
+    def properties(self, sid: int):
+        """A dict of predicate id -> object ids for a subject"""
+        return self._spo.get(sid, {})
+
+    def is_subject(self, tid: int):
+        return tid in self._spo
+
+    def is_object(self, tid: int):
+        return tid in self._objects
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        terms = self.terms
+        for sid, predicates in self._spo.items():
+            for pid, objects in predicates.items():
+                for oid in objects:
+                    yield terms[sid], terms[pid], terms[oid]
+
+    def __contains__(self, triple):
+        s, p, o = (self._ids.get(t) for t in triple)
+        return o in self._spo.get(s, {}).get(p, ())
+
+    def __repr__(self):
+        return f"Graph(triples={self._length}, terms={len(self.terms)})"
+
+    @classmethod
+    def from_response(cls, response):
+        """Parse a CONSTRUCT response: JSON-LD (decoded, or as text) or N-Triples"""
+        match response:
+            case dict() | list():
+                return parse_jsonld(response)
+            case bytes():
+                return cls.from_response(response.decode("utf-8"))
+            case str() if response.lstrip().startswith(("{", "[")):
+                return parse_jsonld(json.loads(response))
+            case str():
+                return parse_ntriples(response)
+            case _:
+                raise SPARQLPatternsError(
+                    f"Cannot read a graph from a response of type {type(response).__name__}"
+                )
+
+
+# N-Triples
+
+_ESCAPE = re.compile(r"\\(?:u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))")
+_ECHAR = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f"}
+
+_NT_TERM = (
+    r"<(?P<{0}iri>[^>]*)>"
+    r"|_:(?P<{0}bnode>[^\s<\"]+?)(?=[\s.]|$)"
+    r'|"(?P<{0}lit>(?:[^"\\]|\\.)*)"'
+    r"(?:\^\^<(?P<{0}dt>[^>]*)>|@(?P<{0}lang>[A-Za-z]+(?:-[A-Za-z0-9]+)*))?"
+)
+_NT_LINE = re.compile(
+    rf"\s*(?:{_NT_TERM.format('s')})\s*<(?P<p>[^>]*)>\s*(?:{_NT_TERM.format('o')})"
+    r"\s*\.\s*(?:#.*)?$"
+)
+
+
+def _unescape(value):
+    if "\\" not in value:
+        return value
+
+    def _replace(m):
+        if m.group(1) or m.group(2):
+            return chr(int(m.group(1) or m.group(2), 16))
+        return _ECHAR.get(m.group(3), m.group(3))
+
+    return _ESCAPE.sub(_replace, value)
+
+
+def _nt_term(m, prefix):
+    if (iri := m.group(prefix + "iri")) is not None:
+        return ("uri", _unescape(iri))
+    if (bnode := m.group(prefix + "bnode")) is not None:
+        return ("bnode", bnode)
+    lang = m.group(prefix + "lang")
+    datatype = m.group(prefix + "dt")
+    return (
+        "literal",
+        _unescape(m.group(prefix + "lit")),
+        _unescape(datatype) if datatype else None,
+        lang.lower() if lang else None,
+    )
+
+
+def parse_ntriples(source, graph: Graph | None = None):
+    """Parse N-Triples (a string, or an iterable of lines) into a Graph"""
+    graph = graph if graph is not None else Graph()
+    lines = source.splitlines() if isinstance(source, str) else source
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if (m := _NT_LINE.match(line)) is None:
+            raise SPARQLPatternsError(
+                f"Could not parse line {number} as N-Triples: {stripped[:80]}"
+            )
+        graph.add(_nt_term(m, "s"), ("uri", _unescape(m.group("p"))), _nt_term(m, "o"))
+    return graph
+
+
+# JSON-LD (the subset that SPARQL endpoints return: expanded or flattened documents,
+# or compacted ones with an inline @context of term and prefix definitions)
+
+
+class Context:
+    """An inline JSON-LD @context: term and prefix definitions, and @vocab. Remote
+    contexts (URLs) are not fetched."""
+
+    def __init__(self, context=None):
+        self.terms = {}  # term -> IRI
+        self.coercion = {}  # IRI -> '@id' or a datatype IRI
+        self.vocab = None
+        for ctx in context if isinstance(context, list) else [context]:
+            match ctx:
+                case None:
+                    continue
+                case dict():
+                    self._add(ctx)
+                case _:
+                    raise SPARQLPatternsError(
+                        "Only inline JSON-LD contexts are supported, not " f"{ctx!r}"
+                    )
+
+    def _add(self, ctx):
+        self.vocab = ctx.get("@vocab", self.vocab)
+        definitions = {}
+        for term, definition in ctx.items():
+            if term.startswith("@"):
+                continue
+            match definition:
+                case str():
+                    definitions[term] = (definition, None)
+                case {"@id": iri, **rest}:
+                    definitions[term] = (iri, rest.get("@type"))
+                case {"@type": coerce}:
+                    # a term defined by @vocab or as a compact IRI, with a type
+                    definitions[term] = (term, coerce)
+        # Terms can be defined with compact IRIs using prefixes from the same context
+        for term, (iri, coerce) in definitions.items():
+            self.terms[term] = iri
+        for term, (iri, coerce) in definitions.items():
+            iri = self.terms[term] = self.expand(iri, vocab=False)
+            if coerce is not None:
+                self.coercion[iri] = (
+                    coerce if coerce in ("@id", "@vocab") else self.expand(coerce)
+                )
+
+    def extended(self, context):
+        """A new Context with the definitions of `context` added to these"""
+        ctx = Context()
+        ctx.terms, ctx.coercion, ctx.vocab = (
+            dict(self.terms),
+            dict(self.coercion),
+            self.vocab,
+        )
+        for added in context if isinstance(context, list) else [context]:
+            if added is not None:
+                ctx._add(added)
+        return ctx
+
+    def expand(self, value: str, vocab: bool = True):
+        """Expand a term or compact IRI. Returns None for a term that cannot be
+        expanded (which JSON-LD drops)."""
+        if vocab and value in self.terms:
+            return self.terms[value]
+        prefix, sep, suffix = value.partition(":")
+        if sep:
+            if prefix == "_" or suffix.startswith("//"):
+                return value
+            if prefix in self.terms:
+                return self.terms[prefix] + suffix
+            return value
+        if vocab and self.vocab is not None:
+            return self.vocab + value
+        return value if not vocab else None
+
+
+def _literal(value, datatype=None, language=None):
+    match value:
+        case bool():
+            return ("literal", "true" if value else "false", XSD + "boolean", None)
+        case int():
+            return ("literal", str(value), XSD + "integer", None)
+        case float():
+            return ("literal", repr(value), XSD + "double", None)
+    if datatype == XSD_STRING:
+        datatype = None
+    return ("literal", str(value), datatype, language.lower() if language else None)
+
+
+class _JSONLDReader:
+    def __init__(self, graph):
+        self.graph = graph
+        self._bnodes = 0
+
+    def _node_term(self, node_id, ctx):
+        if node_id is None:
+            self._bnodes += 1
+            return ("bnode", f"b{self._bnodes}")
+        if node_id.startswith("_:"):
+            return ("bnode", node_id[2:])
+        return ("uri", ctx.expand(node_id, vocab=False))
+
+    def node(self, node, ctx):
+        if "@context" in node:
+            ctx = ctx.extended(node["@context"])
+        subject = self._node_term(node.get("@id"), ctx)
+
+        types = node.get("@type", [])
+        for t in types if isinstance(types, list) else [types]:
+            self.graph.add(subject, ("uri", RDF_TYPE), ("uri", ctx.expand(t)))
+
+        for key, values in node.items():
+            if key.startswith("@"):
+                if key == "@graph":
+                    self.nodes(values, ctx)
+                continue
+            if (predicate := ctx.expand(key)) is None:
+                continue
+            coerce = ctx.coercion.get(predicate)
+            for value in values if isinstance(values, list) else [values]:
+                if (obj := self.value(value, ctx, coerce)) is not None:
+                    self.graph.add(subject, ("uri", predicate), obj)
+        return subject
+
+    def value(self, value, ctx, coerce=None):
+        match value:
+            case None:
+                return None
+            case {"@value": v, **rest}:
+                datatype = rest.get("@type")
+                return _literal(
+                    v, ctx.expand(datatype) if datatype else None, rest.get("@language")
+                )
+            case {"@list": items} | {"@set": items}:
+                # Lists are read as plain values (their order is not kept)
+                for item in items[:-1]:
+                    self.value(item, ctx, coerce)
+                return self.value(items[-1], ctx, coerce) if items else None
+            case dict():
+                return self.node(value, ctx)
+            case str() if coerce == "@id":
+                return self._node_term(value, ctx)
+            case str() if coerce == "@vocab":
+                return ("uri", ctx.expand(value))
+            case str() if coerce is not None:
+                return _literal(value, coerce)
+            case _:
+                return _literal(value)
+
+    def nodes(self, nodes, ctx):
+        for node in nodes if isinstance(nodes, list) else [nodes]:
+            self.node(node, ctx)
+
+
+def parse_jsonld(doc, graph: Graph | None = None):
+    """Read a decoded JSON-LD document into a Graph"""
+    graph = graph if graph is not None else Graph()
+    reader = _JSONLDReader(graph)
+    match doc:
+        case list():
+            reader.nodes(doc, Context())
+        case {"@graph": nodes, **rest} if not (set(rest) - {"@context", "@id"}):
+            reader.nodes(nodes, Context(doc.get("@context")))
+        case dict():
+            reader.node(doc, Context())
+        case _:
+            raise SPARQLPatternsError("Not a JSON-LD document")
+    return graph
@@ -0,0 +1,286 @@
+import bisect
+import contextvars
+import logging
+import threading
+
+from .graph import Graph
+
+logger = logging.getLogger(__name__)
+
+
+class QueryEvent:
+    """What is known about one execution of a pattern, passed to the hooks.
+
+    Pre-execution hooks see the pattern name, stype, endpoint, query hash and render
+    time. Post-execution hooks see the same event once the query has finished, with
+    the timings (in seconds), the response size in bytes (None if the client did not
+    report it), the number of rows (or 1 for an ASK/count result), whether the
+    result came from the cache or from another caller's identical query, and any
+    exception that was raised."""
+
+    __slots__ = (
+        "pattern",
+        "stype",
+        "endpoint",
+        "query_hash",
+        "render_time",
+        "endpoint_time",
+        "parse_time",
+        "response_bytes",
+        "rows",
+        "cached",
+        "coalesced",
+        "error",
+    )
+
+    def __init__(self, pattern, stype, endpoint, query_hash, render_time=None):
+        self.pattern = pattern
+        self.stype = stype
+        self.endpoint = endpoint
+        self.query_hash = query_hash
+        self.render_time = render_time
+        self.endpoint_time = None
+        self.parse_time = None
+        self.response_bytes = None
+        self.rows = None
+        self.cached = False
+        self.coalesced = False
+        self.error = None
+
+    @property
+    def total_time(self):
+        return sum(
+            t or 0.0 for t in (self.render_time, self.endpoint_time, self.parse_time)
+        )
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"QueryEvent({fields})"
+
+
+class Hooks:
+    """The pre- and post-execution hooks for a PatternSet (or, for the registry, for
+    every pattern). `active` is kept up to date so that checking for hooks costs a
+    single attribute lookup when there are none."""
+
+    def __init__(self):
+        self.pre = []
+        self.post = []
+        self.active = False
+
+    def add(self, pre=None, post=None):
+        if pre is not None:
+            self.pre.append(pre)
+        if post is not None:
+            self.post.append(post)
+        self.active = bool(self.pre or self.post)
+
+    def remove(self, hook):
+        for hooks in (self.pre, self.post):
+            while hook in hooks:
+                hooks.remove(hook)
+        self.active = bool(self.pre or self.post)
+
+    def clear(self):
+        self.pre.clear()
+        self.post.clear()
+        self.active = False
+
+
+# Hooks that are called for every pattern, see SPARQLRegistry.add_hook
+global_hooks = Hooks()
+
+
+def call_hooks(hooks, event):
+    for hook in hooks:
+        try:
+            hook(event)
+        except Exception:
+            # A broken hook should not break the query it is observing
+            logger.exception(f"Instrumentation hook {hook!r} failed")
+
+
+def query_hash(canonical_query: str):
+    import hashlib
+
+    return hashlib.blake2b(canonical_query.encode(), digest_size=8).hexdigest()
+
+
+def result_rows(result):
+    match result:
+        case list() | dict() | tuple():
+            return len(result)
+        case Graph():
+            # the number of triples
+            return len(result)
+        case None:
+            return 0
+        case _:
+            return 1
+
+
+# The measure_response_bytes for the query being run in the current context. The
+# context (and so the same object) is carried into the threads and tasks a query is
+# handed to, eg by asyncio.to_thread, so a size reported there is not lost.
+_response_size = contextvars.ContextVar(
+    "gettysparqlpatterns_response_size", default=None
+)
+
+
+def note_response_bytes(size: int):
+    """Called by a sparql client (eg HTTPSPARQLClient) to report the size of the
+    response body that it is about to return, for the instrumentation."""
+    if (measure := _response_size.get()) is not None:
+        measure.bytes = size
+
+
+class measure_response_bytes:
+    """Collect the response size reported (with `note_response_bytes`) by the sparql
+    client a query is sent to in this block, as `bytes` (None if it did not report
+    one)"""
+
+    __slots__ = ("bytes", "_token")
+
+    def __enter__(self):
+        self.bytes = None
+        self._token = _response_size.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _response_size.reset(self._token)
+
+
+# Latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _PatternStats:
+    __slots__ = (
+        "count",
+        "errors",
+        "cached",
+        "coalesced",
+        "seconds",
+        "buckets",
+        "response_bytes",
+        "rows",
+    )
+
+    def __init__(self, n_buckets):
+        self.count = 0
+        self.errors = 0
+        self.cached = 0
+        self.coalesced = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (n_buckets + 1)  # the last is +Inf
+        self.response_bytes = 0
+        self.rows = 0
+
+
+class PatternMetrics:
+    """A post-execution hook that aggregates the query events per pattern: counts of
+    queries, errors, cache hits and coalesced queries, the total rows and response
+    bytes, and a histogram of the query latency (render + endpoint + parse time).
+
+        metrics = PatternMetrics()
+        SPARQLRegistry.add_hook(post=metrics)
+        ...
+        metrics.prometheus_text()
+
+    Recording an event takes a lock and a bisect, so it is cheap enough to leave on."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix: str = "gettysparqlpatterns"):
+        self.bucket_bounds = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: QueryEvent):
+        self.record(event)
+
+    def record(self, event: QueryEvent):
+        key = (event.pattern, event.stype)
+        latency = event.total_time
+        bucket = bisect.bisect_left(self.bucket_bounds, latency)
+        with self._lock:
+            if (stats := self._stats.get(key)) is None:
+                stats = self._stats[key] = _PatternStats(len(self.bucket_bounds))
+            stats.count += 1
+            stats.seconds += latency
+            stats.buckets[bucket] += 1
+            if event.error is not None:
+                stats.errors += 1
+            if event.cached:
+                stats.cached += 1
+            if event.coalesced:
+                stats.coalesced += 1
+            if event.response_bytes:
+                stats.response_bytes += event.response_bytes
+            if event.rows:
+                stats.rows += event.rows
+
+    def snapshot(self):
+        """The metrics as a dict of (pattern, stype) -> dict of values"""
+        with self._lock:
+            return {
+                key: {
+                    "count": s.count,
+                    "errors": s.errors,
+                    "cached": s.cached,
+                    "coalesced": s.coalesced,
+                    "seconds": s.seconds,
+                    "response_bytes": s.response_bytes,
+                    "rows": s.rows,
+                    "buckets": dict(
+                        zip(self.bucket_bounds + (float("inf"),), s.buckets)
+                    ),
+                }
+                for key, s in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format"""
+        p = self.prefix
+        counters = [
+            ("queries_total", "count", "Pattern queries run"),
+            ("errors_total", "errors", "Pattern queries that raised an exception"),
+            ("cache_hits_total", "cached", "Pattern results served from the cache"),
+            ("coalesced_total", "coalesced", "Pattern queries shared with another"),
+            ("rows_total", "rows", "Result rows returned"),
+            ("response_bytes_total", "response_bytes", "Response bytes received"),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for name, field, help_text in counters:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} counter")
+            for (pattern, stype), stats in snapshot.items():
+                labels = _labels(pattern=pattern, stype=stype)
+                lines.append(f"{p}_{name}{{{labels}}} {stats[field]}")
+
+        name = f"{p}_query_duration_seconds"
+        lines.append(f"# HELP {name} Pattern query latency")
+        lines.append(f"# TYPE {name} histogram")
+        for (pattern, stype), stats in snapshot.items():
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _labels(pattern=pattern, stype=stype, le=le)
+                lines.append(f"{name}_bucket{{{labels}}} {cumulative}")
+            labels = _labels(pattern=pattern, stype=stype)
+            lines.append(f"{name}_sum{{{labels}}} {stats['seconds']}")
+            lines.append(f"{name}_count{{{labels}}} {stats['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+
+from .exceptions import CircuitOpenError
+from .waiting import WaitQueue
+
+logger = logging.getLogger(__name__)
+
+
+def is_query_error(exc):
+    """Whether an exception from a sparql client method is a problem with the query
+    (a 4xx response, other than 429) rather than with the endpoint"""
+    status = getattr(getattr(exc, "response", None), "status_code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+class AdaptiveLimiter:
+    """Limits the number of queries in flight to an endpoint, adapting the limit to
+    what the endpoint can sustain (additive increase, multiplicative decrease):
+
+        limiter = AdaptiveLimiter()
+        ps.set_limiter(limiter)
+        ps.run_many(calls, max_workers=64)  # no more than limiter.limit at once
+
+    The limit starts at `initial_limit`. While at least half of it is in use, each
+    query that succeeds within `tolerance` times the endpoint's baseline latency
+    raises it by 1/limit, ie by about one per round of queries. The baseline is the
+    lowest latency seen, over the last `baseline_window` seconds or more. A query
+    that fails, or is slower than that, multiplies it by `backoff`, no more than
+    once per baseline latency so that one burst of slow queries is only counted
+    once. The limit stays between `min_limit` and `max_limit`.
+
+    Callers over the limit wait, in the order they arrived. Use one limiter per
+    endpoint."""
+
+    def __init__(
+        self,
+        initial_limit: float = 10,
+        min_limit: float = 1,
+        max_limit: float = 200,
+        backoff: float = 0.9,
+        tolerance: float = 2.0,
+        baseline_window: float = 30.0,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.baseline_window = baseline_window
+
+        self.in_flight = 0
+        self.baseline = None  # seconds
+        self.decreases = 0
+
+        self._last_decrease = 0.0
+        self._window_start = time.monotonic()
+        self._window_min = None
+        self._lock = threading.Lock()
+        self._waiters = WaitQueue(self._lock)
+
+    def _try_acquire(self):
+        # With the lock held
+        if not self._waiters and self.in_flight < max(int(self.limit), 1):
+            self.in_flight += 1
+            return True
+        return False
+
+    def acquire(self, timeout: float | None = None):
+        """Wait for a slot, raising QueryTimeoutError after `timeout` seconds"""
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = self._waiters.enqueue()
+        # The slot is handed over by `release`
+        self._waiters.wait(waiter, timeout, self._release_slot, _TIMED_OUT)
+
+    async def aacquire(self, timeout: float | None = None):
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = self._waiters.aenqueue()
+        await self._waiters.await_slot(waiter, timeout, self._release_slot, _TIMED_OUT)
+
+    def _release_slot(self):
+        # With the lock held: hand the slot to the next waiter, if the limit allows
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < max(int(self.limit), 1):
+            self.in_flight += 1
+            self._waiters.wake_next()
+
+    def discard(self):
+        """Give back a slot without counting its query towards the limit, eg as it was
+        cancelled or not sent, or failed because of the query itself"""
+        with self._lock:
+            self._release_slot()
+
+    def release(self, latency: float, failed: bool = False):
+        """Give back a slot, with how long the query took and whether it failed"""
+        now = time.monotonic()
+        with self._lock:
+            if not failed:
+                if self.baseline is None or latency < self.baseline:
+                    self.baseline = latency
+                if self._window_min is None or latency < self._window_min:
+                    self._window_min = latency
+                if now - self._window_start >= self.baseline_window:
+                    # in case the endpoint has become slower for good
+                    self.baseline = self._window_min
+                    self._window_start, self._window_min = now, None
+
+            if failed or latency > self.baseline * self.tolerance:
+                if now - self._last_decrease >= (self.baseline or 0):
+                    self.limit = max(self.limit * self.backoff, self.min_limit)
+                    self._last_decrease = now
+                    self.decreases += 1
+            elif self.in_flight * 2 >= self.limit:
+                self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            self._release_slot()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "baseline": self.baseline,
+                "decreases": self.decreases,
+            }
+
+
+_TIMED_OUT = "The deadline passed while waiting for the concurrency limiter"
+
+
+class CircuitBreaker:
+    """Fails queries fast while an endpoint is down.
+
+    After `failure_threshold` consecutive failures the circuit opens, and queries
+    raise `CircuitOpenError` without being sent. After `reset_timeout` seconds it is
+    half open, letting `half_open_max` trial queries through: if one succeeds the
+    circuit closes again, if one fails it reopens for another `reset_timeout`.
+
+    Problems with the query itself (4xx responses) are not counted as failures. Use
+    one breaker per endpoint."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max: int = 1,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trials = 0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if a query should not be sent now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"The circuit is open after {self.failures} failures, "
+                        "not sending the query"
+                    )
+                self.state = self.HALF_OPEN
+                self._trials = 0
+            if self._trials >= self.half_open_max:
+                self.rejected += 1
+                raise CircuitOpenError(
+                    "The circuit is half open and already trying a query"
+                )
+            self._trials += 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit closed, the endpoint is answering again")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.failures >= self.failure_threshold
+            ):
+                if self.state == self.CLOSED:
+                    logger.warning(f"Circuit opened after {self.failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_cancelled(self):
+        """Record a query that was cancelled before it finished"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record_error(self, exc):
+        """Record a query that raised `exc`"""
+        if is_query_error(exc):
+            # The endpoint answered
+            self.record_success()
+        else:
+            self.record_failure()
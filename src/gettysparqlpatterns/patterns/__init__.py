@@ -1,10 +1,9 @@
 # from .archivalpatterns import patternlist as archivalpatterns
 from ..utilities import load_from_package
 
-from ..registry import SPARQLRegistry, PatternSet
+from ..registry import SPARQLRegistry
 
 
 def pattern_load():
-    # Load data from a patternset exported as JSON
-    archival_patterns = PatternSet(from_builtin="archival_patterns.json")
-    SPARQLRegistry.register("archival", archival_patterns)
+    # Register the patternset exported as JSON, to be loaded when it is first used
+    SPARQLRegistry.register_preset("archival", "archival_patterns.json")
@@ -0,0 +1,349 @@
+import logging
+import random
+import threading
+import time
+
+from collections import deque
+
+from .cache import ANONYMOUS_ENDPOINT, endpoint_key, is_anonymous_endpoint
+from .deadlines import send_query
+from .exceptions import QueryTimeoutError
+from .instrumentation import measure_response_bytes, note_response_bytes
+from .limits import is_query_error
+
+logger = logging.getLogger(__name__)
+
+
+class _Replica:
+    __slots__ = (
+        "client",
+        "key",
+        "latency",
+        "error_rate",
+        "in_flight",
+        "requests",
+        "errors",
+        "failures",
+        "ejections",
+        "ejected_until",
+    )
+
+    def __init__(self, client):
+        self.client = client
+        self.key = endpoint_key(client)
+        self.latency = None  # EWMA, in seconds
+        self.error_rate = 0.0  # EWMA of 0 (success) / 1 (error)
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0  # consecutive
+        self.ejections = 0  # consecutive
+        self.ejected_until = 0.0
+
+    def score(self):
+        # Lower is better. Replicas not yet measured are tried first.
+        if self.latency is None:
+            return 0.0
+        return self.latency * (self.in_flight + 1) / max(1.0 - self.error_rate, 0.05)
+
+
+class EndpointPool:
+    """A sparql client method that spreads queries over several replicas of the same
+    endpoint, for use with `PatternSet.set_sparql_client_method`:
+
+        pool = EndpointPool(["https://replica1/sparql", "https://replica2/sparql"])
+        ps.set_sparql_client_method(pool)
+
+    `endpoints` are endpoint URLs (each queried with its own `HTTPSPARQLClient`) or
+    sparql client methods. Each query goes to the better of two randomly picked
+    replicas, scored on their latency (an exponentially weighted moving average, with
+    weight `alpha` for each new sample), error rate and queries in flight.
+
+    After `max_failures` consecutive errors a replica is ejected for `ejection_time`
+    seconds, doubling each time it fails again when it is let back in, up to
+    `max_ejection_time`. If every replica is ejected, the one due back first is
+    used. A query that fails is tried once more on another replica if `failover` is
+    True (but not for a 4xx response, which is a problem with the query itself).
+
+    With `hedge`, if a query has not been answered after `hedge_delay` seconds (by
+    default, the `hedge_percentile` of the pool's recent latencies) the same query
+    is sent to a second replica, and whichever answers first is returned. This cuts
+    the tail latency at the cost of a little extra load. The slower query is not
+    cancelled, but its result is discarded.
+
+    A `timeout` (eg the time left before a pattern's deadline) is for the query as a
+    whole, including any failover or hedge, and the time left is passed on to each
+    replica that takes a timeout.
+
+    All of the replicas should hold the same data: results are cached (and
+    instrumented) under the pool's `endpoint`, `name` or one made from the replicas.
+    If any replica does not expose its endpoint URL, that is only the same within
+    this process (see `is_anonymous_endpoint`), so pass a `name` to share results
+    through a `SQLiteResultCache`."""
+
+    def __init__(
+        self,
+        endpoints: list,
+        name: str | None = None,
+        alpha: float = 0.3,
+        max_failures: int = 3,
+        ejection_time: float = 10.0,
+        max_ejection_time: float = 300.0,
+        failover: bool = True,
+        hedge: bool = False,
+        hedge_delay: float | None = None,
+        hedge_percentile: float = 0.95,
+        history: int = 500,
+        max_workers: int = 32,
+        seed: int | None = None,
+    ):
+        if not endpoints:
+            raise ValueError("An EndpointPool needs at least one endpoint")
+        self._owned = []
+        replicas = []
+        for endpoint in endpoints:
+            if isinstance(endpoint, str):
+                from .client import HTTPSPARQLClient
+
+                endpoint = HTTPSPARQLClient(endpoint)
+                self._owned.append(endpoint)
+            replicas.append(_Replica(endpoint))
+        self.replicas = replicas
+        self.endpoint = name or _pool_name(replicas)
+
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.failover = failover
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.max_workers = max_workers
+
+        # The number of queries that were hedged, and that the hedge answered first
+        self.hedged = 0
+        self.hedge_wins = 0
+
+        self._latencies = deque(maxlen=history)  # recent successful latencies
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._executor = None
+
+    # Choosing a replica
+
+    def _choose(self, exclude=None):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                r for r in self.replicas if r is not exclude and r.ejected_until <= now
+            ]
+            if not candidates:
+                ejected = [r for r in self.replicas if r is not exclude]
+                if not ejected:
+                    return None
+                replica = min(ejected, key=lambda r: r.ejected_until)
+            elif len(candidates) == 1:
+                replica = candidates[0]
+            else:
+                a, b = self._random.sample(candidates, 2)
+                replica = a if a.score() <= b.score() else b
+            replica.in_flight += 1
+            return replica
+
+    def _record(self, replica, latency, error=False):
+        alpha = self.alpha
+        with self._lock:
+            replica.in_flight -= 1
+            replica.requests += 1
+            replica.error_rate += alpha * ((1.0 if error else 0.0) - replica.error_rate)
+            if error:
+                replica.errors += 1
+                replica.failures += 1
+                if replica.failures >= self.max_failures:
+                    replica.ejected_until = time.monotonic() + min(
+                        self.ejection_time * 2**replica.ejections,
+                        self.max_ejection_time,
+                    )
+                    replica.ejections += 1
+                    logger.warning(
+                        f"Ejected SPARQL endpoint {replica.key} after "
+                        f"{replica.failures} consecutive errors"
+                    )
+                return
+            replica.latency = (
+                latency
+                if replica.latency is None
+                else replica.latency + alpha * (latency - replica.latency)
+            )
+            replica.failures = 0
+            replica.ejections = 0
+            self._latencies.append(latency)
+
+    def _call(self, replica, query, at=None):
+        # `replica` has already had its in_flight count raised by _choose
+        start = time.perf_counter()
+        try:
+            response = send_query(replica.client, query, _time_left(at))
+        except Exception as e:
+            self._record(
+                replica, time.perf_counter() - start, error=not is_query_error(e)
+            )
+            raise
+        self._record(replica, time.perf_counter() - start)
+        return response
+
+    def _measured_call(self, replica, query, at=None):
+        # For _call on a worker thread, returning the response size the replica
+        # reported there so that it can be passed on from the caller's thread
+        with measure_response_bytes() as size:
+            return self._call(replica, query, at), size.bytes
+
+    def _call_with_failover(self, replica, query, at=None):
+        try:
+            return self._call(replica, query, at)
+        except Exception as e:
+            if not self._can_fail_over(e, at):
+                raise
+            if (other := self._choose(exclude=replica)) is None:
+                raise
+            logger.info(f"Query to {replica.key} failed ({e}), trying {other.key}")
+            return self._call(other, query, at)
+
+    def _can_fail_over(self, error, at):
+        if not self.failover or is_query_error(error):
+            return False
+        return at is None or time.monotonic() < at
+
+    # Hedging
+
+    def current_hedge_delay(self):
+        """The seconds to wait before hedging a query, or None if there are not yet
+        enough latency samples to judge"""
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._latencies) < 20:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.hedge_percentile), len(ordered) - 1)
+        return ordered[index]
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ThreadPoolExecutor
+
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="gettysparqlpatterns-pool",
+                    )
+        return self._executor
+
+    def _hedged(self, query, delay, at=None):
+        from concurrent.futures import FIRST_COMPLETED, wait
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+
+        primary = self._choose()
+        first = self._pool().submit(self._measured_call, primary, query, at)
+        done, _ = wait([first], timeout=_earlier(delay, _time_left(at)))
+        if not done and (at is None or time.monotonic() < at):
+            if (other := self._choose(exclude=primary)) is not None:
+                with self._lock:
+                    self.hedged += 1
+                second = self._pool().submit(self._measured_call, other, query, at)
+                pending = {first, second}
+                error = None
+                while pending:
+                    done, pending = wait(
+                        pending, timeout=_time_left(at), return_when=FIRST_COMPLETED
+                    )
+                    if not done:
+                        raise _timeout_error()
+                    for future in done:
+                        if future.exception() is None:
+                            if future is second:
+                                with self._lock:
+                                    self.hedge_wins += 1
+                            return _answered(*future.result())
+                        if future is first or error is None:
+                            error = future.exception()
+                raise error
+
+        try:
+            return _answered(*first.result(_time_left(at)))
+        except FutureTimeoutError:
+            if first.done():
+                raise  # raised by the client itself
+            raise _timeout_error() from None
+        except Exception as e:
+            if not self._can_fail_over(e, at):
+                raise
+            if (other := self._choose(exclude=primary)) is None:
+                raise
+            return self._call(other, query, at)
+
+    def __call__(self, query: str, timeout: float | None = None):
+        at = None if timeout is None else time.monotonic() + timeout
+        if self.hedge and (delay := self.current_hedge_delay()) is not None:
+            return self._hedged(query, delay, at)
+        return self._call_with_failover(self._choose(), query, at)
+
+    def stats(self):
+        """The state of each replica, by endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                r.key: {
+                    "latency": r.latency,
+                    "error_rate": r.error_rate,
+                    "in_flight": r.in_flight,
+                    "requests": r.requests,
+                    "errors": r.errors,
+                    "ejected": r.ejected_until > now,
+                }
+                for r in self.replicas
+            }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        for client in self._owned:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"EndpointPool({[r.key for r in self.replicas]!r})"
+
+
+def _pool_name(replicas):
+    name = "pool:" + ",".join(sorted(r.key for r in replicas))
+    if any(is_anonymous_endpoint(r.key) for r in replicas):
+        # Only meaningful in this process, as are the replicas' keys
+        return ANONYMOUS_ENDPOINT + name
+    return name
+
+
+def _answered(response, size):
+    if size is not None:
+        note_response_bytes(size)
+    return response
+
+
+def _time_left(at):
+    return None if at is None else max(at - time.monotonic(), 0.0)
+
+
+def _earlier(a, b):
+    return a if b is None or a < b else b
+
+
+def _timeout_error():
+    return QueryTimeoutError("No replica answered the query within its timeout")
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+import zlib
+
+from .cache import canonical_query, endpoint_key
+from .deadlines import send_query
+from .exceptions import NoRecordedResponseError, QueryTimeoutError
+
+# Recording SPARQL traffic to replay it later, eg to benchmark or regression test a
+# workload of patterns without the live endpoint:
+#
+#     recorder = RecordingClient(lodgateway.sparql, "traffic.sqlite")
+#     ps.set_sparql_client_method(recorder)
+#     ... run the workload ...
+#
+#     ps.set_sparql_client_method(ReplayClient("traffic.sqlite", speed=1.0))
+#     ... run it again, offline ...
+#
+# Responses are keyed on the endpoint they came from and the rendered query with its
+# whitespace normalised (as for the result cache), and stored zlib-compressed in a
+# sqlite file.
+
+
+class ResponseStore:
+    """A sqlite file of recorded (endpoint, query) -> response, with the time each
+    took"""
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    query_key TEXT,
+                    endpoint TEXT,
+                    query TEXT,
+                    is_json INTEGER,
+                    body BLOB,
+                    latency REAL,
+                    recorded_at REAL,
+                    PRIMARY KEY (endpoint, query_key)
+                )"""
+            )
+
+    def put(self, query: str, endpoint: str, response, latency: float):
+        if isinstance(response, (dict, list)):
+            body, is_json = json.dumps(response, separators=(",", ":")), 1
+        elif isinstance(response, (str, bytes)):
+            body, is_json = response, 0
+        else:
+            raise TypeError(
+                f"Cannot record a response of type {type(response).__name__}"
+            )
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    canonical_query(query),
+                    endpoint,
+                    query,
+                    is_json,
+                    zlib.compress(body),
+                    latency,
+                    time.time(),
+                ),
+            )
+
+    def get(self, query: str, endpoint: str | None = None):
+        """The recorded (response, latency) for a query sent to `endpoint`, or to any
+        endpoint (the latest recording) if that is None, or None if there is none"""
+        sql = "SELECT is_json, body, latency FROM responses WHERE query_key = ?"
+        params = (canonical_query(query),)
+        if endpoint is not None:
+            sql += " AND endpoint = ?"
+            params += (endpoint,)
+        with self._lock:
+            row = self._db.execute(
+                sql + " ORDER BY recorded_at DESC LIMIT 1", params
+            ).fetchone()
+        if row is None:
+            return None
+        is_json, body, latency = row
+        body = zlib.decompress(body)
+        return (json.loads(body) if is_json else body.decode("utf-8")), latency
+
+    def queries(self, endpoint: str | None = None):
+        sql, params = "SELECT query FROM responses", ()
+        if endpoint is not None:
+            sql, params = sql + " WHERE endpoint = ?", (endpoint,)
+        with self._lock:
+            return [q for (q,) in self._db.execute(sql, params)]
+
+    def endpoints(self):
+        """The endpoints that responses were recorded from"""
+        with self._lock:
+            return [
+                e
+                for (e,) in self._db.execute(
+                    "SELECT DISTINCT endpoint FROM responses ORDER BY endpoint"
+                )
+            ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM responses").fetchone()[0]
+
+
+def _store(store):
+    return store if isinstance(store, ResponseStore) else ResponseStore(store)
+
+
+class RecordingClient:
+    """Wraps a sparql client method, recording every query it runs and the (decoded)
+    response to a `ResponseStore` (or a path to one) before returning it. Responses
+    that are streams, rather than a decoded dict or text, are not recorded."""
+
+    def __init__(self, sparql_client_method, store):
+        self.sparql_client_method = sparql_client_method
+        self.store = _store(store)
+        # Cache keys and instrumentation see the wrapped client's endpoint
+        self.endpoint = endpoint_key(sparql_client_method)
+
+    def __call__(self, query: str, timeout: float | None = None):
+        start = time.perf_counter()
+        response = send_query(self.sparql_client_method, query, timeout)
+        latency = time.perf_counter() - start
+        if isinstance(response, (dict, list, str, bytes)):
+            self.store.put(query, self.endpoint, response, latency)
+        return response
+
+
+class ReplayClient:
+    """A sparql client method that answers queries from a `ResponseStore` (or a path
+    to one) recorded by `RecordingClient`. Raises `NoRecordedResponseError` for a
+    query that was not recorded.
+
+    By default responses are returned immediately. With `speed`, each response is
+    delayed by its recorded latency divided by `speed` (so 1.0 is real time, 2.0 twice
+    as fast), and `latency` adds a fixed delay in seconds to every response. A
+    response that would be delayed for longer than the `timeout` it is called with
+    raises QueryTimeoutError once the timeout has passed.
+
+    The replayed responses are those recorded from `endpoint`, which is also the
+    endpoint the client reports (so that cache and instrumentation keys match the
+    recording). It defaults to the endpoint the store was recorded from; a store
+    recorded from several endpoints is replayed as one, under `replay:<path>`."""
+
+    def __init__(
+        self,
+        store,
+        speed: float | None = None,
+        latency: float = 0.0,
+        endpoint: str | None = None,
+    ):
+        self.store = _store(store)
+        self.speed = speed
+        self.latency = latency
+        if endpoint is None and len(endpoints := self.store.endpoints()) == 1:
+            endpoint = endpoints[0]
+        # The endpoint the responses are looked up for, None for any
+        self._recorded_endpoint = endpoint
+        self.endpoint = endpoint or f"replay:{self.store.path}"
+
+    def __call__(self, query: str, timeout: float | None = None):
+        if (recorded := self.store.get(query, self._recorded_endpoint)) is None:
+            raise NoRecordedResponseError(
+                f"No response was recorded for the query: {query}"
+            )
+        response, recorded_latency = recorded
+
+        delay = self.latency
+        if self.speed:
+            delay += recorded_latency / self.speed
+        if timeout is not None and delay > timeout:
+            # as a client that gives up waiting would
+            time.sleep(timeout)
+            raise QueryTimeoutError(
+                f"The recorded response took longer than the {timeout:.3g}s timeout"
+            )
+        if delay > 0:
+            time.sleep(delay)
+        return response
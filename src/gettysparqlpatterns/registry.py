@@ -1,57 +1,250 @@
+import contextvars
 import logging
-import requests
+import threading
+import time
 
-from string import Template
 from typing import Literal, Callable
 
-# Workaround for the Template.get_identifiers only in py3.11+
-import re
+# NB asyncio, inspect, concurrent.futures and requests are imported when they are
+# first needed, to keep 'import gettysparqlpatterns' quick for short-lived processes
 
-from .utilities import parsed_sparql_response, load_from_package, list_available
+from .utilities import (
+    parsed_sparql_response,
+    iter_sparql_response,
+    iter_sparql_bindings,
+    load_from_package,
+    list_available,
+)
+from .rewriting import (
+    BATCH_PLACEHOLDER,
+    ask_to_batched_select,
+    is_valid_iri,
+    merge_ask_queries,
+    merge_count_queries,
+    paginate_query,
+)
+from .cache import MISS, ResultCache, cache_key, canonical_query, endpoint_key
+from .results import SPARQLResultTable
+from .coalescing import SingleFlight
+from .limits import AdaptiveLimiter, CircuitBreaker, is_query_error
+from .scheduling import QueryScheduler, current_priority
+from .deadlines import (
+    accepts_timeout,
+    deadline_from,
+    remaining,
+    send_query,
+    time_limit,
+)
+from .instrumentation import (
+    Hooks,
+    QueryEvent,
+    call_hooks,
+    global_hooks,
+    query_hash,
+    measure_response_bytes,
+    result_rows,
+)
+from .templating import CompiledTemplate
+from .framing import CompiledFrame
+from .graph import Graph
+from . import snapshot
 
 from .exceptions import (
+    SPARQLPatternsError,
     NoSuchPatternError,
     RequiredParametersMissingError,
     NoSPARQLEndpointSetError,
     NoPatternsFoundError,
     PatternNotSetError,
+    QueryTimeoutError,
 )
 
 
 logger = logging.getLogger(__name__)
 
+# Default upper bound on the number of threads used by PatternSet.run_many
+DEFAULT_MAX_WORKERS = 8
+
+
+async def _acall(sparql_client_method, query, timeout=None):
+    import asyncio
+
+    if timeout is None:
+        return await _asend(sparql_client_method, query)
+    try:
+        return await asyncio.wait_for(
+            _asend(sparql_client_method, query, timeout), timeout
+        )
+    except asyncio.TimeoutError:
+        raise QueryTimeoutError(
+            f"The query did not finish within its {timeout:.3g}s timeout"
+        ) from None
+
+
+async def _asend(sparql_client_method, query, timeout=None):
+    import asyncio
+    import inspect
+
+    if inspect.iscoroutinefunction(sparql_client_method):
+        if timeout is not None and accepts_timeout(sparql_client_method):
+            response = await sparql_client_method(query, timeout=timeout)
+        else:
+            response = await sparql_client_method(query)
+    else:
+        # Keep blocking client methods off the event loop. If the query times out,
+        # the thread is left to finish (or time out itself) in the background.
+        response = await asyncio.to_thread(
+            send_query, sparql_client_method, query, timeout
+        )
+    if inspect.isawaitable(response):
+        # eg a callable object with an 'async def __call__'
+        response = await response
+    return response
+
+
+def _body_size(response):
+    # The size of a response, when the client returned the body itself
+    if isinstance(response, (str, bytes)):
+        return len(response)
+    return None
+
+
+def _parse_graph(response, stype):
+    return Graph.from_response(response)
+
+
+def _merged_event_name(names):
+    # The name a query merged from several patterns is reported under to the hooks
+    return "merged:" + ",".join(names)
+
+
+def _split_counts(response, variables):
+    # Split the single row of a merged count query (see run_counts) into a count for
+    # each pattern, decoding each one as if it had been its own count query
+    match response:
+        case {"head": head, "results": {"bindings": [row]}}:
+            return {
+                name: parsed_sparql_response(
+                    {
+                        "head": {**head, "vars": ["count"]},
+                        "results": {
+                            "bindings": [{"count": row[var]}] if var in row else []
+                        },
+                    },
+                    "count",
+                )
+                for name, var in variables.items()
+            }
+        case _:
+            raise SPARQLPatternsError(
+                "The response to a merged count query did not have a single row"
+            )
+
+
+def _split_booleans(response, variables):
+    # Read the boolean bound for each pattern by a merged ASK query (see
+    # evaluate_filters) as if it had been the response to that pattern's ASK
+    match response:
+        case {"head": _, "results": {"bindings": [row]}} if all(
+            var in row for var in variables.values()
+        ):
+            return {
+                name: row[var].get("value") in ("true", "1")
+                for name, var in variables.items()
+            }
+        case _:
+            raise SPARQLPatternsError(
+                "The response to a merged ASK query did not bind every pattern"
+            )
+
+
+def _iter_stream(response, chunk_size, parse=True):
+    try:
+        if parse:
+            yield from iter_sparql_response(response, chunk_size)
+        else:
+            yield from iter_sparql_bindings(response, chunk_size)
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+
+
+def _iter_pages(fetch_page, page_size, prefetch):
+    if not prefetch:
+        offset = 0
+        while True:
+            page = fetch_page(offset)
+            yield page
+            if len(page) < page_size:
+                return
+            offset += page_size
 
-def _match(obj, by_type, by_applies_to):
-    if not by_type and not by_applies_to:
-        return True
-    elif by_type is not None:
-        if by_applies_to not in [None, []]:
-            if by_type == obj.stype and by_applies_to in obj.applies_to:
-                return True
-        elif by_type == obj.stype:
-            return True
-    elif by_applies_to not in [None, []] and by_applies_to in obj.applies_to:
-        return True
-    return False
+    from concurrent.futures import ThreadPoolExecutor
+
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gettysparqlpatterns")
+    try:
+        offset = 0
+        # The pages are fetched with the caller's context, eg its query priority
+        future = pool.submit(contextvars.copy_context().run, fetch_page, offset)
+        while True:
+            page = future.result()
+            if full_page := len(page) == page_size:
+                offset += page_size
+                future = pool.submit(contextvars.copy_context().run, fetch_page, offset)
+            yield page
+            if not full_page:
+                return
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 class SPARQLRegistry:
     _registry = {}
+    # Built-in patternsets that are registered by name, but only loaded when needed
+    _presets = {}
+    _presets_lock = threading.Lock()
 
     @classmethod
     def register(cls, name: str, patternset):
+        cls._presets.pop(name, None)
         cls._registry[name] = patternset
 
+    @classmethod
+    def register_preset(cls, name: str, pkg_name: str):
+        """Register a built-in patternset under `name` without loading it. The JSON is
+        only read and parsed the first time the patternset is asked for."""
+        cls._registry.pop(name, None)
+        cls._presets[name] = pkg_name
+
+    @classmethod
+    def _load_preset(cls, name: str):
+        with cls._presets_lock:
+            if (pkg_name := cls._presets.get(name)) is not None:
+                patternset = PatternSet(name=name)
+                load_from_package(patternset, pkg_name)
+                cls._registry[name] = patternset
+                del cls._presets[name]
+            return cls._registry.get(name)
+
+    @classmethod
+    def _load_all_presets(cls):
+        for name in list(cls._presets):
+            cls._load_preset(name)
+
     @classmethod
     def get_patternsets(cls):
+        cls._load_all_presets()
         return cls._registry
 
     @classmethod
     def get_patternset(cls, name: str | None = None, url: str | None = None):
-        p = cls._registry.get(name)
+        if (p := cls._registry.get(name)) is None:
+            # Checked again under the lock, as another thread may be loading it
+            p = cls._load_preset(name)
         if p is not None:
             return p
         elif url is not None:
+            cls._load_all_presets()
             for k, v in cls._registry.items():
                 if v.url == url:
                     return v
@@ -60,10 +253,11 @@ class SPARQLRegistry:
 
     @classmethod
     def list_pattern_names(cls):
-        return sorted(list(cls._registry.keys()))
+        return sorted(list(cls._registry.keys()) + list(cls._presets.keys()))
 
     @classmethod
     def browse_patternsets(cls):
+        cls._load_all_presets()
         return [(x, y, y.description) for x, y in cls._registry.items()]
 
     @classmethod
@@ -75,12 +269,23 @@ class SPARQLRegistry:
 
     @classmethod
     def remove_patternset(cls, name: str):
-        del cls._registry[name]
+        if cls._presets.pop(name, None) is None:
+            del cls._registry[name]
 
     @classmethod
     def list_available_patternset_presets(cls):
         return list_available()
 
+    @classmethod
+    def add_hook(cls, pre=None, post=None):
+        """Add instrumentation hooks that are called for every pattern that is run,
+        in any PatternSet. See `PatternSet.add_hook`."""
+        global_hooks.add(pre, post)
+
+    @classmethod
+    def remove_hook(cls, hook):
+        global_hooks.remove(hook)
+
 
 class BasePattern:
     def __init__(
@@ -97,6 +302,12 @@ class BasePattern:
         sparql_client_method: Callable[[str], dict | str] = None,
         framing: dict | None = None,
         profile_uri: str | None = None,
+        cache: ResultCache | None = None,
+        single_flight: SingleFlight | None = None,
+        hooks: Hooks | None = None,
+        limiter: AdaptiveLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        scheduler: QueryScheduler | None = None,
         **kwargs,
     ):
         self.name = name
@@ -106,6 +317,7 @@ class BasePattern:
         self.sparql_pattern = ""
         self.stype = stype
         self.keyword_parameters = []
+        self._default_values = {}
         self._set_pattern(
             sparql_pattern
         )  # Find out what parameters are in the sparql query, if any
@@ -136,68 +348,777 @@ class BasePattern:
         self.framing = framing
         self.profile_uri = profile_uri
 
+        # Optional result cache. A pattern-specific cache (or None, to disable caching
+        # for the pattern) set with `set_cache` is not replaced by its PatternSet's cache
+        self.cache = cache
+        self._own_cache = False
+
+        # Optional coalescing of identical queries that are run at the same time
+        self.single_flight = single_flight
+
+        # Instrumentation hooks, usually shared with the PatternSet
+        self.hooks = hooks if hooks is not None else Hooks()
+
+        # Optional concurrency limit, circuit breaker and scheduler for the queries sent
+        self.limiter = limiter
+        self.circuit_breaker = circuit_breaker
+        self.scheduler = scheduler
+
+    def set_cache(self, cache: ResultCache | None):
+        self.cache = cache
+        self._own_cache = True
+
+    @property
+    def framing(self):
+        return self._framing
+
+    @framing.setter
+    def framing(self, framing):
+        self._framing = framing
+        self._compiled_frame = None
+
+    @property
+    def compiled_frame(self):
+        """The pattern's `framing` as a `CompiledFrame`, compiled on first use"""
+        if self._compiled_frame is None:
+            self._compiled_frame = CompiledFrame(self._framing)
+        return self._compiled_frame
+
+    @property
+    def default_values(self):
+        return self._default_values
+
+    @default_values.setter
+    def default_values(self, default_values):
+        self._default_values = default_values or {}
+        self._update_required()
+
+    def _update_required(self):
+        # The parameters that have to be passed in to render the query
+        self._required = tuple(
+            p for p in self.keyword_parameters if p not in self._default_values
+        )
+
     def _set_pattern(self, sparql_pattern):
         try:
-            self.sparql_pattern = Template(sparql_pattern)
-            # py3.11+
-            #  self.keyword_parameters = self.sparql_pattern.get_identifiers()
-            self.keyword_parameters = list(
-                set(
-                    re.findall(
-                        r"\$([a-z_0-9]+)\s*",
-                        self.sparql_pattern.template,
-                        re.IGNORECASE | re.MULTILINE,
-                    )
-                )
-            )
+            if isinstance(sparql_pattern, CompiledTemplate):
+                # eg from a snapshot, already compiled
+                self.sparql_pattern = sparql_pattern
+            else:
+                self.sparql_pattern = CompiledTemplate(sparql_pattern)
+            self.keyword_parameters = list(self.sparql_pattern.identifiers)
+            self._update_required()
         except ValueError as e:
             logger.error(f"An error occurred attempting to set the sparql template {e}")
             raise e
 
     def get_query(self, **kwargs):
-        # Set with defaults, and then update with the passed parameters
-        q_kwargs = self.default_values.copy()
-        q_kwargs.update(kwargs)
+        if not self.sparql_pattern:
+            raise PatternNotSetError("The sparql_pattern is not set and cannot be run.")
 
-        if not all([x in q_kwargs for x in self.keyword_parameters]):
-            raise RequiredParametersMissingError(
-                f"Query requires the following parameters: {self.keyword_parameters}"
-            )
+        # Parameters passed in take precedence over the defaults
+        if missing := [p for p in self._required if p not in kwargs]:
+            # in case the default values have been changed in place
+            if missing := [p for p in missing if p not in self._default_values]:
+                raise RequiredParametersMissingError(
+                    f"Query requires the following parameters: {self.keyword_parameters} (missing: {missing})"
+                )
 
-        if self.sparql_pattern:
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
-                f"Templating '{self.name}' sparql pattern with parameters {q_kwargs}"
+                "Templating '%s' sparql pattern with parameters %s",
+                self.name,
+                {**self._default_values, **kwargs},
+            )
+        try:
+            return self.sparql_pattern.render(kwargs, self._default_values)
+        except KeyError as e:
+            raise RequiredParametersMissingError(
+                f"Query requires the following parameters: {self.keyword_parameters} (missing: {[e.args[0]]})"
             )
-            return self.sparql_pattern.substitute(q_kwargs)
-        else:
-            raise PatternNotSetError("The sparql_pattern is not set and cannot be run.")
 
-    def run(self, sparql_client_method: Callable[[str], dict] = None, **kwargs):
+    def _get_client(self, sparql_client_method):
         if not sparql_client_method:
             sparql_client_method = self.sparql_client_method
 
         if sparql_client_method is None:
             raise NoSPARQLEndpointSetError()
+        return sparql_client_method
 
+    def _render(self, kwargs):
+        # Render the query, timing it if there are any instrumentation hooks
+        if not (self.hooks.active or global_hooks.active):
+            return self.get_query(**kwargs), None
+        start = time.perf_counter()
         query = self.get_query(**kwargs)
-        return parsed_sparql_response(sparql_client_method(query), self.stype)
+        return query, time.perf_counter() - start
+
+    def _start_event(
+        self, sparql_client_method, query, stype, render_time, event_name=None
+    ):
+        event = QueryEvent(
+            event_name or self.name,
+            stype,
+            endpoint_key(sparql_client_method),
+            query_hash(canonical_query(query)),
+            render_time,
+        )
+        call_hooks(global_hooks.pre, event)
+        call_hooks(self.hooks.pre, event)
+        return event
+
+    def _finish_event(self, event, result=None, error=None):
+        if error is None:
+            event.rows = result_rows(result)
+        else:
+            event.error = error
+        call_hooks(global_hooks.post, event)
+        call_hooks(self.hooks.post, event)
+
+    def _execute(
+        self,
+        sparql_client_method,
+        query,
+        stype=None,
+        parse=parsed_sparql_response,
+        render_time=None,
+        variant=None,
+        event_name=None,
+    ):
+        # `event_name` is the name the query is reported under to the hooks, if it is
+        # not (only) this pattern's, eg a query merged from several patterns
+        stype = stype or self.stype
+        if not (self.hooks.active or global_hooks.active):
+            return self._run_query(sparql_client_method, query, stype, parse, variant)
+
+        event = self._start_event(
+            sparql_client_method, query, stype, render_time, event_name
+        )
+        try:
+            result = self._run_query(
+                sparql_client_method, query, stype, parse, variant, event
+            )
+        except BaseException as e:
+            self._finish_event(event, error=e)
+            raise
+        self._finish_event(event, result)
+        return result
 
-    def filter(self, sparql_client_method: Callable[[str], dict] = None, **kwargs):
+    def _run_query(
+        self, sparql_client_method, query, stype, parse, variant=None, event=None
+    ):
+        key = None
+        if self.cache is not None or self.single_flight is not None:
+            key = cache_key(sparql_client_method, query, stype, variant)
+        if self.cache is not None:
+            if (result := self.cache.get(key, stype)) is not MISS:
+                if event is not None:
+                    event.cached = True
+                if getattr(self.cache, "stores_raw", False):
+                    return parse(result, stype)
+                return result
+
+        if self.single_flight is not None:
+            start = time.perf_counter()
+            result = self.single_flight.do(
+                (key, stype),
+                lambda: self._fetch(
+                    sparql_client_method, query, stype, key, parse, event
+                ),
+                remaining(),
+            )
+            if event is not None and event.endpoint_time is None:
+                # Another caller ran the query
+                event.coalesced = True
+                event.endpoint_time = time.perf_counter() - start
+            return result
+        return self._fetch(sparql_client_method, query, stype, key, parse, event)
+
+    def _call_client(self, sparql_client_method, query):
+        # Send the query, through the circuit breaker, scheduler and concurrency limiter
+        # if they are set, within the current deadline if there is one
+        breaker, scheduler = self.circuit_breaker, self.scheduler
+        if breaker is None and scheduler is None and self.limiter is None:
+            return send_query(sparql_client_method, query, remaining())
+
+        timeout = remaining()
+        if breaker is not None:
+            breaker.before_call()
+        if scheduler is None:
+            return self._call_limited(sparql_client_method, query)
+        try:
+            scheduler.acquire(timeout=timeout)
+        except BaseException:
+            if breaker is not None:
+                breaker.record_cancelled()
+            raise
+        try:
+            return self._call_limited(sparql_client_method, query)
+        finally:
+            scheduler.release()
+
+    def _call_limited(self, sparql_client_method, query):
+        breaker, limiter = self.circuit_breaker, self.limiter
+        if limiter is not None:
+            try:
+                limiter.acquire(timeout=remaining())
+            except BaseException:
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+        timeout = self._time_left(breaker, limiter)
+        start = time.perf_counter()
+        try:
+            response = send_query(sparql_client_method, query, timeout)
+        except BaseException as e:
+            self._record_error(breaker, limiter, e, time.perf_counter() - start)
+            raise
+        if limiter is not None:
+            limiter.release(time.perf_counter() - start)
+        if breaker is not None:
+            breaker.record_success()
+        return response
+
+    async def _acall_client(self, sparql_client_method, query):
+        breaker, scheduler = self.circuit_breaker, self.scheduler
+        if breaker is None and scheduler is None and self.limiter is None:
+            return await _acall(sparql_client_method, query, remaining())
+
+        timeout = remaining()
+        if breaker is not None:
+            breaker.before_call()
+        if scheduler is None:
+            return await self._acall_limited(sparql_client_method, query)
+        try:
+            await scheduler.aacquire(timeout=timeout)
+        except BaseException:
+            if breaker is not None:
+                breaker.record_cancelled()
+            raise
+        try:
+            return await self._acall_limited(sparql_client_method, query)
+        finally:
+            scheduler.release()
+
+    async def _acall_limited(self, sparql_client_method, query):
+        breaker, limiter = self.circuit_breaker, self.limiter
+        if limiter is not None:
+            try:
+                await limiter.aacquire(timeout=remaining())
+            except BaseException:
+                if breaker is not None:
+                    breaker.record_cancelled()
+                raise
+        timeout = self._time_left(breaker, limiter)
+        start = time.perf_counter()
+        try:
+            response = await _acall(sparql_client_method, query, timeout)
+        except BaseException as e:
+            self._record_error(breaker, limiter, e, time.perf_counter() - start)
+            raise
+        if limiter is not None:
+            limiter.release(time.perf_counter() - start)
+        if breaker is not None:
+            breaker.record_success()
+        return response
+
+    @staticmethod
+    def _time_left(breaker, limiter):
+        # The timeout for the query, once any scheduler and limiter have been waited
+        # for. If the deadline passed while waiting, the query is not sent.
+        try:
+            return remaining()
+        except QueryTimeoutError:
+            if limiter is not None:
+                limiter.discard()
+            if breaker is not None:
+                breaker.record_cancelled()
+            raise
+
+    @staticmethod
+    def _record_error(breaker, limiter, error, latency):
+        if not isinstance(error, Exception):
+            # eg cancelled, which says nothing about the endpoint
+            if limiter is not None:
+                limiter.discard()
+            if breaker is not None:
+                breaker.record_cancelled()
+            return
+        if limiter is not None:
+            if is_query_error(error):
+                # The endpoint answered, but how quickly says little about its load
+                limiter.discard()
+            else:
+                limiter.release(latency, failed=True)
+        if breaker is not None:
+            breaker.record_error(error)
+
+    def _fetch(self, sparql_client_method, query, stype, key, parse, event=None):
+        if event is None:
+            response = self._call_client(sparql_client_method, query)
+        else:
+            start = time.perf_counter()
+            with measure_response_bytes() as size:
+                response = self._call_client(sparql_client_method, query)
+        if hasattr(response, "__await__"):
+            if hasattr(response, "close"):
+                response.close()
+            raise TypeError(
+                "The sparql client method is asynchronous, use the 'arun'/'afilter' methods instead"
+            )
+        if event is not None:
+            received = time.perf_counter()
+            event.endpoint_time = received - start
+            event.response_bytes = size.bytes or _body_size(response)
+        result = parse(response, stype)
+        if event is not None:
+            event.parse_time = time.perf_counter() - received
+
+        if self.cache is not None:
+            self.cache.put(key, stype, response, result)
+        return result
+
+    async def _aexecute(
+        self,
+        sparql_client_method,
+        query,
+        stype=None,
+        parse=parsed_sparql_response,
+        render_time=None,
+        variant=None,
+        event_name=None,
+    ):
+        stype = stype or self.stype
+        if not (self.hooks.active or global_hooks.active):
+            return await self._arun_query(
+                sparql_client_method, query, stype, parse, variant
+            )
+
+        event = self._start_event(
+            sparql_client_method, query, stype, render_time, event_name
+        )
+        try:
+            result = await self._arun_query(
+                sparql_client_method, query, stype, parse, variant, event
+            )
+        except BaseException as e:
+            self._finish_event(event, error=e)
+            raise
+        self._finish_event(event, result)
+        return result
+
+    async def _arun_query(
+        self, sparql_client_method, query, stype, parse, variant=None, event=None
+    ):
+        key = None
+        if self.cache is not None or self.single_flight is not None:
+            key = cache_key(sparql_client_method, query, stype, variant)
+        if self.cache is not None:
+            if (result := self.cache.get(key, stype)) is not MISS:
+                if event is not None:
+                    event.cached = True
+                if getattr(self.cache, "stores_raw", False):
+                    return parse(result, stype)
+                return result
+
+        if self.single_flight is not None:
+            start = time.perf_counter()
+            result = await self.single_flight.ado(
+                (key, stype),
+                lambda: self._afetch(
+                    sparql_client_method, query, stype, key, parse, event
+                ),
+                remaining(),
+            )
+            if event is not None and event.endpoint_time is None:
+                event.coalesced = True
+                event.endpoint_time = time.perf_counter() - start
+            return result
+        return await self._afetch(sparql_client_method, query, stype, key, parse, event)
+
+    async def _afetch(self, sparql_client_method, query, stype, key, parse, event=None):
+        if event is None:
+            response = await self._acall_client(sparql_client_method, query)
+        else:
+            start = time.perf_counter()
+            with measure_response_bytes() as size:
+                response = await self._acall_client(sparql_client_method, query)
+            received = time.perf_counter()
+            event.endpoint_time = received - start
+            event.response_bytes = size.bytes or _body_size(response)
+        result = parse(response, stype)
+        if event is not None:
+            event.parse_time = time.perf_counter() - received
+
+        if self.cache is not None:
+            self.cache.put(key, stype, response, result)
+        return result
+
+    def invalidate_cached(
+        self, sparql_client_method: Callable[[str], dict] = None, **kwargs
+    ):
+        """Remove the cached result (if any) for this pattern with these parameters"""
+        if self.cache is not None:
+            sparql_client_method = self._get_client(sparql_client_method)
+            query = self.get_query(**kwargs)
+            self.cache.invalidate(cache_key(sparql_client_method, query, self.stype))
+            if self.stype == "construct":
+                self.cache.invalidate(
+                    cache_key(sparql_client_method, query, self.stype, "graph")
+                )
+
+    def _check_filter(self, method="filter"):
         if self.stype != "ask":
             raise NotImplementedError(
-                "The 'filter' method can only be run with 'ask' type queries"
+                f"The '{method}' method can only be run with 'ask' type queries"
             )
-        if not sparql_client_method:
-            sparql_client_method = self.sparql_client_method
 
-        if sparql_client_method is None:
-            raise NoSPARQLEndpointSetError()
+    def run(
+        self,
+        sparql_client_method: Callable[[str], dict] = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run the pattern with the given parameters, returning the parsed result.
+
+        With a `timeout` (in seconds) or a `deadline` (a time.monotonic() value), the
+        query raises QueryTimeoutError if it is not answered in time. The time left is
+        passed on as the `timeout` of a sparql client method that takes one, so that it
+        gives up at the deadline. A client method that does not take one (eg a plain
+        function) cannot be interrupted, so the error is raised when it returns."""
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return self._execute(sparql_client_method, query, render_time=render_time)
+
+    async def arun(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """As `run`, but awaits the sparql client method if it is a coroutine function.
+        A synchronous client method is run in a separate thread."""
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return await self._aexecute(
+                sparql_client_method, query, render_time=render_time
+            )
+
+    def filter(
+        self,
+        sparql_client_method: Callable[[str], dict] = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        self._check_filter()
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return self.ask_filter == self._execute(
+                sparql_client_method, query, render_time=render_time
+            )
+
+    async def afilter(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        self._check_filter("afilter")
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return self.ask_filter == await self._aexecute(
+                sparql_client_method, query, render_time=render_time
+            )
+
+    def _check_construct(self, method):
+        if self.stype != "construct":
+            raise NotImplementedError(
+                f"The '{method}' method can only be run with 'construct' type queries"
+            )
+
+    def run_graph(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run a 'construct' pattern and return the result as a `Graph`, from a JSON-LD
+        or N-Triples response. The parsed Graph is what is cached, so that callers
+        sharing a cache do not parse the response again."""
+        self._check_construct("run_graph")
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return self._execute(
+                sparql_client_method,
+                query,
+                parse=_parse_graph,
+                render_time=render_time,
+                variant="graph",
+            )
+
+    async def arun_graph(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """As `run_graph`, for use with an asynchronous sparql client method."""
+        self._check_construct("arun_graph")
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query, render_time = self._render(kwargs)
+        with time_limit(timeout, deadline):
+            return await self._aexecute(
+                sparql_client_method,
+                query,
+                parse=_parse_graph,
+                render_time=render_time,
+                variant="graph",
+            )
+
+    def run_framed(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run a 'construct' pattern and frame the resulting graph with the pattern's
+        `framing`, returning a JSON-LD document. See `CompiledFrame` for the parts of
+        JSON-LD framing that are supported."""
+        return self.compiled_frame.frame(
+            self.run_graph(
+                sparql_client_method, timeout=timeout, deadline=deadline, **kwargs
+            )
+        )
+
+    async def arun_framed(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """As `run_framed`, for use with an asynchronous sparql client method."""
+        return self.compiled_frame.frame(
+            await self.arun_graph(
+                sparql_client_method, timeout=timeout, deadline=deadline, **kwargs
+            )
+        )
+
+    def iter_framed(
+        self,
+        sparql_client_method: Callable = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """As `run_framed`, but returns an iterator of documents, one for each node
+        that matches the frame, each framed as it is reached."""
+        return self.compiled_frame.iter_documents(
+            self.run_graph(
+                sparql_client_method, timeout=timeout, deadline=deadline, **kwargs
+            )
+        )
+
+    def iter_rows(
+        self,
+        sparql_client_method: Callable = None,
+        chunk_size: int = 65536,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run a 'select' pattern and return an iterator over the result rows.
+
+        If the sparql client method returns the response body as a stream (a file-like
+        object or an iterable of bytes chunks) rather than a decoded dict, the rows are
+        parsed incrementally so that the whole response is never held in memory.
+        Streamed results are not cached."""
+        if self.stype != "select":
+            raise NotImplementedError(
+                "The 'iter_rows' method can only be run with 'select' type queries"
+            )
+        sparql_client_method = self._get_client(sparql_client_method)
 
         query = self.get_query(**kwargs)
-        return self.ask_filter == parsed_sparql_response(
-            sparql_client_method(query), self.stype
+        with time_limit(timeout, deadline):
+            response = self._call_client(sparql_client_method, query)
+        if isinstance(response, dict):
+            return iter(parsed_sparql_response(response, self.stype))
+        return _iter_stream(response, chunk_size)
+
+    def run_columnar(
+        self,
+        sparql_client_method: Callable = None,
+        chunk_size: int = 65536,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run a 'select' pattern and return the results as a `SPARQLResultTable`,
+        which stores each variable as a column rather than a dict per row. As with
+        `iter_rows`, a streamed response is parsed incrementally. Columnar results are
+        not cached."""
+        if self.stype != "select":
+            raise NotImplementedError(
+                "The 'run_columnar' method can only be run with 'select' type queries"
+            )
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        query = self.get_query(**kwargs)
+        with time_limit(timeout, deadline):
+            response = self._call_client(sparql_client_method, query)
+        if isinstance(response, dict):
+            return SPARQLResultTable.from_response(response)
+        return SPARQLResultTable.from_bindings(
+            _iter_stream(response, chunk_size, parse=False)
         )
 
+    def iter_pages(
+        self,
+        page_size: int = 1000,
+        sparql_client_method: Callable[[str], dict] = None,
+        order_by: list | None = None,
+        prefetch: bool = True,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run a 'select' pattern one page at a time, returning an iterator of pages
+        (lists of rows). Any LIMIT/OFFSET at the end of the rendered query is replaced
+        with one for each page, and the iterator stops at the first page with fewer
+        than `page_size` rows. With `prefetch`, the next page is fetched in the
+        background while the current one is being used.
+
+        OFFSET paging is only stable if the endpoint returns the results in the same
+        order each time, so give `order_by` variables if the pattern has no ORDER BY.
+        A `timeout` or `deadline` is for all of the pages, from when this is called."""
+        if self.stype != "select":
+            raise NotImplementedError(
+                "The 'iter_pages' method can only be run with 'select' type queries"
+            )
+        if page_size < 1:
+            raise ValueError("page_size must be a positive integer")
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        if "LIMIT" in self.keyword_parameters:
+            kwargs.setdefault("LIMIT", page_size)
+        query = self.get_query(**kwargs)
+        # The pages are fetched as they are asked for, outside of this call
+        at = deadline_from(timeout, deadline)
+
+        def _page(offset):
+            with time_limit(deadline=at):
+                return self._execute(
+                    sparql_client_method,
+                    paginate_query(query, page_size, offset, order_by),
+                )
+
+        return _iter_pages(_page, page_size, prefetch)
+
+    def filter_many(
+        self,
+        uris: list,
+        batch_size: int = 500,
+        sparql_client_method: Callable[[str], dict] = None,
+        parameter: str = "URI",
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run this 'ask' filter for many URIs, returning a {uri: allowed} dict.
+
+        The ASK query is rewritten into a SELECT with a VALUES block so that each batch
+        of `batch_size` URIs is a single query. If the pattern cannot be rewritten
+        (eg the URI parameter is not used as `<$URI>`), each URI is filtered in turn.
+
+        If the `timeout` or `deadline` is reached, QueryTimeoutError is raised with
+        the URIs filtered so far as its `partial` dict."""
+        self._check_filter("filter_many")
+        sparql_client_method = self._get_client(sparql_client_method)
+
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer")
+
+        uris = list(dict.fromkeys(uris))
+        if bad := [uri for uri in uris if not is_valid_iri(uri)]:
+            raise SPARQLPatternsError(
+                f"Cannot use the following as IRIs in a batched query: {bad}"
+            )
+
+        kwargs[parameter] = BATCH_PLACEHOLDER
+        template = self.get_query(**kwargs)
+        allowed = {}
+        try:
+            with time_limit(timeout, deadline):
+                if ask_to_batched_select(template, "_batch_uri", []) is None:
+                    logger.debug(
+                        "'%s' cannot be rewritten as a batched query, filtering URIs in turn",
+                        self.name,
+                    )
+                    for uri in uris:
+                        allowed[uri] = self.filter(
+                            sparql_client_method, **{**kwargs, parameter: uri}
+                        )
+                    return allowed
+
+                for idx in range(0, len(uris), batch_size):
+                    batch = uris[idx : idx + batch_size]
+                    query = ask_to_batched_select(template, "_batch_uri", batch)
+                    matched = {
+                        str(row.get("_batch_uri"))
+                        for row in self._execute(sparql_client_method, query, "select")
+                    }
+                    # A URI that is returned is one where the ASK query would be True
+                    allowed.update(
+                        {uri: self.ask_filter == (uri in matched) for uri in batch}
+                    )
+                return allowed
+        except QueryTimeoutError as e:
+            raise QueryTimeoutError(
+                f"Filtered {len(allowed)} of {len(uris)} URIs before the deadline",
+                partial=allowed,
+            ) from e
+
+
+def _indexed(index, value):
+    # The patterns an index holds for a value. A value that cannot be a key (eg a
+    # list) cannot equal a pattern's stype or record type either, so matches none.
+    try:
+        return index.get(value, {})
+    except TypeError:
+        return {}
+
 
 class PatternSet:
     def __init__(
@@ -208,16 +1129,35 @@ class PatternSet:
         from_url: str | None = None,
         from_builtin: str | None = None,
         sparql_client_method: Callable[[str], dict | str] = None,
+        cache: ResultCache | None = None,
+        from_snapshot: str | None = None,
+        single_flight: SingleFlight | None = None,
+        limiter: AdaptiveLimiter | None = None,
+        circuit_breaker: CircuitBreaker | None = None,
+        scheduler: QueryScheduler | None = None,
     ):
         self.name = ""
         self.description = ""
-        self._patterns = {}
+        self._patterns = {}  # also builds the (empty) indexes
         self.url = from_url
         self.sparql_client_method = sparql_client_method
+        self.cache = cache
+        self.single_flight = single_flight
+        self.hooks = Hooks()
+        self.limiter = limiter
+        self.circuit_breaker = circuit_breaker
+        self.scheduler = scheduler
 
-        if from_url is None and from_builtin is None and from_json is None:
+        if (
+            from_url is None
+            and from_builtin is None
+            and from_json is None
+            and from_snapshot is None
+        ):
             self.name = name
             self.description = description or "No description given."
+        elif from_snapshot:
+            self.load_snapshot(from_snapshot)
         elif from_url:
             self.import_patterns_from_url(from_url, add_to_existing=False)
         elif from_json:
@@ -225,6 +1165,68 @@ class PatternSet:
         else:
             load_from_package(self, from_builtin)
 
+    @property
+    def _patterns(self):
+        return self._by_name
+
+    @_patterns.setter
+    def _patterns(self, patterns: dict):
+        self._by_name = patterns
+        self._reindex()
+
+    # Alongside the patterns by name, a PatternSet keeps them in a list (for positional
+    # access) and in indexes by stype and by applies_to. The indexes map a key to a
+    # dict of name -> pattern, in the order the patterns were added, so that the
+    # lookups return patterns in the same order as the set itself.
+
+    def _reindex(self):
+        self._ordered = list(self._by_name.values())
+        self._positions = {name: idx for idx, name in enumerate(self._by_name)}
+        self._by_stype = {}
+        self._by_applies_to = {}
+        for name, pattern in self._by_name.items():
+            self._add_to_indexes(name, pattern)
+
+    def _add_to_indexes(self, name, pattern):
+        self._by_stype.setdefault(pattern.stype, {})[name] = pattern
+        for record_type in pattern.applies_to:
+            self._by_applies_to.setdefault(record_type, {})[name] = pattern
+
+    def _put_pattern(self, name, pattern):
+        """Add a pattern, or replace the one with the same name (keeping its place)"""
+        if (existing := self._by_name.get(name)) is None:
+            self._by_name[name] = pattern
+            self._positions[name] = len(self._ordered)
+            self._ordered.append(pattern)
+            self._add_to_indexes(name, pattern)
+            return
+
+        self._by_name[name] = pattern
+        if existing.stype != pattern.stype or existing.applies_to != pattern.applies_to:
+            # Rare enough that rebuilding the indexes in order is simplest
+            self._reindex()
+            return
+        self._ordered[self._positions[name]] = pattern
+        self._by_stype[pattern.stype][name] = pattern
+        for record_type in pattern.applies_to:
+            self._by_applies_to[record_type][name] = pattern
+
+    def _matching(self, by_type, by_applies_to):
+        """The (name, pattern) pairs with the given stype and/or that apply to the
+        given record type"""
+        if not by_type and not by_applies_to:
+            return self._by_name.items()
+        if by_type is None:
+            return _indexed(self._by_applies_to, by_applies_to).items()
+
+        of_type = _indexed(self._by_stype, by_type)
+        if by_applies_to in [None, []]:
+            return of_type.items()
+        applies = _indexed(self._by_applies_to, by_applies_to)
+        if len(applies) < len(of_type):
+            return [(n, p) for n, p in applies.items() if n in of_type]
+        return [(n, p) for n, p in of_type.items() if n in applies]
+
     def set_sparql_client_method(self, sparql_client_method):
         self.sparql_client_method = sparql_client_method
         self._update_patterns_w_sparql_method()
@@ -243,6 +1245,60 @@ class PatternSet:
             for k, v in self._patterns.items():
                 v.sparql_client_method = self.sparql_client_method
 
+    def set_cache(self, cache: ResultCache | None):
+        """Set (or with None, remove) the result cache used by the patterns in this
+        set. Patterns that have had their own cache set are left unchanged."""
+        self.cache = cache
+        self._update_patterns_w_cache()
+
+    def _update_patterns_w_cache(self):
+        for k, v in self._patterns.items():
+            if not v._own_cache:
+                v.cache = self.cache
+
+    def set_single_flight(self, single_flight: SingleFlight | None):
+        """Set (or with None, remove) the `SingleFlight` that coalesces identical
+        queries that the patterns in this set run at the same time"""
+        self.single_flight = single_flight
+        self._update_patterns_w_single_flight()
+
+    def _update_patterns_w_single_flight(self):
+        for k, v in self._patterns.items():
+            v.single_flight = self.single_flight
+
+    def set_limiter(self, limiter: AdaptiveLimiter | None):
+        """Set (or with None, remove) the `AdaptiveLimiter` that limits the number of
+        queries that the patterns in this set have in flight at once"""
+        self.limiter = limiter
+        self._update_patterns_w_limits()
+
+    def set_circuit_breaker(self, circuit_breaker: CircuitBreaker | None):
+        """Set (or with None, remove) the `CircuitBreaker` that stops the patterns in
+        this set sending queries while the endpoint is down"""
+        self.circuit_breaker = circuit_breaker
+        self._update_patterns_w_limits()
+
+    def set_scheduler(self, scheduler: QueryScheduler | None):
+        """Set (or with None, remove) the `QueryScheduler` that shares query slots
+        between the priority classes of the queries that the patterns in this set run"""
+        self.scheduler = scheduler
+        self._update_patterns_w_limits()
+
+    def _update_patterns_w_limits(self):
+        for k, v in self._patterns.items():
+            v.limiter = self.limiter
+            v.circuit_breaker = self.circuit_breaker
+            v.scheduler = self.scheduler
+
+    def add_hook(self, pre=None, post=None):
+        """Add instrumentation hooks for the patterns in this set. `pre` is called with
+        a `QueryEvent` before each query is run, and `post` with the completed event
+        once it has finished (or failed). See also `SPARQLRegistry.add_hook`."""
+        self.hooks.add(pre, post)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
     def add_pattern(
         self,
         name: str,
@@ -255,32 +1311,34 @@ class PatternSet:
         framing: dict | None = None,
         profile_uri: str | None = None,
     ):
-        self._patterns[name] = BasePattern(
+        pattern = BasePattern(
             name=name,
             description=description or "No description given",
             sparql_pattern=sparql_pattern,
             stype=stype,
             sparql_client_method=self.sparql_client_method,
+            cache=self.cache,
+            single_flight=self.single_flight,
+            hooks=self.hooks,
+            limiter=self.limiter,
+            circuit_breaker=self.circuit_breaker,
+            scheduler=self.scheduler,
             default_values=default_values,
             ask_filter=ask_filter,
             framing=framing,
             applies_to=applies_to,
             profile_uri=profile_uri,
         )
+        self._put_pattern(name, pattern)
 
     def browse_patterns(self, by_type=None, by_applies_to=None):
         return [
             (name, pattern.description, pattern, pattern.keyword_parameters)
-            for name, pattern in self._patterns.items()
-            if _match(pattern, by_type, by_applies_to)
+            for name, pattern in self._matching(by_type, by_applies_to)
         ]
 
     def list_patterns(self, by_type=None, by_applies_to=None):
-        return [
-            name
-            for name, pattern in self._patterns.items()
-            if _match(pattern, by_type, by_applies_to)
-        ]
+        return [name for name, _ in self._matching(by_type, by_applies_to)]
 
     def get_pattern(self, name):
         return self._patterns.get(name)
@@ -307,14 +1365,31 @@ class PatternSet:
             ],
         }
 
+    def save_snapshot(self, path: str):
+        """Save the patterns in this set, with their templates already compiled, to a
+        snapshot file that `load_snapshot` (or `PatternSet(from_snapshot=...)`) can
+        load more quickly than the JSON export."""
+        snapshot.save_snapshot(path, self.export_patterns(), patternset=self)
+
+    def load_snapshot(self, path: str, add_to_existing: bool = False):
+        if (patterns_data := snapshot.load_snapshot(path)) is None:
+            raise NoPatternsFoundError(f"Could not load a pattern snapshot from {path}")
+        self.import_patterns(patterns_data, add_to_existing=add_to_existing)
+
     def _load_patterns(self, patterns, add_to_existing):
         if _loaded := {p["name"]: BasePattern(**p) for p in patterns if p}:
             if add_to_existing:
-                self._patterns.update(_loaded)
+                for name, pattern in _loaded.items():
+                    self._put_pattern(name, pattern)
             else:
                 self._patterns = _loaded
 
             self._update_patterns_w_sparql_method()
+            self._update_patterns_w_cache()
+            self._update_patterns_w_single_flight()
+            self._update_patterns_w_limits()
+            for pattern in _loaded.values():
+                pattern.hooks = self.hooks
 
     def import_patterns(self, patterns_data: list, add_to_existing: bool = False):
         if not patterns_data or (
@@ -340,9 +1415,24 @@ class PatternSet:
                 "Could not interpret the data provided as a list of patterns to import."
             )
 
-    def import_patterns_from_url(self, url: str, add_to_existing: bool = False):
+    def import_patterns_from_url(
+        self, url: str, add_to_existing: bool = False, http_client=None
+    ):
+        """Import patterns from a JSON export at `url`. The document is fetched with
+        `http_client` (an `HTTPSPARQLClient`), or the set's sparql client if that is
+        one, or else a shared client."""
+        import requests
+
+        from .client import HTTPSPARQLClient, default_http_client
+
+        if http_client is None:
+            if isinstance(self.sparql_client_method, HTTPSPARQLClient):
+                http_client = self.sparql_client_method
+            else:
+                http_client = default_http_client()
+
         try:
-            patterns_data = requests.get(url).json()
+            patterns_data = http_client.get_json(url)
 
             match patterns_data:
                 case {"name": name, "description": description, "patterns": patterns}:
@@ -360,29 +1450,467 @@ class PatternSet:
                         f"Could not find a suitable patternset JSON at {url}"
                     )
 
-        except requests.exceptions.JSONDecodeError:
+        except (requests.exceptions.JSONDecodeError, requests.exceptions.HTTPError):
             raise NoSuchPatternError("There are no patterns at that URL")
 
-    def format_pattern(self, name, **kwargs):
+    def _pattern_or_raise(self, name):
         if pattern := self._patterns.get(name):
-            return pattern.get_query(**kwargs)
-        else:
-            raise NoSuchPatternError(f"'{name} not found'")
+            return pattern
+        raise NoSuchPatternError(f"'{name} not found'")
 
-    def run_pattern(
-        self, name: str, sparql_client_method: Callable[[str], dict] = None, **kwargs
-    ):
+    def _get_client(self, sparql_client_method):
         if not sparql_client_method:
             sparql_client_method = self.sparql_client_method
 
         if sparql_client_method is None:
             raise NoSPARQLEndpointSetError()
+        return sparql_client_method
+
+    def format_pattern(self, name, **kwargs):
+        return self._pattern_or_raise(name).get_query(**kwargs)
+
+    def run_pattern(
+        self,
+        name: str,
+        sparql_client_method: Callable[[str], dict] = None,
+        *,
+        priority: str | None = None,
+        **kwargs,
+    ):
+        """Run a pattern, returning its parsed result. `priority` is the priority
+        class for a `QueryScheduler` (by default, any set for the current context).
+        A `timeout` or `deadline` is passed on to `BasePattern.run`."""
+        sparql_client_method = self._get_client(sparql_client_method)
+        pattern = self._pattern_or_raise(name)
+        if priority is None:
+            return pattern.run(sparql_client_method, **kwargs)
+        token = current_priority.set(priority)
+        try:
+            return pattern.run(sparql_client_method, **kwargs)
+        finally:
+            current_priority.reset(token)
+
+    def run_counts(
+        self,
+        names: list | None = None,
+        sparql_client_method: Callable[[str], dict] = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run several 'count' patterns (by default, all of them in this set) with the
+        same parameters, returning `{name: count}`.
+
+        The patterns are merged into a single query, each as a sub-select with its own
+        count variable, so that they take one round trip to the endpoint. Patterns
+        that cannot be merged (eg they use SERVICE, or declare a prefix differently to
+        the others) are run as separate queries. If the `timeout` or `deadline` is
+        reached, QueryTimeoutError is raised with the counts run so far as `partial`."""
+        sparql_client_method = self._get_client(sparql_client_method)
+        if names is None:
+            names = self.list_patterns(by_type="count")
+
+        patterns = {name: self._pattern_or_raise(name) for name in names}
+        for pattern in patterns.values():
+            if pattern.stype != "count":
+                raise NotImplementedError(
+                    f"'{pattern.name}' is not a 'count' pattern, so cannot be run with 'run_counts'"
+                )
+
+        merged, variables, unmerged = merge_count_queries(
+            {name: pattern.get_query(**kwargs) for name, pattern in patterns.items()}
+        )
+
+        counts = {}
+        with time_limit(timeout, deadline):
+            if merged is not None:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Merged count query for {list(variables)}: {merged}")
+                first = patterns[next(iter(variables))]
+                # copied, as the merged result may be shared through the cache
+                counts = dict(
+                    first._execute(
+                        sparql_client_method,
+                        merged,
+                        stype="count",
+                        parse=lambda response, stype: _split_counts(
+                            response, variables
+                        ),
+                        event_name=_merged_event_name(variables),
+                    )
+                )
+            self._run_unmerged(counts, patterns, unmerged, sparql_client_method, kwargs)
+
+        return {name: counts[name] for name in patterns}
+
+    def evaluate_filters(
+        self,
+        uri: str,
+        record_type: str,
+        sparql_client_method: Callable[[str], dict] = None,
+        *,
+        timeout: float | None = None,
+        deadline: float | None = None,
+        **kwargs,
+    ):
+        """Run every 'ask' pattern that applies to `record_type` as a filter on `uri`,
+        returning `{name: passed}` where `passed` is whether the ASK result matched
+        the pattern's `ask_filter` value (as with `BasePattern.filter`).
+
+        The patterns are merged into a single SELECT that binds a boolean variable per
+        pattern, so that the filters take one round trip to the endpoint. Patterns that
+        cannot be merged (eg they use SERVICE) are run as separate queries. If the
+        `timeout` or `deadline` is reached, QueryTimeoutError is raised with the ASK
+        results (rather than whether they passed) so far as `partial`."""
+        sparql_client_method = self._get_client(sparql_client_method)
+        patterns = dict(self._matching("ask", record_type))
+        if not patterns:
+            return {}
+
+        kwargs["URI"] = uri
+        merged, variables, unmerged = merge_ask_queries(
+            {name: pattern.get_query(**kwargs) for name, pattern in patterns.items()}
+        )
+
+        results = {}
+        with time_limit(timeout, deadline):
+            if merged is not None:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Merged ASK query for {list(variables)}: {merged}")
+                first = patterns[next(iter(variables))]
+                # copied, as the merged result may be shared through the cache
+                results = dict(
+                    first._execute(
+                        sparql_client_method,
+                        merged,
+                        stype="ask",
+                        parse=lambda response, stype: _split_booleans(
+                            response, variables
+                        ),
+                        event_name=_merged_event_name(variables),
+                    )
+                )
+            self._run_unmerged(
+                results, patterns, unmerged, sparql_client_method, kwargs
+            )
+
+        return {
+            name: pattern.ask_filter == results[name]
+            for name, pattern in patterns.items()
+        }
+
+    def _run_unmerged(self, results, patterns, unmerged, sparql_client_method, kwargs):
+        # Run the patterns that could not be merged into one query (for run_counts and
+        # evaluate_filters), adding their results to `results`
+        if len(unmerged) > 1:
+            ran = self.run_many(
+                [(name, kwargs) for name in unmerged],
+                sparql_client_method=sparql_client_method,
+            )
+            finished = {
+                name: result
+                for name, result in zip(unmerged, ran)
+                if not isinstance(result, Exception)
+            }
+            for result in ran:
+                if isinstance(result, QueryTimeoutError):
+                    raise QueryTimeoutError(
+                        str(result), partial={**results, **finished}
+                    ) from result
+                if isinstance(result, Exception):
+                    raise result
+            results.update(finished)
+        elif unmerged:
+            try:
+                results[unmerged[0]] = patterns[unmerged[0]].run(
+                    sparql_client_method, **kwargs
+                )
+            except QueryTimeoutError as e:
+                raise QueryTimeoutError(str(e), partial=dict(results)) from e
 
-        query = self.format_pattern(name, **kwargs)
-        return parsed_sparql_response(
-            sparql_client_method(query), self._patterns.get(name).stype
+    def iter_pattern(
+        self,
+        name: str,
+        sparql_client_method: Callable = None,
+        chunk_size: int = 65536,
+        **kwargs,
+    ):
+        """Run a 'select' pattern, returning an iterator over the result rows. See
+        `BasePattern.iter_rows`"""
+        sparql_client_method = self._get_client(sparql_client_method)
+        return self._pattern_or_raise(name).iter_rows(
+            sparql_client_method, chunk_size, **kwargs
         )
 
+    def run_pattern_framed(
+        self, name: str, sparql_client_method: Callable = None, **kwargs
+    ):
+        """Run a 'construct' pattern, returning the framed JSON-LD document. See
+        `BasePattern.run_framed`"""
+        sparql_client_method = self._get_client(sparql_client_method)
+        return self._pattern_or_raise(name).run_framed(sparql_client_method, **kwargs)
+
+    def iter_framed(
+        self,
+        name: str,
+        calls,
+        max_workers: int | None = None,
+        sparql_client_method: Callable = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ):
+        """Run a 'construct' pattern once for each of an iterable of parameter dicts
+        (eg `({"URI": uri} for uri in uris)`), yielding the framed documents in the
+        order of the calls, for bulk exports. The next queries run in the background
+        on a pool of `max_workers` threads, with no more than twice that number of
+        graphs waiting to be framed at once.
+
+        A `timeout` or `deadline` is for the whole export, from when the iteration
+        starts: once it is reached, QueryTimeoutError is raised after the documents
+        already yielded, and the queries not yet run are cancelled."""
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor
+        from concurrent.futures import TimeoutError as FutureTimeoutError
+
+        sparql_client_method = self._get_client(sparql_client_method)
+        pattern = self._pattern_or_raise(name)
+        pattern._check_construct("iter_framed")
+        frame = pattern.compiled_frame
+        max_workers = max_workers or DEFAULT_MAX_WORKERS
+        calls = iter(calls)
+        at = deadline_from(timeout, deadline)
+
+        pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gettysparqlpatterns"
+        )
+
+        def _submit():
+            if (kwargs := next(calls, None)) is not None:
+                pending.append(
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        pattern.run_graph,
+                        sparql_client_method,
+                        deadline=at,
+                        **kwargs,
+                    )
+                )
+
+        pending = deque()
+        try:
+            for _ in range(max_workers * 2):
+                _submit()
+            while pending:
+                future = pending.popleft()
+                try:
+                    graph = future.result(
+                        None if at is None else max(at - time.monotonic(), 0)
+                    )
+                except FutureTimeoutError:
+                    raise QueryTimeoutError(
+                        "The deadline passed before the export finished"
+                    ) from None
+                _submit()
+                yield from frame.iter_documents(graph)
+        finally:
+            # eg the caller stopped early. Queries in flight are waited for, unless
+            # they are past the deadline.
+            pool.shutdown(wait=at is None, cancel_futures=True)
+
+    def run_pattern_columnar(
+        self,
+        name: str,
+        sparql_client_method: Callable = None,
+        chunk_size: int = 65536,
+        **kwargs,
+    ):
+        """Run a 'select' pattern, returning a `SPARQLResultTable`. See
+        `BasePattern.run_columnar`"""
+        sparql_client_method = self._get_client(sparql_client_method)
+        return self._pattern_or_raise(name).run_columnar(
+            sparql_client_method, chunk_size, **kwargs
+        )
+
+    def iter_pages(
+        self,
+        name: str,
+        page_size: int = 1000,
+        sparql_client_method: Callable[[str], dict] = None,
+        order_by: list | None = None,
+        prefetch: bool = True,
+        **kwargs,
+    ):
+        """Run a 'select' pattern a page at a time. See `BasePattern.iter_pages`"""
+        sparql_client_method = self._get_client(sparql_client_method)
+        return self._pattern_or_raise(name).iter_pages(
+            page_size, sparql_client_method, order_by, prefetch, **kwargs
+        )
+
+    def invalidate_cached(
+        self, name: str, sparql_client_method: Callable[[str], dict] = None, **kwargs
+    ):
+        sparql_client_method = self._get_client(sparql_client_method)
+        self._pattern_or_raise(name).invalidate_cached(sparql_client_method, **kwargs)
+
+    def run_many(
+        self,
+        calls: list,
+        max_workers: int | None = None,
+        sparql_client_method: Callable[[str], dict] = None,
+        priority: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ):
+        """Run a list of `(name, kwargs)` pattern calls on a pool of `max_workers`
+        threads. The results are returned in the same order as the calls, and a call
+        that fails has its exception returned in its place rather than raised. The
+        calls run with the given `priority`, or else with the caller's.
+
+        With a `timeout` or `deadline` for the whole batch, the results that are ready
+        when it is reached are returned, with a QueryTimeoutError in place of each of
+        the others. Calls that had not started are cancelled, and those in flight
+        are left to time out in the background."""
+        from concurrent.futures import ThreadPoolExecutor, wait
+
+        sparql_client_method = self._get_client(sparql_client_method)
+        if not calls:
+            return []
+
+        at = deadline_from(timeout, deadline)
+        pool = ThreadPoolExecutor(
+            max_workers=max_workers or min(len(calls), DEFAULT_MAX_WORKERS),
+            thread_name_prefix="gettysparqlpatterns",
+        )
+        try:
+            with time_limit(deadline=at):
+                futures = [
+                    pool.submit(
+                        contextvars.copy_context().run,
+                        self.run_pattern,
+                        name,
+                        sparql_client_method,
+                        priority=priority,
+                        **(kwargs or {}),
+                    )
+                    for name, kwargs in calls
+                ]
+            wait(futures, timeout=None if at is None else max(at - time.monotonic(), 0))
+            results = []
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+                    results.append(
+                        QueryTimeoutError("The call did not finish before the deadline")
+                    )
+                    continue
+                exc = future.exception()
+                results.append(future.result() if exc is None else exc)
+            return results
+        finally:
+            # Without a deadline every call has finished by now
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def arun_pattern(
+        self,
+        name: str,
+        sparql_client_method: Callable = None,
+        *,
+        priority: str | None = None,
+        **kwargs,
+    ):
+        """As `run_pattern`, for use with an asynchronous sparql client method."""
+        sparql_client_method = self._get_client(sparql_client_method)
+        pattern = self._pattern_or_raise(name)
+        if priority is None:
+            return await pattern.arun(sparql_client_method, **kwargs)
+        token = current_priority.set(priority)
+        try:
+            return await pattern.arun(sparql_client_method, **kwargs)
+        finally:
+            current_priority.reset(token)
+
+    async def agather_patterns(
+        self,
+        calls: list,
+        max_concurrency: int = 10,
+        sparql_client_method: Callable = None,
+        return_exceptions: bool = False,
+        priority: str | None = None,
+        timeout: float | None = None,
+        deadline: float | None = None,
+    ):
+        """Run a list of `(name, kwargs)` pattern calls concurrently, with no more than
+        `max_concurrency` queries in flight at once. The results are returned in the
+        same order as the calls. If `return_exceptions` is True, a failing call has its
+        exception returned in its place rather than raised.
+
+        With a `timeout` or `deadline` for the whole batch, the calls that have not
+        finished when it is reached are cancelled. With `return_exceptions` they have
+        a QueryTimeoutError in their place, otherwise a QueryTimeoutError is raised
+        with the results list (with None for the unfinished calls) as `partial`."""
+        sparql_client_method = self._get_client(sparql_client_method)
+        import asyncio
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(name, kwargs):
+            async with semaphore:
+                return await self.arun_pattern(
+                    name, sparql_client_method, priority=priority, **kwargs
+                )
+
+        at = deadline_from(timeout, deadline)
+        if at is None:
+            return await asyncio.gather(
+                *[_bounded(name, kwargs or {}) for name, kwargs in calls],
+                return_exceptions=return_exceptions,
+            )
+
+        with time_limit(deadline=at):
+            # The tasks take a copy of the context, and so the deadline
+            tasks = [
+                asyncio.ensure_future(_bounded(name, kwargs or {}))
+                for name, kwargs in calls
+            ]
+        try:
+            if tasks:
+                await asyncio.wait(
+                    tasks,
+                    timeout=max(at - time.monotonic(), 0),
+                    return_when=(
+                        asyncio.ALL_COMPLETED
+                        if return_exceptions
+                        else asyncio.FIRST_EXCEPTION
+                    ),
+                )
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        results, timed_out = [], 0
+        for task in tasks:
+            if not task.done() or task.cancelled():
+                timed_out += 1
+                results.append(
+                    QueryTimeoutError("The call did not finish before the deadline")
+                )
+            elif (exc := task.exception()) is not None:
+                if not return_exceptions and not isinstance(exc, QueryTimeoutError):
+                    raise exc
+                timed_out += isinstance(exc, QueryTimeoutError)
+                results.append(exc)
+            else:
+                results.append(task.result())
+        if timed_out and not return_exceptions:
+            raise QueryTimeoutError(
+                f"{timed_out} of {len(tasks)} calls did not finish before the deadline",
+                partial=[
+                    None if isinstance(r, QueryTimeoutError) else r for r in results
+                ],
+            )
+        return results
+
     # Ducktype a list
     def __iter__(self):
         return iter(self._patterns.values())
@@ -391,4 +1919,4 @@ class PatternSet:
         return len(self._patterns)
 
     def __getitem__(self, index):
-        return list(self._patterns.values())[index]
+        return self._ordered[index]
@@ -0,0 +1,168 @@
+from array import array
+
+from .utilities import SPARQLResponseObj, SPARQLURI, SPARQLLiteral
+
+XSD_INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+# Term kind code 0 is reserved for an unbound variable
+UNBOUND = 0
+
+
+class SPARQLResultTable:
+    """A column-oriented SELECT result.
+
+    Rather than a dict of `SPARQLURI`/`SPARQLLiteral` objects per row, each projected
+    variable is held as a column of plain values (`str`, or `int` for xsd:integer
+    literals) alongside a compact array of term kind codes. The codes index a table of
+    `(sparql type, datatype)` pairs shared by the whole result. Columns that are
+    entirely integers are stored as `array('q')`.
+
+    For compatibility with the list of dicts returned by `run_pattern`, the table can
+    be iterated over and indexed by position to get rows in that same format. Indexing
+    with a variable name returns the column of plain values."""
+
+    def __init__(self, vars: list | None = None):
+        self.vars = []
+        self._values = {}
+        self._kinds = {}
+        self._kind_table = [None]
+        self._kind_codes = {}
+        self._length = 0
+        for var in vars or []:
+            self._add_column(var)
+
+    @classmethod
+    def from_response(cls, resp: dict):
+        match resp:
+            case {"head": {"vars": [*vars]}, "results": {"bindings": [*bindings]}}:
+                return cls.from_bindings(bindings, vars)
+            case _:
+                raise ValueError("Not a SPARQL JSON SELECT response")
+
+    @classmethod
+    def from_bindings(cls, bindings, vars: list | None = None):
+        """Build a table from an iterable of SPARQL JSON bindings, such as the one
+        returned by `utilities.iter_sparql_bindings`. Variables that are not listed in
+        `vars` are added as they are found."""
+        table = cls(vars)
+        for binding in bindings:
+            table.append(binding)
+        table.compact()
+        return table
+
+    def _add_column(self, var):
+        self.vars.append(var)
+        self._values[var] = [None] * self._length
+        self._kinds[var] = array("H", bytes(2 * self._length))
+
+    def _kind_code(self, stype, datatype):
+        if (code := self._kind_codes.get((stype, datatype))) is None:
+            code = self._kind_codes[(stype, datatype)] = len(self._kind_table)
+            self._kind_table.append((stype, datatype))
+        return code
+
+    def append(self, binding: dict):
+        for var, term in binding.items():
+            if var not in self._values:
+                self._add_column(var)
+            values = self._values[var]
+            if not isinstance(values, list):
+                # A compacted column that is being added to
+                values = self._values[var] = list(values)
+            stype = term.get("type")
+            datatype = term.get("datatype")
+            value = term.get("value")
+            if stype == "literal" and datatype == XSD_INTEGER:
+                value = int(value)
+            values.append(value)
+            self._kinds[var].append(self._kind_code(stype, datatype))
+
+        self._length += 1
+        for var in self.vars:
+            if len(self._kinds[var]) < self._length:
+                values = self._values[var]
+                if not isinstance(values, list):
+                    values = self._values[var] = list(values)
+                values.append(None)
+                self._kinds[var].append(UNBOUND)
+
+    def compact(self):
+        """Store every column that only holds integers as an `array('q')`"""
+        for var in self.vars:
+            values = self._values[var]
+            if not isinstance(values, list) or not values:
+                continue
+            kinds = set(self._kinds[var])
+            if all(self._kind_table[k] == ("literal", XSD_INTEGER) for k in kinds):
+                try:
+                    self._values[var] = array("q", values)
+                except OverflowError:
+                    pass
+
+    def column(self, var: str):
+        """The plain values for a variable (None where it is unbound)"""
+        return self._values[var]
+
+    def kinds(self, var: str):
+        """The `(sparql type, datatype)` pair for each value in a column (None where
+        the variable is unbound)"""
+        return [self._kind_table[k] for k in self._kinds[var]]
+
+    def to_numpy(self, var: str):
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy is required to convert a column to a numpy array")
+
+        values = self._values[var]
+        if isinstance(values, array):
+            return numpy.frombuffer(values, dtype=numpy.int64)
+        return numpy.array(values, dtype=object)
+
+    def _term(self, value, code):
+        if code == UNBOUND:
+            return None
+        stype, datatype = self._kind_table[code]
+        match stype:
+            case "literal" if datatype == XSD_INTEGER:
+                return value
+            case "uri":
+                return SPARQLURI(value)
+            case "literal":
+                return SPARQLLiteral(value, datatype)
+            case _:
+                return SPARQLResponseObj(value, stype, datatype=datatype)
+
+    def row(self, index: int):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("result row index out of range")
+        return {
+            var: self._term(self._values[var][index], code)
+            for var in self.vars
+            if (code := self._kinds[var][index]) != UNBOUND
+        }
+
+    def to_list(self):
+        """The rows in the same form as `parsed_sparql_response`"""
+        return list(self)
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self.row(index)
+
+    def __getitem__(self, key):
+        match key:
+            case str():
+                return self.column(key)
+            case slice():
+                return [self.row(i) for i in range(*key.indices(self._length))]
+            case _:
+                return self.row(key)
+
+    def __repr__(self):
+        return f"SPARQLResultTable(vars={self.vars!r}, rows={self._length})"
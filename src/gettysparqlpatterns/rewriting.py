@@ -0,0 +1,177 @@
+import re
+
+# Helpers that rewrite rendered SPARQL patterns into other (usually batched) forms.
+# They work on the rendered query text, and return None when a query is not in a
+# shape that can be safely rewritten so that the caller can fall back to running
+# the original pattern.
+
+# The PREFIX/BASE declarations (and comments) at the start of a query
+_PROLOGUE = re.compile(
+    r"^(?P<prologue>(?:\s*(?:PREFIX\s+[\w.-]*:\s*<[^>]*>|BASE\s*<[^>]*>|#[^\n]*))*)",
+    re.IGNORECASE,
+)
+
+_ASK = re.compile(
+    r"^\s*ASK\s*(?:WHERE\s*)?\{(?P<body>.*)\}\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Characters that cannot appear in an IRIREF
+_BAD_IRI_CHARS = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+BATCH_PLACEHOLDER = "urn:x-gettysparqlpatterns:batch-placeholder"
+
+
+def split_prologue(query: str):
+    """Split a query into its prologue (PREFIX/BASE lines) and the query body"""
+    m = _PROLOGUE.match(query)
+    return query[: m.end()].strip(), query[m.end() :].strip()
+
+
+def is_valid_iri(uri: str):
+    return bool(uri) and not _BAD_IRI_CHARS.search(uri)
+
+
+def ask_to_batched_select(
+    query: str, variable: str, uris: list, placeholder: str = BATCH_PLACEHOLDER
+):
+    """Rewrite an ASK query that was rendered with `placeholder` standing in for a URI
+    parameter (eg `<$URI>`) into a SELECT that returns the URIs from `uris` for which
+    the ASK would have been true."""
+    prologue, rest = split_prologue(query)
+    if (m := _ASK.match(rest)) is None:
+        return None
+
+    body = m.group("body").replace(f"<{placeholder}>", f"?{variable}")
+    if placeholder in body:
+        # The parameter is used in some other way (eg inside a literal)
+        return None
+
+    values = " ".join(f"<{uri}>" for uri in uris)
+    return f"""{prologue}
+SELECT DISTINCT ?{variable} WHERE {{
+  VALUES ?{variable} {{ {values} }}
+  {{ {body} }}
+}}"""
+
+
+# LIMIT/OFFSET clauses (in either order) at the very end of a query
+_TRAILING_LIMIT_OFFSET = re.compile(
+    r"(?:\s*\b(?:LIMIT|OFFSET)\s+\d+)+\s*$", re.IGNORECASE
+)
+_TRAILING_ORDER_BY = re.compile(r"\bORDER\s+BY\b[^{}]*$", re.IGNORECASE)
+
+
+def paginate_query(query: str, limit: int, offset: int, order_by: list | None = None):
+    """Replace any LIMIT/OFFSET at the end of a SELECT query with the given ones. If
+    `order_by` variables are given and the query has no ORDER BY of its own, the
+    results are ordered by them so that the pages are stable."""
+    query = _TRAILING_LIMIT_OFFSET.sub("", query).rstrip()
+    if order_by and not _TRAILING_ORDER_BY.search(query):
+        query += "\nORDER BY " + " ".join(
+            v if v.startswith("?") else f"?{v}" for v in order_by
+        )
+    return f"{query}\nLIMIT {limit} OFFSET {offset}"
+
+
+_PREFIX_DECL = re.compile(r"PREFIX\s+([\w.-]*):\s*<([^>]*)>", re.IGNORECASE)
+_BASE_DECL = re.compile(r"^\s*BASE\b", re.IGNORECASE | re.MULTILINE)
+_SERVICE = re.compile(r"\bSERVICE\b", re.IGNORECASE)
+
+# A count pattern: a single COUNT aggregate projected as ?count, with no GROUP BY
+_COUNT_SELECT = re.compile(
+    r"^SELECT\s*\(\s*(?P<expr>COUNT\s*\([^()]*\))\s*AS\s+\?count\s*\)\s*"
+    r"(?:WHERE\s*)?\{(?P<body>.*)\}\s*(?:LIMIT\s+\d+\s*)?$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def count_subselect(query: str, variable: str):
+    """Rewrite a count query as a sub-select that projects its count as `variable`.
+    Returns the query's PREFIX declarations (as a dict) and the sub-select, or None
+    if the query cannot be merged with others (eg it uses SERVICE or BASE)."""
+    prologue, rest = split_prologue(query)
+    if _BASE_DECL.search(prologue) or _SERVICE.search(rest):
+        return None
+    if (m := _COUNT_SELECT.match(rest)) is None:
+        return None
+    prefixes = dict(_PREFIX_DECL.findall(prologue))
+    return prefixes, (
+        f"{{ SELECT ({m.group('expr')} AS ?{variable}) WHERE {{{m.group('body')}}} }}"
+    )
+
+
+def ask_exists(query: str, variable: str):
+    """Rewrite an ASK query as an `(EXISTS {...} AS ?variable)` projection. Returns the
+    query's PREFIX declarations (as a dict) and the projection, or None if the query
+    cannot be merged with others (eg it uses SERVICE or BASE)."""
+    prologue, rest = split_prologue(query)
+    if _BASE_DECL.search(prologue) or _SERVICE.search(rest):
+        return None
+    if (m := _ASK.match(rest)) is None:
+        return None
+    prefixes = dict(_PREFIX_DECL.findall(prologue))
+    return prefixes, f"(EXISTS {{{m.group('body')}}} AS ?{variable})"
+
+
+def _merge(queries: dict, rewrite, prefix: str):
+    # Rewrite each query with `rewrite(query, variable)`, keeping the ones whose
+    # PREFIX declarations agree with the queries before them
+    prefixes = {}
+    parts = []
+    variables = {}
+    unmerged = []
+    for name, query in queries.items():
+        variable = f"{prefix}_{len(variables)}"
+        if (rewritten := rewrite(query, variable)) is None:
+            unmerged.append(name)
+            continue
+        query_prefixes, part = rewritten
+        if any(prefixes.get(p, iri) != iri for p, iri in query_prefixes.items()):
+            unmerged.append(name)
+            continue
+        prefixes.update(query_prefixes)
+        parts.append(part)
+        variables[name] = variable
+
+    prologue = "\n".join(f"PREFIX {p}: <{iri}>" for p, iri in prefixes.items())
+    return prologue, parts, variables, unmerged
+
+
+def merge_count_queries(queries: dict):
+    """Merge count queries (a dict of name -> rendered query) into a single SELECT
+    that has one sub-select per query.
+
+    Returns the merged query (None if fewer than two queries could be merged), a dict
+    of name -> the variable holding that query's count, and a list of the names of the
+    queries that have to be run separately because they could not be rewritten, or
+    declare a prefix differently to the queries before them."""
+    prologue, subselects, variables, unmerged = _merge(
+        queries, count_subselect, "count"
+    )
+    if len(variables) < 2:
+        return None, {}, list(queries)
+
+    projection = " ".join(f"?{v}" for v in variables.values())
+    body = "\n  ".join(subselects)
+    return (
+        f"{prologue}\nSELECT {projection} WHERE {{\n  {body}\n}}",
+        variables,
+        unmerged,
+    )
+
+
+def merge_ask_queries(queries: dict):
+    """Merge ASK queries (a dict of name -> rendered query) into a single SELECT that
+    binds a boolean variable per query to whether its pattern matches. The return
+    value is as for `merge_count_queries`."""
+    prologue, projections, variables, unmerged = _merge(queries, ask_exists, "ask")
+    if len(variables) < 2:
+        return None, {}, list(queries)
+
+    projection = "\n  ".join(projections)
+    return (
+        f"{prologue}\nSELECT\n  {projection}\nWHERE {{}}",
+        variables,
+        unmerged,
+    )
@@ -0,0 +1,220 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+from .waiting import WaitQueue
+
+# The priority class of the queries run in the current context (thread or asyncio
+# task). PatternSet.run_pattern/run_many set it from their `priority` argument, and
+# it is carried into the threads they start.
+current_priority = contextvars.ContextVar("gettysparqlpatterns_priority", default=None)
+
+
+@contextlib.contextmanager
+def priority(name: str | None):
+    """Run the pattern queries in this block with the given priority class:
+
+    with priority("batch"):
+        ps.run_pattern("find_orphan_hmos")
+    """
+    token = current_priority.set(name)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def empty(self, now):
+        self.refill(now)
+        return self.tokens < 1
+
+    def wait_time(self):
+        # How long until there is a whole token, once refilled
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class _Class:
+    __slots__ = ("name", "weight", "bucket", "waiters", "vtime", "served")
+
+    def __init__(self, lock, name, weight=1.0, rate=None, burst=None):
+        self.name = name
+        self.weight = weight
+        self.bucket = _TokenBucket(rate, burst) if rate else None
+        self.waiters = WaitQueue(lock)
+        self.vtime = 0.0  # virtual time: the share of service used / weight
+        self.served = 0
+
+
+DEFAULT_CLASSES = {
+    "interactive": {"weight": 8},
+    "batch": {"weight": 1},
+}
+
+
+class QueryScheduler:
+    """Shares a number of query slots (`max_concurrency`) between priority classes,
+    so that bulk jobs do not hold up interactive lookups on the same endpoint:
+
+        scheduler = QueryScheduler(
+            {"interactive": {"weight": 8}, "batch": {"weight": 1, "rate": 20}},
+            max_concurrency=16,
+        )
+        ps.set_scheduler(scheduler)
+        ps.run_pattern("inf_hmo_not_ready", URI=uri, priority="interactive")
+        ps.run_many(calls, max_workers=32, priority="batch")
+
+    Each class has a `weight`, and optionally a `rate` limit (queries per second) with
+    a `burst` allowance, as a token bucket. While slots are free, queries start
+    straight away (within their class's rate). Once they are all in use, each freed
+    slot goes to the waiting class that has had the least service for its weight
+    (weighted fair queuing), so with the defaults, interactive queries get 8 slots
+    to every 1 for batch queries while both are waiting, but batch queries can use
+    every slot when nothing else is.
+
+    Queries with no priority set, or an unknown one, are in the `default` class."""
+
+    def __init__(
+        self,
+        classes: dict | None = None,
+        max_concurrency: int = 16,
+        default: str = "interactive",
+    ):
+        classes = classes or DEFAULT_CLASSES
+        if default not in classes:
+            raise ValueError(f"The default class {default!r} is not in the classes")
+        self._lock = threading.Lock()
+        self.classes = {
+            name: _Class(self._lock, name, **(options or {}))
+            for name, options in classes.items()
+        }
+        self.max_concurrency = max_concurrency
+        self.default = default
+        self.in_flight = 0
+
+        self._vtime = 0.0  # the virtual time of the last class served
+        self._timer = None
+
+    def _class(self, name):
+        if name is None:
+            name = current_priority.get()
+        return self.classes.get(name) or self.classes[self.default]
+
+    def _take(self, cls, now):
+        # With the lock held: take a slot (and token) for `cls` if they are available
+        if self.in_flight >= self.max_concurrency:
+            return False
+        if cls.bucket is not None:
+            if cls.bucket.empty(now):
+                return False
+            cls.bucket.tokens -= 1
+        self.in_flight += 1
+        # A class that was idle starts from the current virtual time, rather than
+        # catching up on the service it did not ask for
+        cls.vtime = max(cls.vtime, self._vtime) + 1.0 / cls.weight
+        self._vtime = cls.vtime - 1.0 / cls.weight
+        cls.served += 1
+        return True
+
+    def _dispatch(self):
+        # With the lock held: hand free slots to waiting classes, in weighted fair order
+        now = time.monotonic()
+        while self.in_flight < self.max_concurrency:
+            waiting = sorted(
+                (c for c in self.classes.values() if c.waiters),
+                key=lambda c: max(c.vtime, self._vtime),
+            )
+            for cls in waiting:
+                if self._take(cls, now):
+                    cls.waiters.wake_next()
+                    break
+            else:
+                # nothing waiting, or every waiting class is out of tokens
+                break
+        # Only a class that is waiting for its rate limit needs waking later, when
+        # it will have a token again
+        blocked = [
+            c
+            for c in self.classes.values()
+            if c.waiters and c.bucket is not None and c.bucket.empty(now)
+        ]
+        if blocked and self.in_flight < self.max_concurrency:
+            self._wake_later(min(c.bucket.wait_time() for c in blocked))
+        elif self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _wake_later(self, delay):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def acquire(self, name: str | None = None, timeout: float | None = None):
+        """Wait for a query slot for the priority class `name` (by default, the one
+        set for the current context), raising QueryTimeoutError after `timeout`
+        seconds"""
+        cls = self._class(name)
+        with self._lock:
+            if not cls.waiters and self._take(cls, time.monotonic()):
+                return
+            waiter = cls.waiters.enqueue()
+            self._dispatch()
+        cls.waiters.wait(waiter, timeout, self._release_slot, _timed_out(cls))
+
+    async def aacquire(self, name: str | None = None, timeout: float | None = None):
+        cls = self._class(name)
+        with self._lock:
+            if not cls.waiters and self._take(cls, time.monotonic()):
+                return
+            waiter = cls.waiters.aenqueue()
+            self._dispatch()
+        await cls.waiters.await_slot(
+            waiter, timeout, self._release_slot, _timed_out(cls)
+        )
+
+    def _release_slot(self):
+        # With the lock held
+        self.in_flight -= 1
+        self._dispatch()
+
+    def release(self):
+        with self._lock:
+            self._release_slot()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "classes": {
+                    name: {
+                        "waiting": len(cls.waiters),
+                        "served": cls.served,
+                        "tokens": None if cls.bucket is None else cls.bucket.tokens,
+                    }
+                    for name, cls in self.classes.items()
+                },
+            }
+
+
+def _timed_out(cls):
+    return f"The deadline passed while waiting for a {cls.name!r} query slot"
@@ -0,0 +1,104 @@
+import marshal
+import os
+import sys
+
+from .templating import CompiledTemplate
+
+# Snapshots hold a pattern set's data with each sparql_pattern already compiled (see
+# `CompiledTemplate.to_state`), written with marshal so that loading them skips both
+# the JSON parsing and the template compilation. marshal's format is specific to the
+# Python version, which is part of the snapshot's header, and snapshots should only be
+# read from a directory that is trusted.
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_DIR_ENV = "GETTYSPARQLPATTERNS_SNAPSHOT_DIR"
+
+_snapshot_dir = os.environ.get(SNAPSHOT_DIR_ENV) or None
+
+
+def set_snapshot_dir(path: str | os.PathLike | None):
+    """Set the directory that snapshots of built-in pattern sets are kept in (None
+    turns the snapshots off). Defaults to $GETTYSPARQLPATTERNS_SNAPSHOT_DIR."""
+    global _snapshot_dir
+    _snapshot_dir = os.fspath(path) if path is not None else None
+
+
+def snapshot_path_for(datafilename: str):
+    """Where the snapshot of a built-in data file goes, or None if snapshots are off"""
+    if _snapshot_dir is None:
+        return None
+    return os.path.join(_snapshot_dir, f"{datafilename}.snapshot")
+
+
+def file_fingerprint(path):
+    """The (mtime, size) of a source file, which a snapshot is only valid for"""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _header(fingerprint):
+    return (SNAPSHOT_FORMAT, tuple(sys.version_info[:2]), fingerprint)
+
+
+def _compiled(patterns, patternset=None):
+    out = []
+    for p in patterns:
+        p = dict(p)
+        pattern = patternset._patterns.get(p["name"]) if patternset else None
+        if (
+            pattern is not None
+            and pattern.sparql_pattern.template == p["sparql_pattern"]
+        ):
+            template = pattern.sparql_pattern
+        else:
+            template = CompiledTemplate(p["sparql_pattern"])
+        p["sparql_pattern"] = template.to_state()
+        out.append(p)
+    return out
+
+
+def save_snapshot(path, patterns_data, fingerprint=None, patternset=None):
+    """Write `patterns_data` (a list of patterns, or a dict with 'patterns' in it, as
+    `PatternSet.import_patterns` takes) to `path` with its templates compiled. The
+    compiled templates of `patternset` are reused where it already holds the pattern.
+
+    Errors writing the file are left to the caller. The file is written to a temporary
+    name and moved into place so that a reader never sees a partial snapshot."""
+    match patterns_data:
+        case {"patterns": patterns}:
+            data = {**patterns_data, "patterns": _compiled(patterns, patternset)}
+        case _:
+            data = _compiled(patterns_data, patternset)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps((_header(fingerprint), data)))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_snapshot(path, fingerprint=None):
+    """Read a snapshot written by `save_snapshot`, returning the patterns data with
+    `CompiledTemplate`s in place of the templates. Returns None if there is no
+    snapshot, it cannot be read, or it was made from a different source (fingerprint),
+    format or Python version."""
+    try:
+        with open(path, "rb") as f:
+            header, data = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if header != _header(fingerprint):
+        return None
+
+    match data:
+        case {"patterns": patterns}:
+            pass
+        case _:
+            patterns = data
+    for p in patterns:
+        p["sparql_pattern"] = CompiledTemplate.from_state(p["sparql_pattern"])
+    return data
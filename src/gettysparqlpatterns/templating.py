@@ -0,0 +1,69 @@
+from string import Template
+
+
+class CompiledTemplate(Template):
+    """A `string.Template` that is split into its literal text and parameters once, when
+    it is created, so that rendering is a single join rather than a regex substitution.
+
+    `identifiers` lists the parameter names (`$name` or `${name}`) in the order that
+    they first appear."""
+
+    def __init__(self, template: str):
+        super().__init__(template)
+        self._parts = []
+        self._slots = []
+        self._has_invalid = False
+
+        identifiers = {}
+        last = 0
+        for m in self.pattern.finditer(template):
+            self._parts.append(template[last : m.start()])
+            last = m.end()
+            if (name := m.group("named") or m.group("braced")) is not None:
+                identifiers[name] = None
+                self._slots.append((len(self._parts), name))
+                self._parts.append(None)
+            elif m.group("escaped") is not None:
+                self._parts.append(self.delimiter)
+            else:
+                # Leave it to Template.substitute to raise the usual ValueError
+                self._has_invalid = True
+        self._parts.append(template[last:])
+        self.identifiers = tuple(identifiers)
+
+    def to_state(self):
+        """The compiled template as plain data (suitable for marshal or JSON)"""
+        return (
+            self.template,
+            tuple(self._parts),
+            tuple(self._slots),
+            self.identifiers,
+            self._has_invalid,
+        )
+
+    @classmethod
+    def from_state(cls, state):
+        """Recreate a compiled template from `to_state` without parsing it again"""
+        template, parts, slots, identifiers, has_invalid = state
+        obj = cls.__new__(cls)
+        obj.template = template
+        obj._parts = list(parts)
+        obj._slots = [tuple(slot) for slot in slots]
+        obj.identifiers = tuple(identifiers)
+        obj._has_invalid = has_invalid
+        return obj
+
+    def render(self, values: dict, defaults: dict | None = None):
+        """Substitute the parameters from `values`, falling back to `defaults`. Raises a
+        KeyError for a parameter that is in neither."""
+        defaults = defaults or {}
+        if self._has_invalid:
+            return self.substitute({**defaults, **values})
+
+        parts = self._parts.copy()
+        for idx, name in self._slots:
+            if name in values:
+                parts[idx] = str(values[name])
+            else:
+                parts[idx] = str(defaults[name])
+        return "".join(parts)
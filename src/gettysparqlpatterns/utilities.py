@@ -1,19 +1,35 @@
+import codecs
 import json
+import logging
+import os
 
-from importlib.resources import files, as_file
-from pathlib import Path
 import gettysparqlpatterns.data
 
+logger = logging.getLogger(__name__)
+
+
+# A str subclass cannot have __slots__ for its attributes, so the terms that need
+# their own sparql_type or datatype keep them in an instance __dict__. CPython only
+# allocates that when an attribute is set, so URIs and plain literals (the class
+# defaults) do without one.
+
 
 class SPARQLResponseObj(str):
     """Catch-all subclass, in case of strange types in the responses (blank nodes?)"""
 
+    sparql_type = None
+    datatype = None
+
     def __new__(cls, value, type, datatype=None):
         obj = str.__new__(cls, value)
         obj.sparql_type = type
-        obj.datatype = datatype
+        if datatype is not None:
+            obj.datatype = datatype
         return obj
 
+    def __reduce__(self):
+        return (SPARQLResponseObj, (str(self), self.sparql_type, self.datatype))
+
     def __repr__(self):
         if self.datatype:
             return f'SPARQLLiteral("{super().__repr__()}", sparql_type={self.sparql_type!r}, datatype="{self.datatype!r}")'
@@ -27,11 +43,9 @@ class SPARQLURI(str):
     class indicates that this is a URI from a SPARQL response rather than a plain string
     """
 
-    def __new__(cls, value):
-        obj = str.__new__(cls, value)
-        obj.sparql_type = "URI"
-        obj.datatype = None
-        return obj
+    __slots__ = ()
+    sparql_type = "URI"
+    datatype = None
 
     def __repr__(self):
         return f"SPARQLURI(URI <{super().__repr__()}>)"
@@ -42,12 +56,18 @@ class SPARQLLiteral(str):
     class indicates that this is a plain string from a SPARQL response. Why this exists is so that
     it is safe to look for the attribute 'sparql_type' in any SPARQL response value"""
 
+    sparql_type = "Literal"
+    datatype = None
+
     def __new__(cls, value, datatype=None):
         obj = str.__new__(cls, value)
-        obj.sparql_type = "Literal"
-        obj.datatype = datatype
+        if datatype is not None:
+            obj.datatype = datatype
         return obj
 
+    def __reduce__(self):
+        return (SPARQLLiteral, (str(self), self.datatype))
+
     def __repr__(self):
         if self.datatype:
             return (
@@ -56,6 +76,79 @@ class SPARQLLiteral(str):
         return f'SPARQLLiteral("{super().__repr__()}")'
 
 
+class TermInterner:
+    """Hands out a single shared object for each distinct URI or literal, so that terms
+    that repeat across the rows of a response (or across responses, if the interner is
+    reused) are only allocated once. If `maxsize` is set, the table is emptied whenever
+    it grows past that many terms."""
+
+    def __init__(self, maxsize: int | None = None):
+        self.maxsize = maxsize
+        self._terms = {}
+
+    def _add(self, key, term):
+        if self.maxsize is not None and len(self._terms) >= self.maxsize:
+            self._terms.clear()
+        self._terms[key] = term
+        return term
+
+    def uri(self, value):
+        if (term := self._terms.get(value)) is None:
+            term = self._add(value, SPARQLURI(value))
+        return term
+
+    def literal(self, value, datatype=None):
+        key = ("literal", value, datatype)
+        if (term := self._terms.get(key)) is None:
+            term = self._add(key, SPARQLLiteral(value, datatype))
+        return term
+
+    def other(self, value, sparql_type, datatype=None):
+        key = (sparql_type, value, datatype)
+        if (term := self._terms.get(key)) is None:
+            term = self._add(key, SPARQLResponseObj(value, sparql_type, datatype))
+        return term
+
+    def __len__(self):
+        return len(self._terms)
+
+
+# A shared TermInterner used by parsed_sparql_response, if one is set
+_global_interner = None
+
+# The size of the term table used for each streamed response
+STREAM_INTERNER_SIZE = 10000
+
+
+def set_global_interner(interner: TermInterner | None):
+    """Share terms between all parsed responses using `interner` (which should have a
+    `maxsize` to bound its memory use). With None, terms are only shared within each
+    response."""
+    global _global_interner
+    _global_interner = interner
+
+
+def parse_result_row(resultrow, interner: TermInterner | None = None):
+    if interner is None:
+        interner = _global_interner or TermInterner()
+    row = {}
+    for k, v in resultrow.items():
+        match v:
+            case {
+                "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+                "type": "literal",
+                "value": value,
+            }:
+                row[k] = int(value)
+            case {"type": "uri", "value": value}:
+                row[k] = interner.uri(value)
+            case {"type": "literal", "value": value, **other}:
+                row[k] = interner.literal(value, other.get("datatype"))
+            case {"type": othertype, "value": value, **other}:
+                row[k] = interner.other(value, othertype, other.get("datatype"))
+    return row
+
+
 def parsed_sparql_response(resp, stype):
     match resp:
         case {"head": {}, "boolean": resp}:
@@ -75,43 +168,156 @@ def parsed_sparql_response(resp, stype):
                     ]:
                         return int(count)
 
-            # Process the response as a standard SELECT response
-            parsed_results = []
-            for resultrow in results:
-                row = {}
-                for k, v in resultrow.items():
-                    match v:
-                        case {
-                            "datatype": "http://www.w3.org/2001/XMLSchema#integer",
-                            "type": "literal",
-                            "value": value,
-                        }:
-                            row[k] = int(value)
-                        case {"type": "uri", "value": value}:
-                            row[k] = SPARQLURI(value)
-                        case {"type": "literal", "value": value, **other}:
-                            datatype = other.get("datatype")
-                            row[k] = SPARQLLiteral(value, datatype)
-                        case {"type": othertype, "value": value, **other}:
-                            datatype = other.get("datatype")
-                            row[k] = SPARQLResponseObj(
-                                value, othertype, datatype=datatype
-                            )
-                parsed_results.append(row)
-            return parsed_results
+            # Process the response as a standard SELECT response, sharing
+            # repeated terms between the rows
+            interner = _global_interner or TermInterner()
+            return [parse_result_row(resultrow, interner) for resultrow in results]
         case other:
             return other
 
 
+class _JSONStream:
+    """Just enough of an incremental JSON reader to walk down to the result bindings
+    of a SPARQL JSON response, decoding one value at a time from a stream of chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _more(self):
+        if self.eof:
+            return False
+        chunk = next(self._chunks, None)
+        if not chunk:
+            self.eof = True
+            chunk = self._decoder.decode(b"", final=True)
+        elif isinstance(chunk, (bytes, bytearray)):
+            chunk = self._decoder.decode(chunk)
+        # drop what has already been consumed
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                return ""
+
+    def expect(self, char):
+        if (found := self.peek()) != char:
+            raise ValueError(f"Expected '{char}' in the SPARQL response, got '{found}'")
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may continue in the next chunk
+                if (
+                    end < len(self.buf)
+                    or self.eof
+                    or not isinstance(value, (int, float))
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._more()
+
+
+def _chunks_from(stream, chunk_size):
+    match stream:
+        case bytes() | bytearray() | str():
+            yield stream
+        case _ if hasattr(stream, "read"):
+            while chunk := stream.read(chunk_size):
+                yield chunk
+        case _:
+            yield from stream
+
+
+def iter_sparql_response(stream, chunk_size: int = 65536):
+    """Parse a SPARQL JSON SELECT response incrementally, yielding each result row as
+    it is read. `stream` can be a file-like object (eg an HTTP response body), an
+    iterable of bytes chunks, or the response as bytes/str."""
+    # bounded, so that memory use stays flat however many rows are streamed
+    interner = _global_interner or TermInterner(maxsize=STREAM_INTERNER_SIZE)
+    for binding in iter_sparql_bindings(stream, chunk_size):
+        yield parse_result_row(binding, interner)
+
+
+def iter_sparql_bindings(stream, chunk_size: int = 65536):
+    """As `iter_sparql_response`, but yields the undecoded JSON binding for each row"""
+    reader = _JSONStream(_chunks_from(stream, chunk_size))
+    reader.expect("{")
+    while not reader.skip("}"):
+        key = reader.value()
+        reader.expect(":")
+        if key == "results":
+            reader.expect("{")
+            while not reader.skip("}"):
+                key = reader.value()
+                reader.expect(":")
+                if key == "bindings":
+                    reader.expect("[")
+                    while not reader.skip("]"):
+                        yield reader.value()
+                        reader.skip(",")
+                else:
+                    reader.value()
+                reader.skip(",")
+        else:
+            # 'head' and anything else is not needed to produce the rows
+            reader.value()
+        reader.skip(",")
+
+
 def load_from_package(patternset, datafilename: str):
+    from importlib.resources import files, as_file
+
+    from . import snapshot
+
     source = files(gettysparqlpatterns.data).joinpath(datafilename)
     with as_file(source) as jdoc:
+        if (snapshot_path := snapshot.snapshot_path_for(datafilename)) is None:
+            patternset.import_patterns(json.loads(jdoc.read_text()))
+            return
+
+        fingerprint = snapshot.file_fingerprint(jdoc)
+        if (pl := snapshot.load_snapshot(snapshot_path, fingerprint)) is not None:
+            patternset.import_patterns(pl)
+            return
+
         pl = json.loads(jdoc.read_text())
         patternset.import_patterns(pl)
+        try:
+            os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+            snapshot.save_snapshot(snapshot_path, pl, fingerprint, patternset)
+        except OSError as e:
+            logger.warning(f"Could not write a snapshot of {datafilename}: {e}")
 
 
 def list_available():
     """Lists data files within a package using importlib.resources."""
+    from importlib.resources import files
+    from pathlib import Path
+
     files_list = []
     package_path = files(gettysparqlpatterns.data)
 
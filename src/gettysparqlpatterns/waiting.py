@@ -0,0 +1,87 @@
+import threading
+
+from collections import deque
+
+from .exceptions import QueryTimeoutError
+
+# The queue of callers waiting for a query slot, shared by the AdaptiveLimiter and
+# the QueryScheduler. Callers are threads (waiting on a threading.Event) or asyncio
+# tasks (awaiting a future on their loop), served in the order they arrived. The slot
+# is handed over by whoever frees it (`wake_next`), so a waiter that gives up after
+# being woken has to give the slot back.
+#
+# The queue is guarded by its owner's lock, which `enqueue` and `wake_next` expect to
+# be held and `wait`/`await_slot` take to give up.
+
+
+class WaitQueue:
+    __slots__ = ("_lock", "_waiters")
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._waiters = deque()  # threading.Event or (loop, asyncio.Future)
+
+    def __len__(self):
+        return len(self._waiters)
+
+    def __bool__(self):
+        return bool(self._waiters)
+
+    def enqueue(self):
+        """Add a waiting thread, returning what to pass to `wait`"""
+        waiter = threading.Event()
+        self._waiters.append(waiter)
+        return waiter
+
+    def aenqueue(self):
+        """Add a waiting asyncio task, returning what to pass to `await_slot`"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        self._waiters.append(waiter)
+        return waiter
+
+    def wake_next(self):
+        """Hand a slot to the longest waiting caller"""
+        waiter = self._waiters.popleft()
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def wait(self, waiter, timeout, give_back, message):
+        """Wait (in a thread) to be handed a slot. After `timeout` seconds, stop
+        waiting and raise QueryTimeoutError(`message`), calling `give_back` (with the
+        lock held) if the slot was handed over all the same."""
+        if not waiter.wait(timeout):
+            self._give_up(waiter, give_back)
+            raise QueryTimeoutError(message)
+
+    async def await_slot(self, waiter, timeout, give_back, message):
+        """As `wait`, in an asyncio task, which can also be cancelled"""
+        import asyncio
+
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            self._give_up(waiter, give_back)
+            raise QueryTimeoutError(message) from None
+        except asyncio.CancelledError:
+            self._give_up(waiter, give_back)
+            raise
+
+    def _give_up(self, waiter, give_back):
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                # the slot was handed over as the wait ended
+                give_back()
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+    # else it was cancelled, and the waiter gives the slot back
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from gettysparqlpatterns import PatternSet
+from gettysparqlpatterns.scheduling import current_priority
+
+ASK_TRUE = {"head": {}, "boolean": True}
+NO_ROWS = {"head": {"vars": ["_batch_uri"]}, "results": {"bindings": []}}
+
+
+class StandInEndpoint:
+    """A sparql client method standing in for an endpoint, which records what it is
+    sent: the number of `calls`, the `timeouts` and `priorities` they were sent with,
+    and the most it had in flight at once.
+
+    Each query takes `latency` seconds, growing with the square of the load once more
+    than `capacity` queries are in flight. Queries that mention "slow" take
+    `slow_delay` seconds instead, honouring the timeout they are passed as a client
+    library would. With `fail`, every query raises ConnectionError. ASK queries are
+    answered true, and SELECTs (eg batched filters) with no rows."""
+
+    def __init__(
+        self, name=None, latency=0.0, capacity=None, slow_delay=1.0, fail=False
+    ):
+        self.endpoint = name
+        self.latency = latency
+        self.capacity = capacity
+        self.slow_delay = slow_delay
+        self.fail = fail
+        self.calls = 0
+        self.timeouts = []
+        self.priorities = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query, timeout=None):
+        with self._lock:
+            self.calls += 1
+            self.timeouts.append(timeout)
+            self.priorities.append(current_priority.get())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            load = self.in_flight
+        try:
+            if "slow" in query:
+                if timeout is not None and timeout < self.slow_delay:
+                    time.sleep(timeout)
+                    raise TimeoutError("read timed out")
+                time.sleep(self.slow_delay)
+            elif self.capacity is not None:
+                time.sleep(self.latency * max(1, load / self.capacity) ** 2)
+            else:
+                time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if self.fail:
+            raise ConnectionError(f"{self.endpoint} is down")
+        if query.lstrip().startswith("SELECT"):
+            return NO_ROWS
+        return ASK_TRUE
+
+
+@pytest.fixture
+def patternset():
+    """A factory for a PatternSet using `client`, with a "things" select pattern and
+    an "ask" filter pattern. Keyword arguments are passed to the PatternSet."""
+
+    def _patternset(client, **kwargs):
+        ps = PatternSet(name="TestSet", sparql_client_method=client, **kwargs)
+        ps.add_pattern(
+            name="things",
+            sparql_pattern="SELECT ?s WHERE { ?s a <$TYPE> }",
+            stype="select",
+        )
+        ps.add_pattern(
+            name="ask",
+            sparql_pattern="ASK { <$URI> ?p ?o }",
+            stype="ask",
+            ask_filter=True,
+        )
+        return ps
+
+    return _patternset
@@ -1,9 +1,11 @@
+import asyncio
 import pytest
-from unittest.mock import Mock
+from unittest.mock import AsyncMock, Mock
 
 from gettysparqlpatterns import (
     RequiredParametersMissingError,
     NoSPARQLEndpointSetError,
+    SPARQLPatternsError,
 )
 
 from gettysparqlpatterns.registry import BasePattern
@@ -71,6 +73,41 @@ def test_get_query():
         pattern.get_query()
 
 
+def test_get_query_template_syntax():
+    pattern = BasePattern(
+        name="test",
+        sparql_pattern="SELECT * WHERE { <${URI}> ?p $value } # costs $$5 LIMIT $LIMIT",
+        stype="select",
+        default_values={"LIMIT": 10},
+    )
+    assert pattern.keyword_parameters == ["URI", "value", "LIMIT"]
+    assert (
+        pattern.get_query(URI="urn:a", value='"x"', LIMIT=5)
+        == 'SELECT * WHERE { <urn:a> ?p "x" } # costs $5 LIMIT 5'
+    )
+
+    with pytest.raises(RequiredParametersMissingError) as e:
+        pattern.get_query(value="1")
+    assert "URI" in str(e.value)
+
+    # changes to the default values are picked up
+    pattern.default_values = {"LIMIT": 10, "URI": "urn:b"}
+    assert pattern.get_query(value="1").startswith("SELECT * WHERE { <urn:b>")
+    pattern.default_values["value"] = "2"
+    assert pattern.get_query() == "SELECT * WHERE { <urn:b> ?p 2 } # costs $5 LIMIT 10"
+    del pattern.default_values["value"]
+    with pytest.raises(RequiredParametersMissingError):
+        pattern.get_query()
+
+
+def test_get_query_invalid_placeholder():
+    pattern = BasePattern(
+        name="test", sparql_pattern="SELECT * WHERE { ?s ?p $1 }", stype="select"
+    )
+    with pytest.raises(ValueError):
+        pattern.get_query()
+
+
 def test_run():
     mock_sparql_client_method = Mock(return_value={"results": "mocked_results"})
     pattern = BasePattern(
@@ -103,5 +140,104 @@ def test_run_with_default():
     assert result == {"results": "mocked_results"}
 
 
+def _select_response(var, values):
+    return {
+        "head": {"vars": [var]},
+        "results": {"bindings": [{var: {"type": "uri", "value": v}} for v in values]},
+    }
+
+
+def test_filter_many():
+    mock_sparql_client_method = Mock(
+        side_effect=[
+            _select_response("_batch_uri", ["urn:a"]),
+            _select_response("_batch_uri", ["urn:c"]),
+        ]
+    )
+    pattern = BasePattern(
+        name="test",
+        sparql_pattern="PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>\nASK {\n  <$URI> crm:P2_has_type <urn:notready> .\n} ",
+        stype="ask",
+        ask_filter=False,
+        sparql_client_method=mock_sparql_client_method,
+    )
+    result = pattern.filter_many(["urn:a", "urn:b", "urn:c", "urn:a"], batch_size=2)
+    assert result == {"urn:a": False, "urn:b": True, "urn:c": False}
+    assert mock_sparql_client_method.call_count == 2
+
+    query = mock_sparql_client_method.call_args_list[0][0][0]
+    assert query.startswith("PREFIX crm: <http://www.cidoc-crm.org/cidoc-crm/>")
+    assert "SELECT DISTINCT ?_batch_uri" in query
+    assert "VALUES ?_batch_uri { <urn:a> <urn:b> }" in query
+    assert "?_batch_uri crm:P2_has_type <urn:notready>" in query
+
+
+def test_filter_many_falls_back():
+    mock_sparql_client_method = Mock(
+        side_effect=[{"head": {}, "boolean": True}, {"head": {}, "boolean": False}]
+    )
+    pattern = BasePattern(
+        name="test",
+        sparql_pattern='ASK { ?s ?p "$URI" }',
+        stype="ask",
+        ask_filter=True,
+        sparql_client_method=mock_sparql_client_method,
+    )
+    result = pattern.filter_many(["urn:a", "urn:b"])
+    assert result == {"urn:a": True, "urn:b": False}
+    mock_sparql_client_method.assert_called_with('ASK { ?s ?p "urn:b" }')
+
+    with pytest.raises(SPARQLPatternsError):
+        pattern.filter_many(["urn:a b"])
+
+    select = BasePattern(name="test", sparql_pattern="SELECT", stype="select")
+    with pytest.raises(NotImplementedError):
+        select.filter_many(["urn:a"])
+
+
+def test_arun():
+    mock_sparql_client_method = AsyncMock(return_value={"results": "mocked_results"})
+    pattern = BasePattern(
+        name="test",
+        sparql_pattern="SELECT * WHERE { ?s ?p $value }",
+        stype="select",
+        sparql_client_method=mock_sparql_client_method,
+    )
+    result = asyncio.run(pattern.arun(value="test_value"))
+    assert result == {"results": "mocked_results"}
+    mock_sparql_client_method.assert_awaited_once_with(
+        "SELECT * WHERE { ?s ?p test_value }"
+    )
+
+    # synchronous client methods are also accepted
+    sync_method = Mock(return_value={"results": "sync_results"})
+    result = asyncio.run(pattern.arun(sync_method, value="test_value"))
+    assert result == {"results": "sync_results"}
+
+    # but an async client cannot be used with the blocking methods
+    with pytest.raises(TypeError):
+        pattern.run(value="test_value")
+
+    pattern.sparql_client_method = None
+    with pytest.raises(NoSPARQLEndpointSetError):
+        asyncio.run(pattern.arun())
+
+
+def test_afilter():
+    mock_sparql_client_method = AsyncMock(return_value={"head": {}, "boolean": True})
+    pattern = BasePattern(
+        name="test",
+        sparql_pattern="ASK { <$URI> ?p ?o }",
+        stype="ask",
+        ask_filter=False,
+        sparql_client_method=mock_sparql_client_method,
+    )
+    assert asyncio.run(pattern.afilter(URI="urn:a")) is False
+
+    select = BasePattern(name="test", sparql_pattern="SELECT", stype="select")
+    with pytest.raises(NotImplementedError):
+        asyncio.run(select.afilter(mock_sparql_client_method))
+
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,284 @@
+import subprocess
+import sys
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from gettysparqlpatterns import PatternSet, ResultCache, SQLiteResultCache
+from gettysparqlpatterns.cache import MISS, cache_key, canonical_query, endpoint_key
+
+
+def _count_response(count):
+    return {
+        "head": {"vars": ["count"]},
+        "results": {
+            "bindings": [
+                {
+                    "count": {
+                        "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+                        "type": "literal",
+                        "value": str(count),
+                    }
+                }
+            ]
+        },
+    }
+
+
+def test_canonical_query():
+    assert canonical_query("SELECT *\n  WHERE {  ?s ?p ?o }\n") == (
+        "SELECT * WHERE { ?s ?p ?o }"
+    )
+    # whitespace in literals is significant
+    assert canonical_query('ASK { ?s ?p "a  b" }') == 'ASK { ?s ?p "a  b" }'
+
+
+def test_endpoint_key():
+    client = Mock()
+    client.endpoint = "https://example.org/sparql"
+    assert endpoint_key(client) == "https://example.org/sparql"
+
+    def query(q):
+        pass
+
+    assert endpoint_key(query) == endpoint_key(query)
+    assert endpoint_key(query) != endpoint_key(lambda q: None)
+
+
+def test_anonymous_clients_are_not_confused():
+    # Keys for clients without an endpoint must not be reused once a client is freed,
+    # as id() values are
+    ps = PatternSet(name="TestSet")
+    ps.add_pattern(name="a", sparql_pattern="ASK { <$URI> ?p ?o }", stype="ask")
+    ps.set_cache(ResultCache())
+
+    def make(answer):
+        return lambda query: {"head": {}, "boolean": answer}
+
+    keys = set()
+    for n in range(20):
+        client = make(n % 2 == 0)
+        assert ps.run_pattern("a", client, URI="urn:a") is (n % 2 == 0)
+        keys.add(endpoint_key(client))
+        del client
+    assert len(keys) == 20
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", "select", "raw", 1)
+    cache.put("b", "select", "raw", 2)
+    assert cache.get("a", "select") == 1
+    cache.put("c", "select", "raw", 3)
+
+    assert cache.get("b", "select") is MISS
+    assert cache.get("a", "select") == 1
+    assert cache.get("c", "select") == 3
+    assert cache.stats() == {
+        "hits": 3,
+        "misses": 1,
+        "evictions": 1,
+        "entries": 2,
+        "bytes": cache.total_bytes,
+    }
+
+
+def test_byte_limit():
+    cache = ResultCache(max_bytes=200)
+    cache.put("a", "select", "x" * 100, 1)
+    cache.put("b", "select", "x" * 100, 2)
+    assert len(cache) == 1
+    assert cache.get("b", "select") == 2
+
+    # Too big to ever be cached
+    cache.put("c", "select", "x" * 1000, 3)
+    assert cache.get("c", "select") is MISS
+    assert cache.total_bytes <= 200
+
+
+def test_ttl_by_stype():
+    cache = ResultCache(ttl={"count": 100}, default_ttl=10)
+    with patch("gettysparqlpatterns.cache.time.monotonic", return_value=0):
+        cache.put("count", "count", "raw", 1)
+        cache.put("select", "select", "raw", [])
+    with patch("gettysparqlpatterns.cache.time.monotonic", return_value=50):
+        assert cache.get("count", "count") == 1
+        assert cache.get("select", "select") is MISS
+    assert len(cache) == 1
+
+
+def test_patternset_cache():
+    mock_method = Mock(side_effect=[_count_response(5), _count_response(6)])
+    cache = ResultCache()
+    ps = PatternSet(name="TestSet", sparql_client_method=mock_method, cache=cache)
+    ps.add_pattern(
+        name="count",
+        sparql_pattern="SELECT (count(?s) as ?count) WHERE { ?s a <$TYPE> }",
+        stype="count",
+    )
+
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+    assert mock_method.call_count == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+    ps.invalidate_cached("count", TYPE="urn:a")
+    assert ps.run_pattern("count", TYPE="urn:a") == 6
+    assert mock_method.call_count == 2
+
+    key = cache_key(mock_method, ps.format_pattern("count", TYPE="urn:a"), "count")
+    assert cache.get(key, "count") == 6
+
+
+def test_cache_key_includes_stype():
+    select_response = {
+        "head": {"vars": ["count"]},
+        "results": {
+            "bindings": [
+                {
+                    "count": {
+                        "type": "literal",
+                        "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+                        "value": "5",
+                    }
+                }
+            ]
+        },
+    }
+    mock_method = Mock(return_value=select_response)
+    cache = ResultCache()
+    ps = PatternSet(name="TestSet", sparql_client_method=mock_method, cache=cache)
+    query = "SELECT (count(?s) as ?count) WHERE { ?s a <$TYPE> }"
+    ps.add_pattern(name="count", sparql_pattern=query, stype="count")
+    ps.add_pattern(name="rows", sparql_pattern=query, stype="select")
+
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+    assert ps.run_pattern("rows", TYPE="urn:a") == [{"count": 5}]
+    assert mock_method.call_count == 2
+
+    ps.invalidate_cached("rows", TYPE="urn:a")
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+    assert mock_method.call_count == 2
+
+
+def test_pattern_cache_override():
+    mock_method = Mock(return_value={"head": {}, "boolean": True})
+    ps = PatternSet(name="TestSet", sparql_client_method=mock_method)
+    ps.add_pattern(name="cached", sparql_pattern="ASK { ?s ?p ?o }", stype="ask")
+    ps.add_pattern(name="uncached", sparql_pattern="ASK { ?s ?o ?p }", stype="ask")
+
+    ps.get_pattern("uncached").set_cache(None)
+    ps.set_cache(ResultCache())
+    assert ps.get_pattern("uncached").cache is None
+
+    for _ in range(3):
+        ps.run_pattern("cached")
+        ps.run_pattern("uncached")
+    assert mock_method.call_count == 4
+
+    # patterns loaded later also pick up the set's cache
+    ps.import_patterns(
+        [{"name": "new", "sparql_pattern": "ASK {}", "stype": "ask"}],
+        add_to_existing=True,
+    )
+    assert ps.get_pattern("new").cache is ps.cache
+
+
+def test_sqlite_cache_shared(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    mock_method = Mock(side_effect=[_count_response(5), _count_response(6)])
+    mock_method.endpoint = "https://example.org/sparql"
+    ps = PatternSet(
+        name="TestSet", sparql_client_method=mock_method, cache=SQLiteResultCache(path)
+    )
+    ps.add_pattern(
+        name="count",
+        sparql_pattern="SELECT (count(?s) as ?count) WHERE { ?s a <$TYPE> }",
+        stype="count",
+    )
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+
+    # another process, with its own connection to the file, gets the cached response
+    script = f"""
+from gettysparqlpatterns import SQLiteResultCache
+from gettysparqlpatterns.utilities import parsed_sparql_response
+cache = SQLiteResultCache({path!r})
+key = "https://example.org/sparql\\ncount\\n" + {ps.format_pattern("count", TYPE="urn:a")!r}
+print(parsed_sparql_response(cache.get(key, "count"), "count"))
+"""
+    out = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "5"
+
+    # a new cache on the same file, eg after a restart
+    ps.set_cache(SQLiteResultCache(path))
+    assert ps.run_pattern("count", TYPE="urn:a") == 5
+    assert mock_method.call_count == 1
+
+    ps.invalidate_cached("count", TYPE="urn:a")
+    assert ps.run_pattern("count", TYPE="urn:a") == 6
+    assert ps.cache.stats()["entries"] == 1
+
+
+def test_sqlite_cache_anonymous_clients(tmp_path, caplog):
+    path = str(tmp_path / "cache.sqlite")
+
+    def make_set(cache):
+        # a plain function, as a new process would define it again
+        def sparql(query):
+            sparql.calls += 1
+            return {"head": {}, "boolean": True}
+
+        sparql.calls = 0
+        ps = PatternSet(name="TestSet", sparql_client_method=sparql)
+        ps.add_pattern(name="a", sparql_pattern="ASK { <$URI> ?p ?o }", stype="ask")
+        ps.set_cache(cache)
+        return ps, sparql
+
+    # without a stable name for the endpoint, nothing is cached
+    ps, sparql = make_set(SQLiteResultCache(path))
+    ps.run_pattern("a", URI="urn:a")
+    ps.run_pattern("a", URI="urn:a")
+    assert sparql.calls == 2 and len(ps.cache) == 0
+    assert "does not expose its endpoint URL" in caplog.text
+
+    # with one, the results are shared with another client object (or process)
+    ps, sparql = make_set(SQLiteResultCache(path, endpoint="lodgateway"))
+    ps.run_pattern("a", URI="urn:a")
+    ps, sparql = make_set(SQLiteResultCache(path, endpoint="lodgateway"))
+    assert ps.run_pattern("a", URI="urn:a") is True
+    assert sparql.calls == 0
+    ps.cache.invalidate_endpoint("lodgateway")
+    assert len(ps.cache) == 0
+
+
+def test_sqlite_cache_eviction_and_ttl(tmp_path):
+    cache = SQLiteResultCache(
+        str(tmp_path / "cache.sqlite"), max_entries=2, ttl={"count": 100}
+    )
+    with patch("gettysparqlpatterns.cache.time.time", return_value=0):
+        cache.put("e\na", "select", {"head": {"vars": []}}, None)
+    with patch("gettysparqlpatterns.cache.time.time", return_value=1):
+        cache.put("e\nb", "count", "text", None)
+        cache.put("e\nc", "ask", b"bytes", None)
+        cache.put("e\nstream", "select", iter([b"x"]), None)
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get("e\na", "select") is MISS
+    with patch("gettysparqlpatterns.cache.time.time", return_value=50):
+        assert cache.get("e\nb", "count") == "text"
+        # the default ttl is 300s
+        assert cache.get("e\nc", "ask") == "bytes"
+    with patch("gettysparqlpatterns.cache.time.time", return_value=150):
+        assert cache.get("e\nb", "count") is MISS
+    assert len(cache) == 1
+
+    cache.invalidate_endpoint("e")
+    assert len(cache) == 0
+    cache.close()
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,137 @@
+import gzip
+import json
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from gettysparqlpatterns import PatternSet, NoSPARQLEndpointSetError
+from gettysparqlpatterns.client import HTTPSPARQLClient
+
+SELECT_RESPONSE = {
+    "head": {"vars": ["s"]},
+    "results": {"bindings": [{"s": {"type": "uri", "value": "urn:a"}}]},
+}
+
+
+class SPARQLHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/patterns.json":
+            return self._reply(
+                [{"name": "p", "sparql_pattern": "ASK {}", "stype": "ask"}]
+            )
+        self._query(parse_qs(url.query)["query"][0])
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        self._query(parse_qs(body)["query"][0])
+
+    def _query(self, query):
+        server = self.server
+        server.seen.append((self.command, query, dict(self.headers)))
+        if server.failures:
+            server.failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._reply(SELECT_RESPONSE)
+
+    def _reply(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/sparql-results+json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SPARQLHandler)
+    server.seen = []
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server, path="/sparql"):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_get_and_post(endpoint):
+    with HTTPSPARQLClient(_url(endpoint), max_get_length=100) as client:
+        assert client("SELECT ?s WHERE { ?s ?p ?o }") == SELECT_RESPONSE
+        long_query = "SELECT ?s WHERE { ?s ?p ?o }" + " " * 200
+        assert client(long_query) == SELECT_RESPONSE
+
+    (get, query, headers), (post, posted, _) = endpoint.seen
+    assert (get, post) == ("GET", "POST")
+    assert posted == long_query
+    assert "gzip" in headers["Accept-Encoding"]
+    assert "application/sparql-results+json" in headers["Accept"]
+
+
+def test_construct_asks_for_ntriples(endpoint):
+    client = HTTPSPARQLClient(_url(endpoint))
+    client("PREFIX ex: <urn:ex:>\nCONSTRUCT { ?s ex:p ?o } WHERE { ?s ex:p ?o }")
+    client("SELECT * {}")
+    (_, _, construct), (_, _, select) = endpoint.seen
+    assert construct["Accept"].startswith("application/n-triples")
+    assert select["Accept"].startswith("application/sparql-results+json")
+
+    # unless the caller chose the Accept header
+    client = HTTPSPARQLClient(_url(endpoint), headers={"Accept": "text/turtle"})
+    client("CONSTRUCT { ?s ?p ?o } WHERE { ?s ?p ?o }")
+    assert endpoint.seen[-1][2]["Accept"] == "text/turtle"
+
+
+def test_retry_on_503(endpoint):
+    endpoint.failures = 2
+    client = HTTPSPARQLClient(_url(endpoint), backoff_factor=0)
+    assert client("SELECT * {}") == SELECT_RESPONSE
+    assert len(endpoint.seen) == 3
+
+    endpoint.failures = 5
+    with pytest.raises(requests.exceptions.HTTPError):
+        client("SELECT * {}")
+    assert len(endpoint.seen) == 3 + 4
+
+
+def test_patternset_with_client(endpoint):
+    client = HTTPSPARQLClient(_url(endpoint))
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    ps.add_pattern(
+        name="all", sparql_pattern="SELECT ?s WHERE { ?s a <$T> }", stype="select"
+    )
+
+    assert ps.run_pattern("all", T="urn:t") == [{"s": "urn:a"}]
+    assert list(
+        ps.iter_pattern("all", sparql_client_method=client.stream, T="urn:t")
+    ) == [{"s": "urn:a"}]
+
+    # pattern sets are fetched through the set's client
+    ps.import_patterns_from_url(_url(endpoint, "/patterns.json"), add_to_existing=True)
+    assert ps.list_patterns() == ["all", "p"]
+
+
+def test_no_endpoint():
+    with pytest.raises(NoSPARQLEndpointSetError):
+        HTTPSPARQLClient()("ASK {}")
+
+
+if __name__ == "__main__":
+    pytest.main()
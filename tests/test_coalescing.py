@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import SingleFlight
+
+from conftest import ASK_TRUE
+
+
+def test_threads_share_one_query(patternset):
+    release = threading.Event()
+    calls = []
+
+    def client(query):
+        calls.append(query)
+        release.wait(5)
+        return ASK_TRUE
+
+    single_flight = SingleFlight()
+    ps = patternset(client, single_flight=single_flight)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(ps.run_pattern, "ask", URI="urn:a") for _ in range(8)]
+        # let every thread reach the single flight before the query returns
+        while single_flight.shared < 7:
+            time.sleep(0.01)
+        release.set()
+        assert [f.result() for f in futures] == [True] * 8
+
+    assert len(calls) == 1
+    assert single_flight.in_flight() == 0
+
+    # once finished, the query is sent again
+    ps.run_pattern("ask", URI="urn:a")
+    assert len(calls) == 2
+
+
+def test_errors_are_shared():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("endpoint down")
+
+    def waiter():
+        started.wait(5)
+        return single_flight.do("key", Mock())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(single_flight.do, "key", failing)
+        follower = pool.submit(waiter)
+        while single_flight.shared < 1:
+            time.sleep(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+
+def test_asyncio_tasks_share_one_query(patternset):
+    calls = []
+
+    async def client(query):
+        calls.append(query)
+        await asyncio.sleep(0.01)
+        return ASK_TRUE
+
+    single_flight = SingleFlight()
+    ps = patternset(client, single_flight=single_flight)
+
+    async def main():
+        return await asyncio.gather(
+            *[ps.arun_pattern("ask", URI="urn:a") for _ in range(5)],
+            ps.arun_pattern("ask", URI="urn:b"),
+        )
+
+    assert asyncio.run(main()) == [True] * 6
+    assert len(calls) == 2
+    assert single_flight.shared == 4
+    assert single_flight.in_flight() == 0
+
+
+def test_disabled_by_default(patternset):
+    client = Mock(return_value=ASK_TRUE)
+    ps = patternset(client, single_flight=None)
+    assert ps.get_pattern("ask").single_flight is None
+
+    single_flight = SingleFlight()
+    ps.set_single_flight(single_flight)
+    assert ps.get_pattern("ask").single_flight is single_flight
+
+
+if __name__ == "__main__":
+    pytest.main()
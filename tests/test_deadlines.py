@@ -0,0 +1,183 @@
+import asyncio
+import inspect
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+from gettysparqlpatterns import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    EndpointPool,
+    QueryScheduler,
+    QueryTimeoutError,
+    time_limit,
+)
+from gettysparqlpatterns.deadlines import accepts_timeout, current_deadline
+
+from conftest import ASK_TRUE, StandInEndpoint
+
+
+def test_timeout_is_passed_to_the_client(patternset):
+    endpoint = StandInEndpoint()
+    ps = patternset(endpoint)
+
+    assert ps.run_pattern("ask", URI="urn:fast", timeout=5) is True
+    assert 4 < endpoint.timeouts[-1] <= 5
+    assert ps.run_pattern("ask", URI="urn:fast") is True
+    assert endpoint.timeouts[-1] is None
+
+    start = time.monotonic()
+    with pytest.raises(QueryTimeoutError):
+        ps.run_pattern("ask", URI="urn:slow", timeout=0.05)
+    assert time.monotonic() - start < 0.5
+
+    # a deadline that has already passed does not send the query
+    calls = endpoint.calls
+    with pytest.raises(QueryTimeoutError):
+        ps.get_pattern("ask").filter(URI="urn:fast", deadline=time.monotonic())
+    assert endpoint.calls == calls
+
+
+def test_accepts_timeout_is_cached():
+    class Client:
+        def sparql(self, query, timeout=None):
+            return ASK_TRUE
+
+    with patch("inspect.signature", wraps=inspect.signature) as signature:
+        # for a bound method, whatever the instance
+        assert all(accepts_timeout(Client().sparql) for _ in range(3))
+        assert not accepts_timeout(lambda query: ASK_TRUE)
+    assert signature.call_count == 2
+
+
+def test_timeout_without_client_support(patternset):
+    def slow(query):
+        time.sleep(0.2)
+        return ASK_TRUE
+
+    ps = patternset(slow)
+    # the client cannot be interrupted, but its late response is not used
+    start = time.monotonic()
+    with pytest.raises(QueryTimeoutError):
+        ps.run_pattern("ask", URI="urn:a", timeout=0.05)
+    assert time.monotonic() - start >= 0.2
+    assert ps.run_pattern("ask", URI="urn:a", timeout=5) is True
+
+
+def test_time_limit_nesting(patternset):
+    endpoint = StandInEndpoint()
+    ps = patternset(endpoint)
+    with time_limit(1):
+        outer = current_deadline.get()
+        # a longer inner timeout does not extend the outer deadline
+        with time_limit(60):
+            assert current_deadline.get() == outer
+            ps.run_pattern("ask", URI="urn:fast")
+        assert endpoint.timeouts[-1] <= 1
+    assert current_deadline.get() is None
+
+
+def test_run_many_partial_results(patternset):
+    endpoint = StandInEndpoint()
+    ps = patternset(endpoint)
+    calls = [("ask", {"URI": "urn:fast"}), ("ask", {"URI": "urn:slow"})] * 4
+
+    start = time.monotonic()
+    results = ps.run_many(calls, max_workers=4, timeout=0.1)
+    assert time.monotonic() - start < 0.5
+    assert results[0::2] == [True] * 4
+    assert all(isinstance(r, QueryTimeoutError) for r in results[1::2])
+
+
+def test_queued_queries_time_out(patternset):
+    endpoint = StandInEndpoint(slow_delay=0.3)
+    scheduler = QueryScheduler(max_concurrency=1)
+    limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+    breaker = CircuitBreaker(failure_threshold=100)
+    ps = patternset(
+        endpoint, scheduler=scheduler, limiter=limiter, circuit_breaker=breaker
+    )
+
+    calls = [("ask", {"URI": f"urn:slow{n}"}) for n in range(5)]
+    results = ps.run_many(calls, max_workers=5, timeout=0.1)
+    assert all(isinstance(r, QueryTimeoutError) for r in results)
+    # only one query was sent, the others gave up waiting for a slot
+    time.sleep(0.2)
+    assert endpoint.calls == 1
+    assert scheduler.stats()["in_flight"] == 0
+    assert limiter.stats()["in_flight"] == limiter.stats()["waiting"] == 0
+
+
+def test_filter_many_partial(patternset):
+    endpoint = StandInEndpoint()
+    ps = patternset(endpoint)
+    pattern = ps.get_pattern("ask")
+
+    uris = ["urn:a", "urn:b", "urn:slow", "urn:c"]
+    with pytest.raises(QueryTimeoutError) as e:
+        pattern.filter_many(uris, batch_size=1, timeout=0.1)
+    assert list(e.value.partial) == ["urn:a", "urn:b"]
+
+
+def test_async_timeouts(patternset):
+    async def _client(query, timeout=None):
+        await asyncio.sleep(1 if "slow" in query else 0)
+        return ASK_TRUE
+
+    ps = patternset(_client)
+    calls = [("ask", {"URI": "urn:fast"}), ("ask", {"URI": "urn:slow"})] * 3
+
+    async def _run():
+        with pytest.raises(QueryTimeoutError):
+            await ps.arun_pattern("ask", URI="urn:slow", timeout=0.05)
+
+        results = await ps.agather_patterns(calls, timeout=0.1, return_exceptions=True)
+        assert results[0::2] == [True] * 3
+        assert all(isinstance(r, QueryTimeoutError) for r in results[1::2])
+
+        with pytest.raises(QueryTimeoutError) as e:
+            await ps.agather_patterns(calls, deadline=time.monotonic() + 0.1)
+        assert e.value.partial == [True, None] * 3
+
+    start = time.monotonic()
+    asyncio.run(_run())
+    assert time.monotonic() - start < 0.8
+
+
+def test_async_queued_queries_time_out(patternset):
+    async def _client(query):
+        await asyncio.sleep(0.3)
+        return ASK_TRUE
+
+    scheduler = QueryScheduler(max_concurrency=1)
+    ps = patternset(_client, scheduler=scheduler)
+
+    async def _run():
+        return await ps.agather_patterns(
+            [("ask", {"URI": f"urn:{n}"}) for n in range(4)],
+            timeout=0.1,
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(_run())
+    assert all(isinstance(r, QueryTimeoutError) for r in results)
+    assert scheduler.stats()["in_flight"] == 0
+    assert scheduler.stats()["classes"]["interactive"]["waiting"] == 0
+
+
+def test_pool_timeout(patternset):
+    replicas = [StandInEndpoint(), StandInEndpoint()]
+    with EndpointPool(replicas, seed=1) as pool:
+        ps = patternset(pool)
+        start = time.monotonic()
+        with pytest.raises(QueryTimeoutError):
+            ps.run_pattern("ask", URI="urn:slow", timeout=0.1)
+        # the failover did not start a second full timeout
+        assert time.monotonic() - start < 0.3
+        assert ps.run_pattern("ask", URI="urn:fast", timeout=1) is True
+
+
+if __name__ == "__main__":
+    pytest.main()
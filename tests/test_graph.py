@@ -0,0 +1,172 @@
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import PatternSet, ResultCache, SPARQLPatternsError
+from gettysparqlpatterns.framing import CompiledFrame
+from gettysparqlpatterns.graph import RDF_TYPE, Graph
+
+DC = "http://purl.org/dc/elements/1.1/"
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+
+NTRIPLES = f"""# a comment
+<urn:rec1> <{DC}title> "A \\"quoted\\" title\\u00e9"@EN .
+<urn:rec1> <{DC}identifier> "id1" .
+<urn:rec1> <{DC}subject> <urn:subj> .
+<urn:rec1> <{DC}date> "2001"^^<http://www.w3.org/2001/XMLSchema#gYear> .
+<urn:rec1> <{DC}subject> <urn:subj> .
+<urn:subj> <{RDFS}label> "Subject" .
+_:b1 <{DC}identifier> "id2" .
+"""
+
+FRAME = {
+    "@context": {"dc": DC, "rdfs": RDFS, "xsd": "http://www.w3.org/2001/XMLSchema#"},
+    "dc:identifier": {},
+}
+
+
+def test_parse_ntriples():
+    graph = Graph.from_response(NTRIPLES)
+    assert len(graph) == 6  # the repeated triple is only stored once
+    assert (
+        ("uri", "urn:rec1"),
+        ("uri", DC + "title"),
+        ("literal", 'A "quoted" titleé', None, "en"),
+    ) in graph
+    assert (
+        ("bnode", "b1"),
+        ("uri", DC + "identifier"),
+        ("literal", "id2", None, None),
+    ) in graph
+    # terms are stored once, and triples refer to them by id
+    assert len(graph.terms) == len(set(graph.terms))
+
+    with pytest.raises(SPARQLPatternsError):
+        Graph.from_response("@prefix dc: <http://purl.org/dc/elements/1.1/> .")
+
+
+def test_parse_jsonld():
+    doc = {
+        "@context": {
+            "dc": DC,
+            "subject": {"@id": "dc:subject", "@type": "@id"},
+        },
+        "@graph": [
+            {
+                "@id": "urn:rec1",
+                "@type": "dc:Record",
+                "dc:title": {"@value": "T", "@language": "en"},
+                "subject": "urn:subj",
+                "dc:extent": 3,
+                "dc:relation": {"@id": "urn:rel", "dc:title": "Related"},
+                "undefined_term": "dropped",
+            }
+        ],
+    }
+    graph = Graph.from_response(doc)
+    assert set(graph) == {
+        (("uri", "urn:rec1"), ("uri", RDF_TYPE), ("uri", DC + "Record")),
+        (("uri", "urn:rec1"), ("uri", DC + "title"), ("literal", "T", None, "en")),
+        (("uri", "urn:rec1"), ("uri", DC + "subject"), ("uri", "urn:subj")),
+        (
+            ("uri", "urn:rec1"),
+            ("uri", DC + "extent"),
+            ("literal", "3", "http://www.w3.org/2001/XMLSchema#integer", None),
+        ),
+        (("uri", "urn:rec1"), ("uri", DC + "relation"), ("uri", "urn:rel")),
+        (("uri", "urn:rel"), ("uri", DC + "title"), ("literal", "Related", None, None)),
+    }
+    # and as text
+    assert len(Graph.from_response('[{"@id": "urn:a", "urn:p": "b"}]')) == 1
+
+
+def test_frame():
+    frame = CompiledFrame(FRAME)
+    graph = Graph.from_response(NTRIPLES)
+    docs = list(frame.iter_documents(graph))
+    assert docs[0] == {
+        "@context": FRAME["@context"],
+        "@id": "urn:rec1",
+        "dc:title": {"@value": 'A "quoted" titleé', "@language": "en"},
+        "dc:identifier": "id1",
+        "dc:subject": {"@id": "urn:subj", "rdfs:label": "Subject"},
+        "dc:date": {"@value": "2001", "@type": "xsd:gYear"},
+    }
+    assert docs[1]["@id"] == "_:b1"
+    assert frame.frame(graph)["@graph"][1] == {"@id": "_:b1", "dc:identifier": "id2"}
+
+    # one match is framed as the node itself
+    explicit = CompiledFrame(
+        {
+            **FRAME,
+            "@id": "urn:rec1",
+            "@explicit": True,
+            "dc:subject": {"@embed": "@never"},
+            "dc:creator": {"@default": "unknown"},
+        }
+    )
+    assert explicit.frame(graph) == {
+        "@context": FRAME["@context"],
+        "@id": "urn:rec1",
+        "dc:identifier": "id1",
+        "dc:subject": {"@id": "urn:subj"},
+        "dc:creator": "unknown",
+    }
+
+    # property absence, and @type matching
+    assert list(CompiledFrame({"urn:p": []}).iter_nodes(graph)) != []
+    assert list(CompiledFrame({"@type": DC + "Record"}).iter_nodes(graph)) == []
+
+
+def _construct_set(client):
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    ps.add_pattern(
+        name="dc",
+        sparql_pattern="CONSTRUCT { <$URI> ?p ?o } WHERE { <$URI> ?p ?o }",
+        stype="construct",
+        framing=FRAME,
+    )
+    return ps
+
+
+def test_run_pattern_framed():
+    client = Mock(return_value=NTRIPLES)
+    ps = _construct_set(client)
+    ps.set_cache(ResultCache())
+
+    assert ps.run_pattern("dc", URI="urn:rec1") == NTRIPLES
+    doc = ps.run_pattern_framed("dc", URI="urn:rec1")
+    assert doc["@graph"][0]["dc:identifier"] == "id1"
+    # the parsed graph is cached separately from the verbatim response
+    assert ps.run_pattern_framed("dc", URI="urn:rec1") == doc
+    assert ps.run_pattern("dc", URI="urn:rec1") == NTRIPLES
+    assert client.call_count == 2
+
+    pattern = ps.get_pattern("dc")
+    assert pattern.compiled_frame is pattern.compiled_frame
+    pattern.framing = None
+    assert "@context" not in pattern.run_framed(URI="urn:rec1")["@graph"][0]
+
+    ps.add_pattern(name="s", sparql_pattern="SELECT * {}", stype="select")
+    with pytest.raises(NotImplementedError):
+        ps.run_pattern_framed("s")
+
+
+def test_iter_framed():
+    def _client(query):
+        uri = query.split("<")[1].split(">")[0]
+        return f'<{uri}> <{DC}identifier> "{uri[4:]}" .'
+
+    ps = _construct_set(_client)
+    uris = [f"urn:{n}" for n in range(50)]
+    docs = ps.iter_framed("dc", ({"URI": uri} for uri in uris), max_workers=4)
+    assert [doc["dc:identifier"] for doc in docs] == [str(n) for n in range(50)]
+
+    # stopping early does not run the remaining queries
+    docs = ps.iter_framed("dc", ({"URI": uri} for uri in uris), max_workers=2)
+    assert next(docs)["@id"] == "urn:0"
+    docs.close()
+
+
+if __name__ == "__main__":
+    pytest.main()
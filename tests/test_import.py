@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+import gettysparqlpatterns
+
+
+def test_import_is_lazy():
+    snippet = """
+import json, sys
+import gettysparqlpatterns
+from gettysparqlpatterns import SPARQLRegistry
+print(json.dumps({
+    "modules": [m for m in ("requests", "asyncio", "importlib.metadata") if m in sys.modules],
+    "loaded": list(SPARQLRegistry._registry),
+    "names": SPARQLRegistry.list_pattern_names(),
+}))
+"""
+    out = subprocess.run(
+        [sys.executable, "-c", snippet], check=True, capture_output=True, text=True
+    )
+    result = json.loads(out.stdout)
+    assert result["modules"] == []
+    assert result["loaded"] == []
+    assert result["names"] == ["archival"]
+
+
+def test_version():
+    assert gettysparqlpatterns.__version__
+    assert "__version__" in gettysparqlpatterns.__all__
@@ -0,0 +1,161 @@
+import asyncio
+import time
+
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import (
+    EndpointPool,
+    PatternMetrics,
+    QueryEvent,
+    ResultCache,
+    SPARQLRegistry,
+)
+from gettysparqlpatterns.instrumentation import note_response_bytes
+
+SELECT_RESPONSE = {
+    "head": {"vars": ["s"]},
+    "results": {
+        "bindings": [
+            {"s": {"type": "uri", "value": "urn:a"}},
+            {"s": {"type": "uri", "value": "urn:b"}},
+        ]
+    },
+}
+
+
+def test_hooks_receive_events(patternset):
+    ps = patternset(Mock(return_value=SELECT_RESPONSE))
+    pre, post = [], []
+    ps.add_hook(pre=pre.append, post=post.append)
+
+    ps.run_pattern("things", TYPE="urn:t")
+    assert len(pre) == len(post) == 1
+    event = post[0]
+    assert pre[0] is event
+    assert isinstance(event, QueryEvent)
+    assert (event.pattern, event.stype, event.rows) == ("things", "select", 2)
+    assert len(event.query_hash) == 16
+    assert event.render_time >= 0 and event.endpoint_time >= 0
+    assert event.parse_time >= 0
+    assert event.error is None and not event.cached
+
+    # the same query (modulo whitespace) hashes the same
+    ps.run_pattern("things", TYPE="urn:t")
+    assert post[1].query_hash == event.query_hash
+
+    ps.remove_hook(pre.append)
+    ps.remove_hook(post.append)
+    ps.run_pattern("things", TYPE="urn:t")
+    assert len(post) == 2
+
+
+def test_hooks_see_errors_and_cache_hits(patternset):
+    client = Mock(side_effect=[RuntimeError("down"), {"head": {}, "boolean": True}])
+    ps = patternset(client)
+    ps.set_cache(ResultCache())
+    events = []
+    ps.add_hook(post=events.append)
+
+    with pytest.raises(RuntimeError):
+        ps.get_pattern("ask").filter(URI="urn:a")
+    assert isinstance(events[0].error, RuntimeError)
+
+    assert ps.get_pattern("ask").filter(URI="urn:a") is True
+    assert ps.get_pattern("ask").filter(URI="urn:a") is True
+    assert [e.cached for e in events] == [False, False, True]
+    assert events[1].rows == 1
+
+
+def test_registry_hooks_and_async(patternset):
+    async def client(query):
+        return SELECT_RESPONSE
+
+    ps = patternset(client)
+    events = []
+    SPARQLRegistry.add_hook(post=events.append)
+    try:
+        asyncio.run(ps.arun_pattern("things", TYPE="urn:t"))
+    finally:
+        SPARQLRegistry.remove_hook(events.append)
+    assert [e.pattern for e in events] == ["things"]
+    assert events[0].endpoint_time is not None
+
+    asyncio.run(ps.arun_pattern("things", TYPE="urn:t"))
+    assert len(events) == 1
+
+
+def _reporting(size, delay=0.0):
+    def client(query):
+        time.sleep(delay)
+        note_response_bytes(size)
+        return SELECT_RESPONSE
+
+    return client
+
+
+def test_response_bytes_from_other_threads(patternset):
+    ps = patternset(_reporting(123))
+    events = []
+    ps.add_hook(post=events.append)
+
+    # a blocking client is run in a thread by the async methods
+    asyncio.run(ps.arun_pattern("things", TYPE="urn:t"))
+    assert events[-1].response_bytes == 123
+
+    # the size comes from whichever replica answered a hedged query
+    with EndpointPool(
+        [_reporting(111, delay=0.2), _reporting(222)], hedge=True, hedge_delay=0.01
+    ) as pool:
+        assert len(ps.run_pattern("things", pool, TYPE="urn:t")) == 2
+        assert events[-1].response_bytes == 222
+        time.sleep(0.25)
+
+    # and does not leak into a later query, to a client that does not report one
+    ps.run_pattern("things", Mock(return_value=SELECT_RESPONSE), TYPE="urn:u")
+    assert events[-1].response_bytes is None
+
+
+def test_broken_hook_does_not_break_query(patternset):
+    ps = patternset(Mock(return_value=SELECT_RESPONSE))
+    ps.add_hook(pre=Mock(side_effect=ValueError("bad hook")))
+    assert len(ps.run_pattern("things", TYPE="urn:t")) == 2
+
+
+def test_pattern_metrics():
+    metrics = PatternMetrics(buckets=(0.1, 1))
+    for pattern, latency, error in [
+        ("a", 0.05, None),
+        ("a", 0.5, None),
+        ("a", 5, RuntimeError()),
+        ("b", 0.05, None),
+    ]:
+        event = QueryEvent(pattern, "select", "urn:endpoint", "0" * 16, 0)
+        event.endpoint_time = latency
+        event.rows = 3
+        event.response_bytes = 100
+        event.error = error
+        metrics(event)
+
+    stats = metrics.snapshot()[("a", "select")]
+    assert stats["count"] == 3 and stats["errors"] == 1
+    assert stats["rows"] == 9 and stats["response_bytes"] == 300
+    assert list(stats["buckets"].values()) == [1, 1, 1]
+
+    text = metrics.prometheus_text()
+    assert "# TYPE gettysparqlpatterns_query_duration_seconds histogram" in text
+    assert (
+        'gettysparqlpatterns_query_duration_seconds_bucket{pattern="a",stype="select",le="1.0"} 2'
+        in text
+    )
+    assert (
+        'gettysparqlpatterns_query_duration_seconds_bucket{pattern="a",stype="select",le="+Inf"} 3'
+        in text
+    )
+    assert 'gettysparqlpatterns_errors_total{pattern="a",stype="select"} 1' in text
+    assert 'gettysparqlpatterns_queries_total{pattern="b",stype="select"} 1' in text
+
+
+if __name__ == "__main__":
+    pytest.main()
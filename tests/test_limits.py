@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+from conftest import ASK_TRUE, StandInEndpoint
+
+
+def test_limiter_bounds_concurrency(patternset):
+    endpoint = StandInEndpoint(latency=0.002, capacity=100)
+    ps = patternset(endpoint, limiter=AdaptiveLimiter(initial_limit=3, max_limit=3))
+    calls = [("ask", {"URI": f"urn:{n}"}) for n in range(60)]
+    assert ps.run_many(calls, max_workers=20) == [True] * 60
+    assert endpoint.max_in_flight <= 3
+    assert ps.limiter.stats()["in_flight"] == 0
+
+
+def test_limiter_settles_at_capacity(patternset):
+    endpoint = StandInEndpoint(latency=0.002, capacity=4)
+    limiter = AdaptiveLimiter(initial_limit=16)
+    ps = patternset(endpoint)
+    ps.set_limiter(limiter)
+    calls = [("ask", {"URI": f"urn:{n}"}) for n in range(400)]
+    ps.run_many(calls, max_workers=32)
+    assert limiter.decreases > 0
+    assert limiter.limit < 16
+
+
+def test_limiter_aimd():
+    limiter = AdaptiveLimiter(initial_limit=4, backoff=0.5)
+    for _ in range(4):
+        limiter.acquire()
+    limiter.release(0.01)
+    assert limiter.limit == 4.25  # additive increase, while in use
+    limiter.release(0.01, failed=True)
+    assert limiter.limit == 2.125  # multiplicative decrease
+    limiter.release(0.01, failed=True)
+    assert limiter.limit == 2.125  # not again within the baseline latency
+    limiter.release(0.01)
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_async_limiter(patternset):
+    endpoint = StandInEndpoint(latency=0.002, capacity=100)
+    ps = patternset(endpoint, limiter=AdaptiveLimiter(initial_limit=2, max_limit=2))
+    calls = [("ask", {"URI": f"urn:{n}"}) for n in range(20)]
+    assert asyncio.run(ps.agather_patterns(calls, max_concurrency=10)) == [True] * 20
+    assert endpoint.max_in_flight <= 2
+
+
+def test_limiter_ignores_cancelled_and_query_errors(patternset):
+    limiter = AdaptiveLimiter(initial_limit=4)
+    limiter.acquire()
+    limiter.release(0.05)
+
+    async def _client(query):
+        await asyncio.sleep(1)
+
+    async def _cancelled():
+        task = asyncio.ensure_future(ps.arun_pattern("ask", _client, URI="urn:a"))
+        await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    error = Exception("Bad query")
+    error.response = Mock(status_code=400)
+    ps = patternset(Mock(side_effect=error), limiter=limiter)
+    asyncio.run(_cancelled())
+    with pytest.raises(Exception):
+        ps.run_pattern("ask", URI="urn:a")
+
+    # neither the quick cancellation nor the 4xx response lowered the baseline
+    stats = limiter.stats()
+    assert stats["baseline"] == 0.05
+    assert stats["decreases"] == 0 and stats["in_flight"] == 0
+
+
+def test_circuit_breaker(patternset):
+    client = Mock(side_effect=ConnectionError("down"))
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    ps = patternset(client, circuit_breaker=breaker)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            ps.run_pattern("ask", URI="urn:a")
+    assert breaker.state == "open"
+
+    # fails fast, without sending the query
+    with pytest.raises(CircuitOpenError):
+        ps.run_pattern("ask", URI="urn:a")
+    assert client.call_count == 3
+
+    # once reset_timeout has passed, a trial query is let through
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        ps.run_pattern("ask", URI="urn:a")
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    client.side_effect = None
+    client.return_value = ASK_TRUE
+    assert ps.run_pattern("ask", URI="urn:a") is True
+    assert breaker.state == "closed"
+
+
+def test_circuit_breaker_ignores_query_errors(patternset):
+    error = Exception("Bad query")
+    error.response = Mock(status_code=400)
+    breaker = CircuitBreaker(failure_threshold=1)
+    ps = patternset(Mock(side_effect=error), circuit_breaker=breaker)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            ps.run_pattern("ask", URI="urn:a")
+    assert breaker.state == "closed"
+
+
+if __name__ == "__main__":
+    pytest.main()
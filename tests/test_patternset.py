@@ -1,6 +1,11 @@
-from gettysparqlpatterns import PatternSet, NoPatternsFoundError
+from gettysparqlpatterns import PatternSet, NoPatternsFoundError, NoSuchPatternError
 from gettysparqlpatterns.registry import BasePattern
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+import io
+import json
+import re
+import threading
 import pytest
 
 
@@ -156,6 +161,308 @@ def test_run_pattern():
     assert result == []
     mock_method.assert_called_once_with("SELECT * WHERE {}")
 
+    with pytest.raises(NoSuchPatternError):
+        ps.run_pattern("UnknownPattern")
+
+
+def test_run_many():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def client(query):
+        # All three queries have to be in flight at once to pass the barrier
+        barrier.wait()
+        if "fail" in query:
+            raise RuntimeError(query)
+        return {"head": {}, "boolean": "yes" in query}
+
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    ps.add_pattern(name="ask", sparql_pattern="ASK { <$URI> }", stype="ask")
+
+    results = ps.run_many(
+        [
+            ("ask", {"URI": "urn:yes"}),
+            ("ask", {"URI": "urn:fail"}),
+            ("ask", {"URI": "urn:no"}),
+            ("missing", {}),
+        ],
+        max_workers=3,
+    )
+    assert results[0] is True
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] is False
+    assert isinstance(results[3], NoSuchPatternError)
+
+    assert ps.run_many([]) == []
+
+
+def test_iter_pattern():
+    response = {
+        "head": {"vars": ["s"]},
+        "results": {
+            "bindings": [{"s": {"type": "uri", "value": f"urn:{n}"}} for n in range(3)]
+        },
+    }
+    ps = PatternSet(name="TestSet")
+    ps.add_pattern(name="select", sparql_pattern="SELECT ?s WHERE {}", stype="select")
+    ps.add_pattern(name="ask", sparql_pattern="ASK {}", stype="ask")
+
+    # a client that returns the response body as a stream
+    stream = io.BytesIO(json.dumps(response).encode("utf-8"))
+    rows = ps.iter_pattern("select", lambda q: stream, chunk_size=4)
+    assert next(rows) == {"s": "urn:0"}
+    assert [row["s"] for row in rows] == ["urn:1", "urn:2"]
+    assert stream.closed
+
+    # a client that returns the decoded response
+    rows = ps.iter_pattern("select", Mock(return_value=response))
+    assert [row["s"] for row in rows] == ["urn:0", "urn:1", "urn:2"]
+
+    with pytest.raises(NotImplementedError):
+        ps.iter_pattern("ask", Mock())
+
+
+def _rows_response(values):
+    return {
+        "head": {"vars": ["s"]},
+        "results": {"bindings": [{"s": {"type": "uri", "value": v}} for v in values]},
+    }
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_pages(prefetch):
+    data = [f"urn:{n}" for n in range(7)]
+    queries = []
+
+    def client(query):
+        queries.append(query)
+        limit, offset = re.search(r"LIMIT (\d+) OFFSET (\d+)$", query).groups()
+        return _rows_response(data[int(offset) : int(offset) + int(limit)])
+
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    ps.add_pattern(
+        name="select",
+        sparql_pattern="SELECT ?s WHERE { ?s ?p ?o } limit $LIMIT",
+        stype="select",
+        default_values={"LIMIT": "100"},
+    )
+    pages = list(
+        ps.iter_pages("select", page_size=3, order_by=["s"], prefetch=prefetch)
+    )
+    assert [[row["s"] for row in page] for page in pages] == [
+        data[0:3],
+        data[3:6],
+        data[6:7],
+    ]
+    assert len(queries) == 3
+    assert queries[1] == "SELECT ?s WHERE { ?s ?p ?o }\nORDER BY ?s\nLIMIT 3 OFFSET 3"
+
+    # an exact multiple of the page size ends with an empty page
+    data = data[:6]
+    pages = list(ps.iter_pages("select", page_size=3, prefetch=prefetch))
+    assert [len(page) for page in pages] == [3, 3, 0]
+
+    ps.add_pattern(name="ask", sparql_pattern="ASK {}", stype="ask")
+    with pytest.raises(NotImplementedError):
+        ps.iter_pages("ask")
+
+
+def test_arun_pattern():
+    ps = PatternSet(name="TestSet")
+    mock_method = AsyncMock(
+        return_value={"head": {"vars": []}, "results": {"bindings": []}}
+    )
+    ps.set_sparql_client_method(mock_method)
+    ps.add_pattern(
+        name="TestPattern", sparql_pattern="SELECT * WHERE {}", stype="select"
+    )
+    result = asyncio.run(ps.arun_pattern("TestPattern"))
+    assert result == []
+    mock_method.assert_awaited_once_with("SELECT * WHERE {}")
+
+    with pytest.raises(NoSuchPatternError):
+        asyncio.run(ps.arun_pattern("UnknownPattern"))
+
+
+def test_agather_patterns():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def client(query):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if "fail" in query:
+            raise RuntimeError(query)
+        return {"head": {}, "boolean": "yes" in query}
+
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    ps.add_pattern(name="ask", sparql_pattern="ASK { <$URI> }", stype="ask")
+
+    calls = [("ask", {"URI": f"urn:{n}:{'yes' if n % 2 else 'no'}"}) for n in range(10)]
+    results = asyncio.run(ps.agather_patterns(calls, max_concurrency=3))
+    assert results == [bool(n % 2) for n in range(10)]
+    assert max_in_flight == 3
+
+    calls.append(("ask", {"URI": "urn:fail"}))
+    results = asyncio.run(ps.agather_patterns(calls, return_exceptions=True))
+    assert isinstance(results[-1], RuntimeError)
+    with pytest.raises(RuntimeError):
+        asyncio.run(ps.agather_patterns(calls))
+
+
+def _count_binding(count):
+    return {
+        "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+        "type": "literal",
+        "value": str(count),
+    }
+
+
+def test_run_counts():
+    ps = PatternSet(from_builtin="la_counts.json")
+    queries = []
+
+    def client(query):
+        queries.append(query)
+        if "SERVICE" in query:
+            return {
+                "head": {"vars": ["count"]},
+                "results": {"bindings": [{"count": _count_binding(7)}]},
+            }
+        variables = re.findall(r"AS \?(count_\d+)", query)
+        return {
+            "head": {"vars": variables},
+            "results": {
+                "bindings": [
+                    {var: _count_binding(i) for i, var in enumerate(variables)}
+                ]
+            },
+        }
+
+    counts = ps.run_counts(sparql_client_method=client, VISITEM_SERVICE="urn:service")
+    assert counts == {
+        "count_informationobjects": 0,
+        "count_groups": 1,
+        "count_persons": 2,
+        "count_hmos": 3,
+        "count_visualitems": 4,
+        "count_hmos_with_nonexistant_visitems": 7,
+        "count_hmos_with_existing_visitems": 7,
+    }
+    # the five plain counts are merged, the two using SERVICE are run separately
+    assert len(queries) == 3
+    merged = [q for q in queries if "SERVICE" not in q][0]
+    assert merged.count("PREFIX crm:") == 1
+    assert merged.count("{ SELECT (count(distinct ?inf) AS ?count_") == 5
+
+    queries.clear()
+    counts = ps.run_counts(
+        ["count_groups", "count_persons"], sparql_client_method=client
+    )
+    assert counts == {"count_groups": 0, "count_persons": 1}
+    assert len(queries) == 1
+
+    # the merged query is reported to the hooks under the names it was merged from
+    events = []
+    ps.add_hook(post=events.append)
+    ps.run_counts(["count_groups", "count_persons"], sparql_client_method=client)
+    assert [(e.pattern, e.stype, e.rows) for e in events] == [
+        ("merged:count_groups,count_persons", "count", 2)
+    ]
+
+
+def test_run_counts_conflicting_prefixes():
+    client = Mock(
+        return_value={
+            "head": {"vars": ["count"]},
+            "results": {"bindings": [{"count": _count_binding(2)}]},
+        }
+    )
+    ps = PatternSet(name="TestSet", sparql_client_method=client)
+    for name, iri in [("a", "urn:x:"), ("b", "urn:y:")]:
+        ps.add_pattern(
+            name=name,
+            sparql_pattern=f"PREFIX x: <{iri}> SELECT (count(?s) as ?count) WHERE {{ ?s a x:T }}",
+            stype="count",
+        )
+    assert ps.run_counts() == {"a": 2, "b": 2}
+    assert client.call_count == 2
+
+
+def test_evaluate_filters():
+    ps = PatternSet(from_builtin="linked_art_filters.json")
+    ps.add_pattern(
+        name="hmo_has_component",
+        sparql_pattern="ASK { <$URI> <urn:has_component> ?c }",
+        stype="ask",
+        ask_filter=True,
+        applies_to=["HumanMadeObject"],
+    )
+    ps.add_pattern(
+        name="hmo_in_remote_set",
+        sparql_pattern="ASK { SERVICE <urn:remote> { <$URI> a <urn:Set> } }",
+        stype="ask",
+        ask_filter=True,
+        applies_to=["HumanMadeObject"],
+    )
+    queries = []
+
+    def client(query):
+        queries.append(query)
+        if "EXISTS {" not in query:
+            return {"head": {}, "boolean": False}
+        variables = re.findall(r"AS \?(ask_\d+)", query)
+        boolean = {
+            "type": "literal",
+            "datatype": "http://www.w3.org/2001/XMLSchema#boolean",
+            "value": "false",
+        }
+        return {
+            "head": {"vars": variables},
+            "results": {
+                "bindings": [
+                    {
+                        var: {**boolean, "value": "true"} if i == 0 else boolean
+                        for i, var in enumerate(variables)
+                    }
+                ]
+            },
+        }
+
+    results = ps.evaluate_filters(
+        "urn:hmo", "HumanMadeObject", sparql_client_method=client
+    )
+    # hmo_not_ready is true, but its ask_filter is False
+    assert results == {
+        "hmo_not_ready": False,
+        "hmo_has_component": False,
+        "hmo_in_remote_set": False,
+    }
+    assert len(queries) == 2
+    merged = [q for q in queries if "SERVICE" not in q][0]
+    assert "<urn:hmo> crm:P46i_forms_part_of ?inf" in merged
+    assert merged.count("EXISTS {") == 2
+
+    # the merged query is reported to the hooks under the names it was merged from,
+    # and the one run separately under its own
+    events = []
+    ps.add_hook(post=events.append)
+    ps.evaluate_filters("urn:hmo", "HumanMadeObject", sparql_client_method=client)
+    assert sorted((e.pattern, e.stype) for e in events) == [
+        ("hmo_in_remote_set", "ask"),
+        ("merged:hmo_not_ready,hmo_has_component", "ask"),
+    ]
+    ps.remove_hook(events.append)
+
+    # a single applicable filter is run as a plain ASK
+    queries.clear()
+    assert ps.evaluate_filters(
+        "urn:inf", "InformationObject", sparql_client_method=client
+    ) == {"inf_not_ready": True}
+    assert ps.evaluate_filters("urn:x", "Unknown", sparql_client_method=client) == {}
+
 
 @pytest.fixture
 def pattern_set():
@@ -218,7 +525,10 @@ def test_import_patterns_from_url(pattern_set):
             "default_values": None,
         },
     ]
-    with patch("requests.get", return_value=mock_response):
+    with patch(
+        "gettysparqlpatterns.client.HTTPSPARQLClient.get_json",
+        return_value=mock_response.json.return_value,
+    ):
         pattern_set.import_patterns_from_url("http://example.com/patterns")
 
     # default is overwriting
@@ -247,7 +557,10 @@ def test_import_patterns_from_url_add_to_existing(pattern_set):
             "default_values": None,
         },
     ]
-    with patch("requests.get", return_value=mock_response):
+    with patch(
+        "gettysparqlpatterns.client.HTTPSPARQLClient.get_json",
+        return_value=mock_response.json.return_value,
+    ):
         pattern_set.import_patterns_from_url(
             "http://example.com/patterns", add_to_existing=True
         )
@@ -276,6 +589,37 @@ def test_list_patterns_with_filters(pattern_set):
     result = pattern_set.list_patterns(by_type="select", by_applies_to="example")
     assert result == ["pattern2"]
 
+    # Values that cannot be looked up in the indexes match nothing, as before
+    assert pattern_set.list_patterns(by_applies_to=["example"]) == []
+    assert pattern_set.list_patterns(by_type="select", by_applies_to=["x"]) == []
+    assert pattern_set.list_patterns(by_type=["select"]) == []
+    assert pattern_set.browse_patterns(by_applies_to=["example"]) == []
+
+
+def test_indexes_follow_replaced_patterns(pattern_set):
+    pattern_set.add_pattern(
+        name="pattern3", sparql_pattern="ASK {}", stype="ask", applies_to=["other"]
+    )
+    # Replacing a pattern keeps its position
+    pattern_set.add_pattern(
+        name="pattern1", sparql_pattern="ASK { }", stype="ask", applies_to=["example"]
+    )
+    assert [p.name for p in pattern_set] == ["pattern1", "pattern2", "pattern3"]
+    assert pattern_set[0].sparql_pattern.template == "ASK { }"
+    assert pattern_set.list_patterns(by_type="ask") == ["pattern1", "pattern3"]
+
+    # and moves it between the indexes if its stype or applies_to changes
+    pattern_set.import_patterns(
+        [{"name": "pattern1", "sparql_pattern": "SELECT * {}", "stype": "select"}],
+        add_to_existing=True,
+    )
+    assert pattern_set[0].stype == "select"
+    assert pattern_set.list_patterns(by_type="ask") == ["pattern3"]
+    assert pattern_set.list_patterns(by_type="select") == ["pattern1", "pattern2"]
+    assert pattern_set.list_patterns(by_applies_to="example") == ["pattern2"]
+    assert pattern_set.list_patterns(by_applies_to="other") == ["pattern3"]
+    assert pattern_set[-1].name == "pattern3"
+
 
 def test_browse_patterns_with_filters(pattern_set):
     # Test browse_patterns without filters
@@ -327,10 +671,6 @@ sample_json = {
 
 sample_url = "http://getty-example.com/patternset.json"
 
-# Mock response for requests.get
-mock_response = Mock()
-mock_response.json.return_value = sample_json
-
 
 def test_init_from_json():
     pattern_set = PatternSet(from_json=sample_json)
@@ -340,7 +680,7 @@ def test_init_from_json():
     assert "pattern1" in pattern_set._patterns
 
 
-@patch("requests.get", return_value=mock_response)
+@patch("gettysparqlpatterns.client.HTTPSPARQLClient.get_json", return_value=sample_json)
 def test_init_from_url(mock_get):
     pattern_set = PatternSet(from_url=sample_url)
     mock_get.assert_called_once_with(sample_url)
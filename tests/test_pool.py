@@ -0,0 +1,87 @@
+import time
+
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import EndpointPool
+from gettysparqlpatterns.cache import is_anonymous_endpoint
+
+from conftest import ASK_TRUE, StandInEndpoint
+
+
+def test_prefers_faster_replicas():
+    fast = StandInEndpoint("urn:fast", latency=0.001)
+    slow = StandInEndpoint("urn:slow", latency=0.02)
+    pool = EndpointPool([fast, slow], seed=1)
+    assert pool.endpoint == "pool:urn:fast,urn:slow"
+    for _ in range(40):
+        pool("ASK {}")
+    # both are tried, but most queries go to the faster replica
+    assert slow.calls >= 1
+    assert fast.calls > 30
+    stats = pool.stats()
+    assert stats["urn:fast"]["latency"] < stats["urn:slow"]["latency"]
+
+
+def test_pool_of_anonymous_clients():
+    def replica(query):
+        return ASK_TRUE
+
+    pool = EndpointPool([replica, StandInEndpoint("urn:a")])
+    assert is_anonymous_endpoint(pool.endpoint)
+    assert EndpointPool([replica], name="replicas").endpoint == "replicas"
+
+
+def test_ejection_and_failover(patternset):
+    good, bad = StandInEndpoint("urn:good"), StandInEndpoint("urn:bad", fail=True)
+    pool = EndpointPool([good, bad], max_failures=2, ejection_time=60, seed=0)
+    ps = patternset(pool)
+
+    # failures are retried on the other replica, so every query succeeds
+    for _ in range(20):
+        assert ps.run_pattern("ask", URI="urn:a") is True
+    assert bad.calls == 2
+    assert pool.stats()["urn:bad"]["ejected"]
+
+    # with every replica down, the error is raised
+    good.fail = True
+    with pytest.raises(ConnectionError):
+        pool("ASK {}")
+
+
+def test_client_errors_do_not_count_against_replica():
+    error = Exception("Bad query")
+    error.response = Mock(status_code=400)
+    client = Mock(side_effect=error, endpoint="urn:e")
+    pool = EndpointPool([client, StandInEndpoint("urn:other")], seed=3)
+    for _ in range(5):
+        try:
+            pool("NOT SPARQL")
+        except Exception as e:
+            assert e is error
+    assert pool.stats()["urn:e"]["errors"] == 0
+
+
+def test_hedging_cuts_tail_latency():
+    slow = StandInEndpoint("urn:slow", latency=0.5)
+    fast = StandInEndpoint("urn:fast", latency=0.001)
+    pool = EndpointPool([slow, fast], hedge=True, hedge_delay=0.02, seed=0)
+    # make sure the slow replica is picked first
+    pool.replicas[0].latency, pool.replicas[1].latency = 0.001, 0.1
+    start = time.perf_counter()
+    assert pool("ASK {}") == ASK_TRUE
+    assert time.perf_counter() - start < 0.3
+    assert pool.hedged == 1 and pool.hedge_wins == 1
+    pool.close()
+
+
+def test_hedge_delay_from_percentile():
+    pool = EndpointPool([StandInEndpoint("urn:a")], hedge=True, hedge_percentile=0.9)
+    assert pool.current_hedge_delay() is None
+    pool._latencies.extend(i / 100 for i in range(100))
+    assert pool.current_hedge_delay() == 0.9
+
+
+if __name__ == "__main__":
+    pytest.main()
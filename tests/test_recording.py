@@ -0,0 +1,93 @@
+import time
+
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import (
+    NoRecordedResponseError,
+    RecordingClient,
+    ReplayClient,
+)
+from gettysparqlpatterns.recording import ResponseStore
+
+SELECT_RESPONSE = {
+    "head": {"vars": ["s"]},
+    "results": {"bindings": [{"s": {"type": "uri", "value": "urn:a"}}]},
+}
+
+
+def test_record_and_replay(tmp_path, patternset):
+    path = str(tmp_path / "traffic.sqlite")
+    live = Mock(side_effect=[SELECT_RESPONSE, {"head": {}, "boolean": True}])
+    live.endpoint = "https://example.org/sparql"
+
+    recorder = RecordingClient(live, path)
+    assert recorder.endpoint == "https://example.org/sparql"
+    ps = patternset(recorder)
+    recorded = [
+        ps.run_pattern("things", TYPE="urn:t"),
+        ps.run_pattern("ask", URI="urn:a"),
+    ]
+    assert len(recorder.store) == 2
+    recorder.store.close()
+
+    replay = ReplayClient(path)
+    assert replay.endpoint == "https://example.org/sparql"
+    ps.set_sparql_client_method(replay)
+    assert [
+        ps.run_pattern("things", TYPE="urn:t"),
+        ps.run_pattern("ask", URI="urn:a"),
+    ] == recorded
+    assert live.call_count == 2
+
+    with pytest.raises(NoRecordedResponseError):
+        ps.run_pattern("ask", URI="urn:b")
+
+
+def test_replay_ignores_whitespace_and_keeps_text(tmp_path):
+    store = ResponseStore(str(tmp_path / "traffic.sqlite"))
+    store.put(
+        "CONSTRUCT {\n ?s ?p ?o } WHERE { ?s ?p ?o }", "urn:e", "<a> <b> <c> .", 0.1
+    )
+    replay = ReplayClient(store)
+    assert replay("CONSTRUCT { ?s ?p ?o }   WHERE { ?s ?p ?o }") == "<a> <b> <c> ."
+
+    with pytest.raises(TypeError):
+        store.put("SELECT * {}", "urn:e", object(), 0.1)
+
+
+def test_recordings_are_per_endpoint(tmp_path):
+    store = ResponseStore(str(tmp_path / "traffic.sqlite"))
+    store.put("ASK {}", "https://a.example.org/sparql", {"boolean": True}, 0.1)
+    store.put("ASK {}", "https://b.example.org/sparql", {"boolean": False}, 0.1)
+    assert len(store) == 2
+    assert store.get("ASK {}", "https://a.example.org/sparql")[0] == {"boolean": True}
+    assert store.get("ASK {}", "https://b.example.org/sparql")[0] == {"boolean": False}
+    assert store.get("ASK {}", "https://c.example.org/sparql") is None
+
+    replay = ReplayClient(store, endpoint="https://b.example.org/sparql")
+    assert replay.endpoint == "https://b.example.org/sparql"
+    assert replay("ASK {}") == {"boolean": False}
+    with pytest.raises(NoRecordedResponseError):
+        ReplayClient(store, endpoint="https://c.example.org/sparql")("ASK {}")
+
+    # Several endpoints are replayed together
+    assert ReplayClient(store).endpoint.startswith("replay:")
+
+
+def test_replay_speed_and_latency(tmp_path):
+    store = ResponseStore(str(tmp_path / "traffic.sqlite"))
+    store.put("ASK {}", "urn:e", {"head": {}, "boolean": True}, 0.2)
+
+    start = time.perf_counter()
+    ReplayClient(store)("ASK {}")
+    assert time.perf_counter() - start < 0.1
+
+    start = time.perf_counter()
+    ReplayClient(store, speed=4.0, latency=0.02)("ASK {}")
+    assert time.perf_counter() - start >= 0.07
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -29,6 +29,46 @@ def test_load_preset_and_remove():
     assert "archival" in bp
 
 
+def test_register_preset():
+    SPARQLRegistry.register_preset("lazy_counts", "la_counts.json")
+    assert "lazy_counts" in SPARQLRegistry.list_pattern_names()
+    assert "lazy_counts" not in SPARQLRegistry._registry
+
+    ps = SPARQLRegistry.get_patternset("lazy_counts")
+    assert "count_groups" in ps.list_patterns()
+    assert SPARQLRegistry._registry["lazy_counts"] is ps
+    assert SPARQLRegistry.get_patternset("lazy_counts") is ps
+
+    SPARQLRegistry.remove_patternset("lazy_counts")
+    assert "lazy_counts" not in SPARQLRegistry.list_pattern_names()
+
+    # removing one that was never loaded
+    SPARQLRegistry.register_preset("lazy_counts", "la_counts.json")
+    SPARQLRegistry.remove_patternset("lazy_counts")
+    assert "lazy_counts" not in SPARQLRegistry.list_pattern_names()
+    with pytest.raises(NoSuchPatternError):
+        SPARQLRegistry.get_patternset("lazy_counts")
+
+
+def test_preset_loaded_by_another_thread(monkeypatch):
+    class _Racing(dict):
+        # Misses the first lookup, as another thread loads the preset in between
+        raced = False
+
+        def get(self, name, default=None):
+            if not self.raced:
+                self.raced = True
+                SPARQLRegistry._load_preset(name)
+                return default
+            return super().get(name, default)
+
+    monkeypatch.setattr(SPARQLRegistry, "_registry", _Racing(SPARQLRegistry._registry))
+    SPARQLRegistry.register_preset("racing_counts", "la_counts.json")
+    ps = SPARQLRegistry.get_patternset("racing_counts")
+    assert "count_groups" in ps.list_patterns()
+    SPARQLRegistry.remove_patternset("racing_counts")
+
+
 @pytest.fixture
 def pattern_set():
     return PatternSet(name="TestSet")
@@ -0,0 +1,98 @@
+import io
+import json
+from array import array
+from unittest.mock import Mock
+
+import pytest
+
+from gettysparqlpatterns import PatternSet, SPARQLResultTable, SPARQLURI, SPARQLLiteral
+from gettysparqlpatterns.utilities import parsed_sparql_response
+
+XSD_INTEGER = "http://www.w3.org/2001/XMLSchema#integer"
+
+response = {
+    "head": {"vars": ["s", "label", "n", "missing"]},
+    "results": {
+        "bindings": [
+            {
+                "s": {"type": "uri", "value": f"https://example.org/{n}"},
+                "n": {"type": "literal", "datatype": XSD_INTEGER, "value": str(n)},
+                **(
+                    {
+                        "label": {
+                            "type": "literal",
+                            "value": f"label {n}",
+                            "xml:lang": "en",
+                        }
+                    }
+                    if n % 2
+                    else {"b": {"type": "bnode", "value": f"b{n}"}}
+                ),
+            }
+            for n in range(6)
+        ]
+    },
+}
+
+
+def test_from_response():
+    table = SPARQLResultTable.from_response(response)
+    assert len(table) == 6
+    assert table.vars == ["s", "label", "n", "missing", "b"]
+
+    # rows are the same as the standard parsed response
+    assert table.to_list() == parsed_sparql_response(response, "select")
+    assert list(table) == parsed_sparql_response(response, "select")
+    assert isinstance(table[0]["s"], SPARQLURI)
+    assert isinstance(table[1]["label"], SPARQLLiteral)
+    assert table[-1]["n"] == 5
+    assert table[1:3] == parsed_sparql_response(response, "select")[1:3]
+    assert "label" not in table[0]
+    assert table[0]["b"].sparql_type == "bnode"
+
+    with pytest.raises(IndexError):
+        table[6]
+
+    # columns
+    assert isinstance(table["n"], array)
+    assert list(table.column("n")) == list(range(6))
+    assert sum(table["n"]) == 15
+    assert table["label"] == [None, "label 1", None, "label 3", None, "label 5"]
+    assert table["missing"] == [None] * 6
+    assert table.kinds("s")[0] == ("uri", None)
+    assert table.kinds("label")[:2] == [None, ("literal", None)]
+
+
+def test_not_a_select_response():
+    with pytest.raises(ValueError):
+        SPARQLResultTable.from_response({"head": {}, "boolean": True})
+
+
+def test_large_integers_stay_as_a_list():
+    table = SPARQLResultTable.from_bindings(
+        [{"n": {"type": "literal", "datatype": XSD_INTEGER, "value": str(2**70)}}]
+    )
+    assert table["n"] == [2**70]
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip("numpy")
+    table = SPARQLResultTable.from_response(response)
+    assert table.to_numpy("n").dtype == numpy.int64
+    assert table.to_numpy("n").sum() == 15
+
+
+def test_run_pattern_columnar():
+    ps = PatternSet(name="TestSet")
+    ps.add_pattern(name="select", sparql_pattern="SELECT * WHERE {}", stype="select")
+    table = ps.run_pattern_columnar("select", Mock(return_value=response))
+    assert len(table) == 6
+
+    stream = io.BytesIO(json.dumps(response).encode("utf-8"))
+    table = ps.run_pattern_columnar("select", lambda q: stream, chunk_size=16)
+    assert table.to_list() == parsed_sparql_response(response, "select")
+    assert table.vars == ["s", "n", "b", "label"]
+
+
+if __name__ == "__main__":
+    pytest.main()
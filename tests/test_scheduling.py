@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+from unittest.mock import patch
+
+import pytest
+
+from gettysparqlpatterns import QueryScheduler, priority
+
+from conftest import StandInEndpoint
+
+
+def _calls(n, prefix="urn:"):
+    return [("ask", {"URI": f"{prefix}{i}"}) for i in range(n)]
+
+
+def test_weighted_share(patternset):
+    scheduler = QueryScheduler(max_concurrency=2)
+    endpoint = StandInEndpoint(latency=0.002)
+    ps = patternset(endpoint, scheduler=scheduler)
+
+    # a batch job fills the queue first, then interactive queries arrive
+    batch = threading.Thread(
+        target=ps.run_many,
+        args=(_calls(60, "urn:b"),),
+        kwargs={"max_workers": 30, "priority": "batch"},
+    )
+    batch.start()
+    time.sleep(0.02)
+    assert (
+        ps.run_many(_calls(16), max_workers=16, priority="interactive") == [True] * 16
+    )
+    batch.join()
+
+    # while both were waiting, interactive queries got most of the slots
+    last = max(i for i, p in enumerate(endpoint.priorities) if p == "interactive")
+    first = endpoint.priorities.index("interactive")
+    share = endpoint.priorities[first : last + 1]
+    assert share.count("interactive") >= 3 * share.count("batch")
+
+    stats = scheduler.stats()
+    assert stats["in_flight"] == 0
+    assert stats["classes"]["batch"]["served"] == 60
+    assert stats["classes"]["interactive"]["served"] == 16
+
+
+def test_batch_uses_idle_capacity(patternset):
+    scheduler = QueryScheduler(max_concurrency=4)
+    ps = patternset(StandInEndpoint(latency=0.01), scheduler=scheduler)
+    start = time.monotonic()
+    ps.run_many(_calls(16), max_workers=16, priority="batch")
+    # four rounds of four, not sixteen of one
+    assert time.monotonic() - start < 0.1
+
+
+def test_rate_limit(patternset):
+    scheduler = QueryScheduler(
+        {"interactive": {}, "batch": {"weight": 1, "rate": 100, "burst": 5}},
+        max_concurrency=8,
+    )
+    ps = patternset(StandInEndpoint(latency=0.001), scheduler=scheduler)
+    with patch.object(
+        scheduler, "_wake_later", wraps=scheduler._wake_later
+    ) as wake_later:
+        # a class without a rate limit never waits for a refill
+        ps.run_many(_calls(30), max_workers=16, priority="interactive")
+        assert wake_later.call_count == 0
+
+        start = time.monotonic()
+        with priority("batch"):
+            ps.run_many(_calls(15), max_workers=8)
+        # 5 in the burst, then 10 at 100 a second
+        assert time.monotonic() - start >= 0.08
+        assert wake_later.call_count > 0
+    assert scheduler.stats()["classes"]["batch"]["served"] == 15
+    # with nothing left waiting, no refill timer is left behind
+    assert scheduler._timer is None
+
+    with pytest.raises(ValueError):
+        QueryScheduler({"batch": {}})
+
+
+def test_async(patternset):
+    scheduler = QueryScheduler(max_concurrency=2)
+    endpoint = StandInEndpoint(latency=0.002)
+    ps = patternset(endpoint, scheduler=scheduler)
+
+    async def _run():
+        batch = asyncio.ensure_future(
+            ps.agather_patterns(_calls(20, "urn:b"), priority="batch")
+        )
+        await asyncio.sleep(0.01)
+        interactive = await ps.agather_patterns(_calls(4), priority="interactive")
+        return interactive, await batch
+
+    interactive, batch = asyncio.run(_run())
+    assert interactive == [True] * 4 and batch == [True] * 20
+    assert scheduler.stats()["in_flight"] == 0
+    # the interactive queries went ahead of the rest of the batch
+    last = max(i for i, p in enumerate(endpoint.priorities) if p == "interactive")
+    assert last < len(endpoint.priorities) - 4
+
+
+if __name__ == "__main__":
+    pytest.main()
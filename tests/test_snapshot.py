@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from gettysparqlpatterns import PatternSet, NoPatternsFoundError, set_snapshot_dir
+from gettysparqlpatterns import snapshot
+from gettysparqlpatterns.templating import CompiledTemplate
+from gettysparqlpatterns.utilities import load_from_package
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    set_snapshot_dir(tmp_path)
+    yield tmp_path
+    set_snapshot_dir(None)
+
+
+def test_template_state_roundtrip():
+    template = CompiledTemplate("ASK { <$URI> a <${TYPE}> . $$x }")
+    restored = CompiledTemplate.from_state(template.to_state())
+    assert restored.identifiers == ("URI", "TYPE")
+    assert restored.template == template.template
+    values = {"URI": "urn:a", "TYPE": "urn:b"}
+    assert restored.render(values) == template.render(values)
+
+
+def test_patternset_snapshot(tmp_path):
+    ps = PatternSet(name="TestSet", description="Snapshot test")
+    ps.add_pattern(
+        name="typed",
+        sparql_pattern="ASK { <$URI> a <$TYPE> }",
+        stype="ask",
+        default_values={"TYPE": "urn:type"},
+    )
+    path = tmp_path / "testset.snapshot"
+    ps.save_snapshot(path)
+
+    loaded = PatternSet(from_snapshot=path)
+    assert loaded.name == "TestSet"
+    assert loaded.export_patterns() == ps.export_patterns()
+    assert loaded.format_pattern("typed", URI="urn:a") == (
+        "ASK { <urn:a> a <urn:type> }"
+    )
+
+
+def test_bad_snapshot(tmp_path):
+    path = tmp_path / "bad.snapshot"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(NoPatternsFoundError):
+        PatternSet(from_snapshot=path)
+    with pytest.raises(NoPatternsFoundError):
+        PatternSet(from_snapshot=tmp_path / "missing.snapshot")
+
+
+def test_builtin_snapshot(snapshot_dir):
+    ps = PatternSet(from_builtin="archival_patterns.json")
+    path = snapshot_dir / "archival_patterns.json.snapshot"
+    assert path.exists()
+
+    from_snapshot = PatternSet()
+    load_from_package(from_snapshot, "archival_patterns.json")
+    assert from_snapshot.export_patterns() == ps.export_patterns()
+
+
+def test_snapshot_invalidated_by_source(tmp_path):
+    source = tmp_path / "patterns.json"
+    source.write_text("[]")
+    path = tmp_path / "patterns.snapshot"
+    patterns = [{"name": "p", "sparql_pattern": "ASK {}", "stype": "ask"}]
+    snapshot.save_snapshot(path, patterns, snapshot.file_fingerprint(source))
+    assert snapshot.load_snapshot(path, snapshot.file_fingerprint(source))
+
+    source.write_text("[ ]")
+    os.utime(source, ns=(0, 0))
+    assert snapshot.load_snapshot(path, snapshot.file_fingerprint(source)) is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -1,4 +1,9 @@
+import copy
+import gc
+import pickle
+
 from gettysparqlpatterns import SPARQLResponseObj, SPARQLURI, SPARQLLiteral
+from gettysparqlpatterns.utilities import TermInterner, parsed_sparql_response
 
 
 def test_sparql_response_obj():
@@ -37,3 +42,70 @@ def test_sparql_literal():
     literal_no_datatype = SPARQLLiteral("value")
     assert literal_no_datatype.datatype is None
     assert repr(literal_no_datatype) == "SPARQLLiteral(\"'value'\")"
+
+
+def test_plain_terms_have_no_instance_dict():
+    # checked with gc, as looking up __dict__ would create it
+    assert not hasattr(SPARQLURI("http://example.org"), "__dict__")
+    plain = SPARQLLiteral("value")
+    assert gc.get_referents(plain) == [SPARQLLiteral]
+    assert plain.datatype is None
+
+
+def test_term_types():
+    literal = SPARQLLiteral("2012-01-01", "http://www.w3.org/2001/XMLSchema#date")
+    other = SPARQLLiteral("x", "urn:other")
+    assert type(literal) is SPARQLLiteral
+    assert type(other) is SPARQLLiteral
+    assert type(SPARQLLiteral("value")) is SPARQLLiteral
+    assert type(SPARQLResponseObj("b0", "bnode")) is SPARQLResponseObj
+    assert type(SPARQLURI("urn:a")) is SPARQLURI
+    assert other.datatype == "urn:other"
+    assert literal.datatype == "http://www.w3.org/2001/XMLSchema#date"
+
+    # no classes are made for the datatypes in responses
+    rows = parsed_sparql_response(
+        {
+            "head": {"vars": ["v"]},
+            "results": {
+                "bindings": [
+                    {"v": {"type": "literal", "value": "1", "datatype": f"urn:dt{n}"}}
+                    for n in range(100)
+                ]
+            },
+        },
+        "select",
+    )
+    assert {type(row["v"]) for row in rows} == {SPARQLLiteral}
+
+
+def test_pickle_and_copy():
+    for obj in (
+        SPARQLURI("http://example.org"),
+        SPARQLLiteral("value"),
+        SPARQLLiteral("value", "datatype"),
+        SPARQLResponseObj("value", "bnode", "datatype"),
+    ):
+        for clone in (pickle.loads(pickle.dumps(obj)), copy.copy(obj)):
+            assert clone == obj
+            assert type(clone) is type(obj)
+            assert clone.sparql_type == obj.sparql_type
+            assert clone.datatype == obj.datatype
+
+
+def test_term_interner():
+    interner = TermInterner(maxsize=3)
+    assert interner.uri("urn:a") is interner.uri("urn:a")
+    assert interner.literal("a", "dt") is interner.literal("a", "dt")
+    assert interner.literal("a") is not interner.literal("a", "dt")
+    assert interner.other("b0", "bnode").sparql_type == "bnode"
+    assert len(interner) <= 3
+
+
+def test_terms_are_shared_within_a_response():
+    binding = {"type": {"type": "uri", "value": "urn:type"}}
+    rows = parsed_sparql_response(
+        {"head": {"vars": ["type"]}, "results": {"bindings": [binding, binding]}},
+        "select",
+    )
+    assert rows[0]["type"] is rows[1]["type"]
@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+from gettysparqlpatterns import SPARQLURI, SPARQLLiteral
+from gettysparqlpatterns.utilities import parsed_sparql_response, iter_sparql_response
+
+select_response = {
+    "head": {"vars": ["s", "label", "n", "b"], "link": []},
+    "results": {
+        "bindings": [
+            {
+                "s": {"type": "uri", "value": f"https://example.org/{n}"},
+                "label": {"type": "literal", "value": f"Label é {{{n}}}"},
+                "n": {
+                    "type": "literal",
+                    "datatype": "http://www.w3.org/2001/XMLSchema#integer",
+                    "value": str(n * 1000),
+                },
+                "b": {"type": "bnode", "value": f"b{n}"},
+            }
+            for n in range(50)
+        ]
+    },
+}
+
+
+def test_parsed_sparql_response():
+    rows = parsed_sparql_response(select_response, "select")
+    assert len(rows) == 50
+    assert rows[1]["s"] == "https://example.org/1"
+    assert isinstance(rows[1]["s"], SPARQLURI)
+    assert isinstance(rows[1]["label"], SPARQLLiteral)
+    assert rows[1]["n"] == 1000
+    assert rows[1]["b"].sparql_type == "bnode"
+
+    assert parsed_sparql_response({"head": {}, "boolean": True}, "ask") is True
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 65536])
+def test_iter_sparql_response(chunk_size):
+    body = json.dumps(select_response, indent=1).encode("utf-8")
+    rows = iter_sparql_response(io.BytesIO(body), chunk_size=chunk_size)
+    assert list(rows) == parsed_sparql_response(select_response, "select")
+
+
+def test_iter_sparql_response_inputs():
+    expected = parsed_sparql_response(select_response, "select")
+
+    # results before head, compact separators, and a trailing number
+    body = json.dumps(
+        {
+            "results": select_response["results"],
+            "head": select_response["head"],
+            "x": 12345,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    chunks = [body[i : i + 5] for i in range(0, len(body), 5)]
+    assert list(iter_sparql_response(chunks)) == expected
+    assert list(iter_sparql_response(body.decode("utf-8"))) == expected
+
+    empty = {"head": {"vars": []}, "results": {"bindings": []}}
+    assert list(iter_sparql_response(json.dumps(empty))) == []
+
+    with pytest.raises(ValueError):
+        list(iter_sparql_response(b'{"results": {"bindings": [{"s": '))
+
+
+if __name__ == "__main__":
+    pytest.main()